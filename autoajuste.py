@@ -0,0 +1,216 @@
+import json
+import os
+import random
+from datetime import datetime
+
+from ejecutor import construir_comando_copia, ejecutar_rclone
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Valores usados hasta ahora en todas las variantes del script
+PARAMETROS_POR_DEFECTO = {
+    'checkers': 64,
+    'transfers': 128,
+    'multi_thread_streams': 4,
+    's3_upload_concurrency': 4,
+    's3_chunk_size_mb': 5,
+    's3_upload_cutoff_mb': 200,
+}
+
+
+def muestrear_tamanos(objetos, tamano_muestra=10000, semilla=None):
+    # Muestreo de reservorio: una sola pasada por la instantánea con memoria constante
+    aleatorio = random.Random(semilla)
+    muestra = []
+    total_objetos = 0
+    total_bytes = 0
+    for objeto in objetos:
+        total_objetos += 1
+        total_bytes += objeto['size']
+        if len(muestra) < tamano_muestra:
+            muestra.append(objeto['size'])
+        else:
+            indice = aleatorio.randrange(total_objetos)
+            if indice < tamano_muestra:
+                muestra[indice] = objeto['size']
+    muestra.sort()
+    return {'objetos': total_objetos, 'bytes': total_bytes, 'muestra': muestra}
+
+
+def percentil(valores_ordenados, proporcion):
+    if not valores_ordenados:
+        return 0
+    indice = min(len(valores_ordenados) - 1, int(proporcion * len(valores_ordenados)))
+    return valores_ordenados[indice]
+
+
+def parametros_iniciales(distribucion, memoria_maxima_mb=2048):
+    # Heurística según la distribución de tamaños:
+    # - muchos objetos pequeños: el costo está en las peticiones, conviene más concurrencia de objetos
+    # - pocos objetos grandes: conviene menos transferencias y más partes en paralelo por objeto
+    mediana = percentil(distribucion['muestra'], 0.5)
+    p90 = percentil(distribucion['muestra'], 0.9)
+    parametros = dict(PARAMETROS_POR_DEFECTO)
+
+    if mediana < MB:
+        parametros.update(checkers=256, transfers=256, multi_thread_streams=1, s3_upload_concurrency=1,
+                          s3_chunk_size_mb=5)
+    elif p90 >= GB:
+        parametros.update(checkers=32, transfers=16, multi_thread_streams=8, s3_upload_concurrency=8,
+                          s3_chunk_size_mb=64)
+    elif mediana >= 64 * MB:
+        parametros.update(checkers=32, transfers=32, multi_thread_streams=4, s3_upload_concurrency=4,
+                          s3_chunk_size_mb=16)
+
+    # No tiene sentido abrir más transferencias que objetos
+    if distribucion['objetos']:
+        parametros['transfers'] = max(1, min(parametros['transfers'], distribucion['objetos']))
+    return ajustar_a_memoria(parametros, memoria_maxima_mb)
+
+
+def ajustar_a_memoria(parametros, memoria_maxima_mb):
+    # rclone reserva aproximadamente transfers * s3_upload_concurrency * s3_chunk_size por subidas multiparte
+    parametros = dict(parametros)
+    while (parametros['transfers'] * parametros['s3_upload_concurrency'] * parametros['s3_chunk_size_mb']
+           > memoria_maxima_mb):
+        if parametros['s3_chunk_size_mb'] > 5:
+            parametros['s3_chunk_size_mb'] = max(5, parametros['s3_chunk_size_mb'] // 2)
+        elif parametros['s3_upload_concurrency'] > 1:
+            parametros['s3_upload_concurrency'] -= 1
+        elif parametros['transfers'] > 1:
+            parametros['transfers'] = max(1, parametros['transfers'] // 2)
+        else:
+            break
+    return parametros
+
+
+def ajustar_a_presupuesto(parametros, transfers_maximos=0, checkers_maximos=0):
+    # Con varios buckets en paralelo, cada ejecución no puede pasar de su parte del presupuesto global
+    parametros = dict(parametros)
+    if transfers_maximos:
+        parametros['transfers'] = max(1, min(parametros['transfers'], transfers_maximos))
+    if checkers_maximos:
+        parametros['checkers'] = max(1, min(parametros['checkers'], checkers_maximos))
+    return parametros
+
+
+def candidatos_sondeo(parametros, memoria_maxima_mb=2048):
+    # Ventanas de prueba alrededor de la heurística: la mitad y el doble de transferencias
+    candidatos = [parametros]
+    for factor in (0.5, 2):
+        variante = dict(parametros)
+        variante['transfers'] = max(1, int(parametros['transfers'] * factor))
+        variante['checkers'] = max(8, int(parametros['checkers'] * factor))
+        variante = ajustar_a_memoria(variante, memoria_maxima_mb)
+        if variante not in candidatos:
+            candidatos.append(variante)
+    return candidatos
+
+
+def flags_rendimiento(parametros):
+    return (
+        f"--checkers {parametros['checkers']} "
+        f"--transfers {parametros['transfers']} "
+        f"--multi-thread-streams {parametros['multi_thread_streams']} "
+        f"--s3-upload-concurrency {parametros['s3_upload_concurrency']} "
+        f"--s3-chunk-size {parametros['s3_chunk_size_mb']}M "
+        f"--s3-upload-cutoff {parametros['s3_upload_cutoff_mb']}M "
+    )
+
+
+def muestrear_claves(ruta_lista, cantidad, semilla=None):
+    aleatorio = random.Random(semilla)
+    muestra = []
+    with open(ruta_lista, encoding="utf-8") as lista:
+        for indice, linea in enumerate(lista):
+            clave = linea.rstrip("\n")
+            if len(muestra) < cantidad:
+                muestra.append(clave)
+            else:
+                posicion = aleatorio.randrange(indice + 1)
+                if posicion < cantidad:
+                    muestra[posicion] = clave
+    return muestra
+
+
+def velocidad_de(resultado):
+    estadisticas = resultado['estadisticas'] or {}
+    segundos = estadisticas.get('elapsedTime') or 0
+    if not segundos:
+        return 0.0
+    return estadisticas.get('bytes', 0) / segundos
+
+
+def copia_sondeo(origen, destino, parametros, ruta_porcion, segundos, al_evento=None):
+    # Mismo comando que la copia real, cortado a los `segundos` de la ventana
+    comando = construir_comando_copia(origen, destino, flags_rendimiento(parametros), ruta_porcion,
+                                      flags_extra=f"--max-duration {segundos}s ")
+    return ejecutar_rclone(comando, al_evento=al_evento, mostrar=False)
+
+
+def sondear(copiar, ruta_lista, candidatos, segundos=20, objetos_por_sondeo=2000, directorio="instantaneas"):
+    # Cada candidato copia un subconjunto distinto de la lista durante una ventana corta con
+    # copiar(parametros, ruta_porcion, segundos), que devuelve un resultado como ejecutor.ejecutar_rclone.
+    # Lo copiado ya queda en el bucket de destino, así la copia real lo omite.
+    claves = muestrear_claves(ruta_lista, objetos_por_sondeo * len(candidatos))
+    resultados = []
+    for indice, parametros in enumerate(candidatos):
+        porcion = claves[indice::len(candidatos)]
+        if not porcion:
+            break
+        ruta_porcion = os.path.join(directorio, f"sondeo-{indice}.txt")
+        with open(ruta_porcion, "w", encoding="utf-8") as archivo:
+            archivo.write("\n".join(porcion) + "\n")
+        resultado = copiar(parametros, ruta_porcion, segundos)
+        velocidad = velocidad_de(resultado)
+        print(f"Sondeo {indice}: transfers={parametros['transfers']} checkers={parametros['checkers']} "
+              f"-> {velocidad / MB:.1f} MB/s")
+        resultados.append((velocidad, parametros))
+    return resultados
+
+
+def elegir_parametros(distribucion, origen, destino, ruta_lista, sondeo=True, segundos=20, memoria_maxima_mb=2048,
+                      directorio="instantaneas", transfers_maximos=0, checkers_maximos=0, copiar=None):
+    # `copiar` es la copia de sondeo (ver sondear); por omisión, un proceso rclone por candidato
+    parametros = ajustar_a_presupuesto(parametros_iniciales(distribucion, memoria_maxima_mb),
+                                       transfers_maximos, checkers_maximos)
+    velocidad_sondeo = None
+    # Con pocos datos la ventana de prueba no es representativa y costaría más que la copia misma
+    if sondeo and distribucion['bytes'] >= 10 * GB:
+        candidatos = []
+        for candidato in candidatos_sondeo(parametros, memoria_maxima_mb):
+            candidato = ajustar_a_presupuesto(candidato, transfers_maximos, checkers_maximos)
+            if candidato not in candidatos:
+                candidatos.append(candidato)
+        copiar = copiar or (lambda parametros_sondeo, ruta_porcion, segundos_sondeo: copia_sondeo(
+            origen, destino, parametros_sondeo, ruta_porcion, segundos_sondeo))
+        resultados = sondear(copiar, ruta_lista, candidatos, segundos=segundos, directorio=directorio)
+        if resultados:
+            velocidad_sondeo, parametros = max(resultados, key=lambda resultado: resultado[0])
+    return parametros, velocidad_sondeo
+
+
+def registrar_resultado(ruta_historial, bucket_origen, bucket_destino, distribucion, parametros,
+                        velocidad_sondeo, resultado_copia):
+    estadisticas = resultado_copia['estadisticas'] or {}
+    registro = {
+        'fecha': datetime.now().isoformat(),
+        'origen': bucket_origen,
+        'destino': bucket_destino,
+        'objetos': distribucion['objetos'],
+        'bytes': distribucion['bytes'],
+        'mediana_bytes': percentil(distribucion['muestra'], 0.5),
+        'p90_bytes': percentil(distribucion['muestra'], 0.9),
+        'parametros': parametros,
+        'velocidad_sondeo': velocidad_sondeo,
+        'velocidad_copia': velocidad_de(resultado_copia),
+        'bytes_copiados': estadisticas.get('bytes', 0),
+        'objetos_copiados': estadisticas.get('transfers', 0),
+        'segundos_copia': estadisticas.get('elapsedTime', 0),
+        'codigo': resultado_copia['codigo'],
+    }
+    os.makedirs(os.path.dirname(ruta_historial) or ".", exist_ok=True)
+    with open(ruta_historial, "a", encoding="utf-8") as historial:
+        historial.write(json.dumps(registro) + "\n")
+    return registro
@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import autoajuste
+import instantanea
+from cliente_cos import crear_cliente_hmac
+from ejecutor import construir_comando_copia, ejecutar_rclone
+
+# Credenciales del servidor S3 local; no corresponden a ningún entorno real
+ACCESS_KEY_LOCAL = "benchmark"
+SECRET_KEY_LOCAL = "benchmark-secret"
+
+# Primera línea de cada petición HTTP que rclone registra con --dump headers
+PATRON_PETICION = re.compile(r"^(GET|PUT|HEAD|POST|DELETE) (\S+) HTTP/1\.1", re.MULTILINE)
+
+
+def iniciar_servidor(tipo, puerto, directorio):
+    entorno = dict(os.environ)
+    if tipo == "minio":
+        entorno.update(MINIO_ROOT_USER=ACCESS_KEY_LOCAL, MINIO_ROOT_PASSWORD=SECRET_KEY_LOCAL)
+        comando = ["minio", "server", directorio, "--address", f"127.0.0.1:{puerto}", "--quiet"]
+        ruta_salud = "/minio/health/live"
+    else:
+        comando = [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(puerto)]
+        ruta_salud = "/"
+    servidor = subprocess.Popen(comando, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    endpoint = f"http://127.0.0.1:{puerto}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(endpoint + ruta_salud, timeout=1)
+            return servidor, endpoint
+        except OSError:
+            if servidor.poll() is not None:
+                break
+            time.sleep(0.2)
+    servidor.terminate()
+    raise RuntimeError(f"No se pudo iniciar el servidor S3 local ({tipo}).")
+
+
+def escribir_configuracion(endpoint, ruta):
+    # El mismo par de remotos que usan los scripts, apuntando al servidor local
+    remotos = ""
+    for nombre in ("COS_SOURCE", "COS_DESTINATION"):
+        remotos += (
+            f"[{nombre}]\n"
+            "type = s3\n"
+            "provider = Minio\n"
+            "env_auth = false\n"
+            f"access_key_id = {ACCESS_KEY_LOCAL}\n"
+            f"secret_access_key = {SECRET_KEY_LOCAL}\n"
+            f"endpoint = {endpoint}\n\n"
+        )
+    with open(ruta, "w") as archivo:
+        archivo.write(remotos)
+
+
+def generador_tamanos(especificacion, semilla):
+    # fijo:BYTES | uniforme:MIN:MAX | lognormal:MU:SIGMA (en ln(bytes))
+    aleatorio = random.Random(semilla)
+    tipo, *valores = especificacion.split(":")
+    if tipo == "fijo":
+        return lambda: int(valores[0])
+    if tipo == "uniforme":
+        return lambda: aleatorio.randint(int(valores[0]), int(valores[1]))
+    if tipo == "lognormal":
+        return lambda: max(0, int(aleatorio.lognormvariate(float(valores[0]), float(valores[1]))))
+    raise ValueError(f"Distribución de tamaños desconocida: {especificacion}")
+
+
+def generar_bucket_sintetico(cliente, bucket, cantidad, especificacion, prefijos, semilla, hilos=32):
+    cliente.create_bucket(Bucket=bucket)
+    siguiente_tamano = generador_tamanos(especificacion, semilla)
+    tamanos = [siguiente_tamano() for _ in range(cantidad)]
+    # Bloque aleatorio reutilizado: datos incomprimibles sin pagar os.urandom por cada objeto
+    bloque = os.urandom(max(tamanos, default=0) + 16)
+
+    def subir(indice):
+        clave = f"p{indice % prefijos:03d}/obj-{indice:08d}"
+        desplazamiento = indice % 16
+        cliente.put_object(Bucket=bucket, Key=clave, Body=bloque[desplazamiento:desplazamiento + tamanos[indice]])
+
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(subir, range(cantidad)))
+    return {'objetos': cantidad, 'bytes': sum(tamanos)}
+
+
+def contar_peticiones_boto(cliente, contadores):
+    def registrar(event_name, **kwargs):
+        operacion = event_name.rsplit(".", 1)[-1]
+        contadores[operacion] = contadores.get(operacion, 0) + 1
+    cliente.meta.events.register("before-call.s3", registrar)
+
+
+def clasificar_peticion(metodo, ruta):
+    # Un GET sobre la raíz del bucket (sin clave) es un listado
+    camino, _, consulta = ruta.partition("?")
+    if metodo == "GET" and (camino.strip("/").count("/") == 0 or "list-type=" in consulta):
+        return "LIST"
+    return metodo
+
+
+def vigilar_memoria(proceso, medicion):
+    # VmHWM es el pico de memoria residente del proceso; se lee hasta que el proceso termina
+    ruta = f"/proc/{proceso.pid}/status"
+    while proceso.poll() is None:
+        try:
+            with open(ruta) as estado:
+                for linea in estado:
+                    if linea.startswith("VmHWM:"):
+                        medicion['rss_pico_kb'] = max(medicion['rss_pico_kb'], int(linea.split()[1]))
+        except OSError:
+            break
+        time.sleep(0.1)
+
+
+def ejecutar_copia(origen, destino, ruta_lista, parametros, ruta_config, contar=False):
+    # --dump headers escribe cada petición en el log y frena la copia: con `contar` la corrida solo sirve
+    # para contar peticiones y su tiempo no se informa
+    peticiones = {}
+    medicion = {'rss_pico_kb': 0}
+
+    def al_evento(evento):
+        if evento['tipo'] == 'log':
+            for metodo, ruta in PATRON_PETICION.findall(evento['mensaje']):
+                tipo = clasificar_peticion(metodo, ruta)
+                peticiones[tipo] = peticiones.get(tipo, 0) + 1
+
+    def al_iniciar(proceso):
+        threading.Thread(target=vigilar_memoria, args=(proceso, medicion), daemon=True).start()
+
+    # exec reemplaza al shell, así el pid vigilado es el de rclone
+    comando = "exec " + construir_comando_copia(origen, destino, autoajuste.flags_rendimiento(parametros), ruta_lista,
+                                                flags_extra="--dump headers " if contar else "", config=ruta_config)
+    inicio = time.monotonic()
+    resultado = ejecutar_rclone(comando, al_evento=al_evento, al_iniciar=al_iniciar, mostrar=False)
+    segundos = time.monotonic() - inicio
+    return resultado, segundos, peticiones, medicion['rss_pico_kb']
+
+
+def version_actual():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocida"
+
+
+def comparar_con_anterior(directorio, resultado, tolerancia=0.1):
+    anteriores = sorted(nombre for nombre in os.listdir(directorio) if nombre.endswith(".json"))
+    anteriores = [nombre for nombre in anteriores if nombre != resultado['archivo']]
+    if not anteriores:
+        return
+    with open(os.path.join(directorio, anteriores[-1])) as archivo:
+        anterior = json.load(archivo)
+    if anterior['escenario'] != resultado['escenario']:
+        print(f"El resultado anterior ({anteriores[-1]}) usa otro escenario, no se compara.")
+        return
+    for metrica in ('objetos_por_segundo', 'mb_por_segundo'):
+        previo = anterior['metricas'][metrica]
+        actual = resultado['metricas'][metrica]
+        if previo:
+            cambio = (actual - previo) / previo
+            alerta = "  <-- REGRESIÓN" if cambio < -tolerancia else ""
+            print(f"{metrica}: {previo:.2f} -> {actual:.2f} ({cambio:+.1%}) vs {anterior['version']}{alerta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la copia contra un servidor S3 local.")
+    parser.add_argument("--servidor", choices=("minio", "moto"), default="minio")
+    parser.add_argument("--puerto", type=int, default=9100)
+    parser.add_argument("--objetos", type=int, default=10000)
+    parser.add_argument("--tamanos", default="lognormal:10:2",
+                        help="fijo:BYTES, uniforme:MIN:MAX o lognormal:MU:SIGMA")
+    parser.add_argument("--prefijos", type=int, default=16)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--autoajuste", action="store_true",
+                        help="usar los parámetros del autoajuste en vez de los valores por defecto")
+    parser.add_argument("--resultados", default="resultados_benchmark")
+    argumentos = parser.parse_args()
+
+    directorio_trabajo = tempfile.mkdtemp(prefix="benchmark-")
+    servidor, endpoint = iniciar_servidor(argumentos.servidor, argumentos.puerto,
+                                          os.path.join(directorio_trabajo, "datos"))
+    try:
+        cliente = crear_cliente_hmac(ACCESS_KEY_LOCAL, SECRET_KEY_LOCAL, endpoint)
+        ruta_config = os.path.join(directorio_trabajo, "rclone.conf")
+        escribir_configuracion(endpoint, ruta_config)
+
+        print(f"Generando {argumentos.objetos} objetos ({argumentos.tamanos})...")
+        generar_bucket_sintetico(cliente, "origen", argumentos.objetos, argumentos.tamanos,
+                                 argumentos.prefijos, argumentos.semilla)
+        cliente.create_bucket(Bucket="destino")
+        cliente.create_bucket(Bucket="destino-conteo")
+
+        # Mismo flujo que el script: instantánea única, lista de claves, parámetros y copia
+        peticiones_listado = {}
+        contar_peticiones_boto(cliente, peticiones_listado)
+        inicio = time.monotonic()
+        ruta_instantanea = os.path.join(directorio_trabajo, "origen.jsonl.gz")
+        resumen = instantanea.capturar_instantanea(instantanea.listar_objetos(cliente, "origen"), ruta_instantanea)
+        segundos_listado = time.monotonic() - inicio
+        ruta_lista = os.path.join(directorio_trabajo, "copiar.txt")
+        instantanea.escribir_lista_archivos(instantanea.leer_instantanea(ruta_instantanea), ruta_lista)
+
+        if argumentos.autoajuste:
+            parametros = autoajuste.parametros_iniciales(
+                autoajuste.muestrear_tamanos(instantanea.leer_instantanea(ruta_instantanea)))
+        else:
+            parametros = dict(autoajuste.PARAMETROS_POR_DEFECTO)
+
+        resultado, segundos, _, rss_pico_kb = ejecutar_copia(
+            "COS_SOURCE:origen", "COS_DESTINATION:destino", ruta_lista, parametros, ruta_config)
+        # Las peticiones se cuentan en una segunda copia a un bucket vacío, con las mismas claves y parámetros
+        print("Contando peticiones en una copia aparte...")
+        _, _, peticiones, _ = ejecutar_copia(
+            "COS_SOURCE:origen", "COS_DESTINATION:destino-conteo", ruta_lista, parametros, ruta_config, contar=True)
+        peticiones['LIST'] = peticiones.get('LIST', 0) + peticiones_listado.get('ListObjectsV2', 0)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+        shutil.rmtree(directorio_trabajo, ignore_errors=True)
+
+    fecha = datetime.now().strftime("%Y%m%d-%H%M%S")
+    version = version_actual()
+    informe = {
+        'archivo': f"{fecha}-{version}.json",
+        'fecha': fecha,
+        'version': version,
+        'escenario': {
+            'servidor': argumentos.servidor,
+            'objetos': argumentos.objetos,
+            'tamanos': argumentos.tamanos,
+            'prefijos': argumentos.prefijos,
+            'semilla': argumentos.semilla,
+            'autoajuste': argumentos.autoajuste,
+        },
+        'parametros': parametros,
+        'metricas': {
+            'codigo': resultado['codigo'],
+            'bytes': resumen['bytes'],
+            'segundos_listado': segundos_listado,
+            'segundos_copia': segundos,
+            'objetos_por_segundo': resumen['objetos'] / segundos if segundos else 0,
+            'mb_por_segundo': resumen['bytes'] / autoajuste.MB / segundos if segundos else 0,
+            'peticiones': peticiones,
+            'rss_pico_rclone_kb': rss_pico_kb,
+        },
+    }
+    os.makedirs(argumentos.resultados, exist_ok=True)
+    with open(os.path.join(argumentos.resultados, informe['archivo']), "w") as archivo:
+        json.dump(informe, archivo, indent=2)
+    print(json.dumps(informe['metricas'], indent=2))
+    comparar_con_anterior(argumentos.resultados, informe)
+
+
+if __name__ == "__main__":
+    main()
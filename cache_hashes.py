@@ -0,0 +1,71 @@
+import base64
+import gzip
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+
+def ruta_cache(directorio, serie, indice=0):
+    # Un archivo por serie y réplica que se arrastra de un día al siguiente, como el catálogo
+    return os.path.join(directorio, f"hashes-{serie}-{indice}.jsonl.gz")
+
+
+def ruta_cache_remoto(indice=0):
+    # Dentro de cada bucket diario, junto al manifiesto; cada réplica sube el suyo
+    return f"_manifiesto/hashes-{indice}.jsonl.gz"
+
+
+def _clave(bucket, objeto):
+    return (bucket, objeto['key'], objeto['size'], objeto['etag'], objeto.get('mtime') or "")
+
+
+def abrir_cache(ruta=None):
+    # MD5 del contenido por versión de objeto: (bucket, clave, tamaño, ETag, última modificación).
+    # Solo hace falta para los objetos multiparte, cuyo ETag no es el MD5 del contenido.
+    cache = {'entradas': {}, 'bloqueo': threading.Lock(), 'calculados': 0, 'aciertos': 0}
+    if ruta and os.path.exists(ruta):
+        with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+            for linea in archivo:
+                if not linea.strip():
+                    continue
+                entrada = json.loads(linea)
+                cache['entradas'][tuple(entrada['v'])] = {'md5': entrada['md5'], 'visto': entrada['visto']}
+    return cache
+
+
+def buscar(cache, bucket, objeto):
+    entrada = cache['entradas'].get(_clave(bucket, objeto))
+    if entrada is None:
+        return None
+    with cache['bloqueo']:
+        entrada['visto'] = date.today().isoformat()
+        cache['aciertos'] += 1
+    return entrada['md5']
+
+
+def anotar(cache, bucket, objeto, md5):
+    with cache['bloqueo']:
+        cache['entradas'][_clave(bucket, objeto)] = {'md5': md5, 'visto': date.today().isoformat()}
+        cache['calculados'] += 1
+
+
+def metadatos_md5(md5):
+    # Mismo formato que rclone en X-Amz-Meta-Md5chksum: el MD5 en base64
+    return base64.b64encode(bytes.fromhex(md5)).decode()
+
+
+def guardar_cache(cache, ruta, dias_vigencia=None):
+    # Se descartan las versiones que no se consultaron en dias_vigencia días: ya no existen en ningún bucket
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    limite = (date.today() - timedelta(days=dias_vigencia)).isoformat() if dias_vigencia else ""
+    guardadas = 0
+    with cache['bloqueo'], gzip.open(ruta + ".tmp", "wt", encoding="utf-8") as archivo:
+        for version, entrada in cache['entradas'].items():
+            if entrada['visto'] < limite:
+                continue
+            archivo.write(json.dumps({'v': list(version), 'md5': entrada['md5'], 'visto': entrada['visto']},
+                                     separators=(",", ":")) + "\n")
+            guardadas += 1
+    os.replace(ruta + ".tmp", ruta)
+    return guardadas
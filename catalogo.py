@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import sys
+from datetime import date
+
+from manifiesto import fecha_de_bucket, serie_de_bucket
+
+RUTA_CATALOGO = os.environ.get("CATALOGO", "catalogo/catalogo.db")
+# Ruta del catálogo dentro de cada bucket diario, para recuperarlo si el contenedor es nuevo
+RUTA_CATALOGO_REMOTO = "_catalogo/catalogo.db"
+FILAS_POR_LOTE = 10000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE,
+    serie TEXT,
+    fecha TEXT
+);
+CREATE TABLE IF NOT EXISTS copias (
+    clave TEXT NOT NULL,
+    bucket_id INTEGER NOT NULL REFERENCES buckets(id),
+    tamano INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    mtime TEXT,
+    paquete TEXT,
+    desplazamiento INTEGER,
+    longitud INTEGER,
+    PRIMARY KEY (clave, bucket_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dias (
+    bucket_id INTEGER PRIMARY KEY REFERENCES buckets(id),
+    objetos INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    objetos_copiados INTEGER NOT NULL,
+    bytes_copiados INTEGER NOT NULL
+);
+"""
+
+
+def abrir(ruta=RUTA_CATALOGO):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+
+def id_bucket(conexion, nombre, ids):
+    # Los buckets se guardan una vez; cada copia apunta a su id entero para que las filas sean pequeñas
+    if nombre not in ids:
+        fecha = fecha_de_bucket(nombre)
+        conexion.execute("INSERT OR IGNORE INTO buckets (nombre, serie, fecha) VALUES (?, ?, ?)",
+                         (nombre, serie_de_bucket(nombre), fecha.isoformat() if fecha else None))
+        ids[nombre] = conexion.execute("SELECT id FROM buckets WHERE nombre = ?", (nombre,)).fetchone()[0]
+    return ids[nombre]
+
+
+def registrar_respaldo(ruta, bucket_destino, objetos, ubicaciones=None):
+    # Registra la vista completa de la ejecución: cada objeto con el bucket donde vive su copia
+    # (el de hoy, o el bucket anterior que referencia el manifiesto incremental).
+    # ubicaciones completa los datos de paquete de los objetos empaquetados cuando no vienen en el objeto.
+    ubicaciones = ubicaciones or {}
+    conexion = abrir(ruta)
+    ids = {}
+    resumen = {'objetos': 0, 'bytes': 0, 'objetos_copiados': 0, 'bytes_copiados': 0}
+    try:
+        with conexion:
+            id_hoy = id_bucket(conexion, bucket_destino, ids)
+            filas = []
+            for objeto in objetos:
+                bucket = objeto.get('bucket', bucket_destino)
+                ubicacion = ubicaciones.get(objeto['key'], {}) if bucket == bucket_destino else {}
+                filas.append((
+                    objeto['key'], id_bucket(conexion, bucket, ids), objeto['size'], objeto['etag'], objeto.get('mtime'),
+                    objeto.get('paquete', ubicacion.get('paquete')),
+                    objeto.get('desplazamiento', ubicacion.get('desplazamiento')),
+                    objeto.get('longitud', ubicacion.get('longitud')),
+                ))
+                resumen['objetos'] += 1
+                resumen['bytes'] += objeto['size']
+                if bucket == bucket_destino:
+                    resumen['objetos_copiados'] += 1
+                    resumen['bytes_copiados'] += objeto['size']
+                if len(filas) >= FILAS_POR_LOTE:
+                    conexion.executemany("INSERT OR REPLACE INTO copias VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+                    filas = []
+            conexion.executemany("INSERT OR REPLACE INTO copias VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+            conexion.execute("INSERT OR REPLACE INTO dias VALUES (?, ?, ?, ?, ?)",
+                             (id_hoy, resumen['objetos'], resumen['bytes'],
+                              resumen['objetos_copiados'], resumen['bytes_copiados']))
+    finally:
+        conexion.close()
+    return resumen
+
+
+def podar(ruta, fecha_limite):
+    # Quita las copias de los buckets anteriores a fecha_limite, que la política de ciclo de vida ya eliminó
+    conexion = abrir(ruta)
+    try:
+        with conexion:
+            ids = [fila[0] for fila in conexion.execute("SELECT id FROM buckets WHERE fecha < ?",
+                                                         (fecha_limite.isoformat(),))]
+            for id_viejo in ids:
+                conexion.execute("DELETE FROM copias WHERE bucket_id = ?", (id_viejo,))
+                conexion.execute("DELETE FROM dias WHERE bucket_id = ?", (id_viejo,))
+                conexion.execute("DELETE FROM buckets WHERE id = ?", (id_viejo,))
+        if ids:
+            conexion.execute("VACUUM")
+    finally:
+        conexion.close()
+    return len(ids)
+
+
+def _filas(cursor):
+    columnas = [columna[0] for columna in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+CONSULTA_COPIAS = """
+SELECT copias.clave, buckets.nombre AS bucket, buckets.fecha, copias.tamano, copias.etag, copias.mtime,
+       copias.paquete, copias.desplazamiento, copias.longitud
+FROM copias JOIN buckets ON buckets.id = copias.bucket_id
+"""
+
+
+def ultima_copia(conexion, clave, fecha=None):
+    # La copia más reciente de la clave en un bucket diario del día indicado o anterior
+    fecha = (fecha or date.today()).isoformat()
+    filas = _filas(conexion.execute(
+        CONSULTA_COPIAS + "WHERE copias.clave = ? AND buckets.fecha <= ? ORDER BY buckets.fecha DESC, buckets.nombre DESC "
+                          "LIMIT 1", (clave, fecha)))
+    return filas[0] if filas else None
+
+
+def versiones(conexion, clave):
+    # Todas las copias de la clave, de la más antigua a la más reciente; el ETag distingue los contenidos
+    return _filas(conexion.execute(
+        CONSULTA_COPIAS + "WHERE copias.clave = ? ORDER BY buckets.fecha, buckets.nombre", (clave,)))
+
+
+def resumen_dia(conexion, fecha, serie=None):
+    consulta = """
+        SELECT buckets.nombre AS bucket, buckets.fecha, dias.objetos, dias.bytes, dias.objetos_copiados,
+               dias.bytes_copiados
+        FROM dias JOIN buckets ON buckets.id = dias.bucket_id
+        WHERE buckets.fecha = ?"""
+    parametros = [fecha.isoformat()]
+    if serie:
+        consulta += " AND buckets.serie = ?"
+        parametros.append(serie)
+    return _filas(conexion.execute(consulta + " ORDER BY buckets.nombre", parametros))
+
+
+def main():
+    # python catalogo.py ultima CLAVE [YYYY-MM-DD] | versiones CLAVE | dia YYYY-MM-DD [SERIE]
+    if len(sys.argv) < 3 or sys.argv[1] not in ("ultima", "versiones", "dia"):
+        print("Uso: catalogo.py ultima CLAVE [YYYY-MM-DD] | versiones CLAVE | dia YYYY-MM-DD [SERIE]")
+        return 2
+    if not os.path.exists(RUTA_CATALOGO):
+        print(f"Error: no existe el catálogo {RUTA_CATALOGO}.")
+        return 1
+    conexion = abrir(RUTA_CATALOGO)
+    try:
+        if sys.argv[1] == "ultima":
+            fecha = date.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else None
+            resultado = ultima_copia(conexion, sys.argv[2], fecha)
+            print(resultado or f"No hay copias de {sys.argv[2]}.")
+        elif sys.argv[1] == "versiones":
+            for fila in versiones(conexion, sys.argv[2]):
+                print(fila)
+        else:
+            for fila in resumen_dia(conexion, date.fromisoformat(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else None):
+                print(fila)
+    finally:
+        conexion.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
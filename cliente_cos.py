@@ -0,0 +1,46 @@
+from perfil_arranque import importar
+
+
+def normalizar_endpoint(endpoint):
+    # rclone acepta el endpoint sin esquema, pero el cliente de boto necesita la URL completa
+    if endpoint.startswith("http://") or endpoint.startswith("https://"):
+        return endpoint
+    return f"https://{endpoint}"
+
+
+def crear_cliente_hmac(access_key_id, secret_access_key, endpoint, conexiones=10):
+    # Cliente S3 con las mismas credenciales HMAC que usa rclone.conf.
+    # El SDK se carga recién aquí para no pagar su importación al arrancar.
+    ibm_boto3 = importar("ibm_boto3")
+    Config = importar("ibm_botocore.client").Config
+    return ibm_boto3.client('s3',
+                            aws_access_key_id=access_key_id,
+                            aws_secret_access_key=secret_access_key,
+                            config=Config(signature_version='s3v4', max_pool_connections=conexiones),
+                            endpoint_url=normalizar_endpoint(endpoint))
+
+
+def crear_cliente_origen(secretos, conexiones=10):
+    return crear_cliente_hmac(secretos['SOURCE_ACCESS_KEY_ID'],
+                              secretos['SOURCE_SECRET_ACCESS_KEY'],
+                              secretos['SOURCE_ENDPOINT'],
+                              conexiones)
+
+
+def crear_cliente_destino(secretos, conexiones=10, prefijo="DESTINATION"):
+    # Con prefijo DESTINATION_2, DESTINATION_3, ... se crea el cliente de una réplica
+    return crear_cliente_hmac(secretos[f'{prefijo}_ACCESS_KEY_ID'],
+                              secretos[f'{prefijo}_SECRET_ACCESS_KEY'],
+                              secretos[f'{prefijo}_ENDPOINT'],
+                              conexiones)
+
+
+def crear_cliente_iam(secretos):
+    # Cliente autenticado con la API key de IBM Cloud, el mismo que aplica la política de ciclo de vida
+    ibm_boto3 = importar("ibm_boto3")
+    Config = importar("ibm_botocore.client").Config
+    return ibm_boto3.client('s3',
+                            ibm_api_key_id=secretos['IBM_COS_API_KEY'],
+                            ibm_service_instance_id=secretos['IBM_SERVICE_INSTANCE_ID'],
+                            config=Config(signature_version='oauth', max_pool_connections=128),
+                            endpoint_url=secretos['IBM_COS_ENDPOINT'])
@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from cache_hashes import metadatos_md5
+from cliente_cos import normalizar_endpoint
+
+MB = 1024 * 1024
+# copy_object admite hasta 5 GB; por encima del umbral se copia en partes para paralelizar
+UMBRAL_MULTIPARTE = 256 * MB
+TAMANO_PARTE_MINIMO = 64 * MB
+MAXIMO_PARTES = 10000
+
+
+def host_de(endpoint):
+    return urlparse(normalizar_endpoint(endpoint)).hostname
+
+
+def copia_en_servidor_posible(secretos, cliente, bucket_origen, bucket_destino):
+    # Origen, destino y el cliente IAM tienen que apuntar al mismo endpoint,
+    # y las credenciales del cliente tienen que ver ambos buckets
+    hosts = {host_de(secretos[clave]) for clave in ('SOURCE_ENDPOINT', 'DESTINATION_ENDPOINT', 'IBM_COS_ENDPOINT')}
+    if len(hosts) != 1:
+        return False
+    try:
+        cliente.head_bucket(Bucket=bucket_origen)
+        cliente.head_bucket(Bucket=bucket_destino)
+    except Exception as e:
+        print(f"El cliente de COS no puede acceder a ambos buckets, se usará rclone: {e}")
+        return False
+    return True
+
+
+def tamano_parte(tamano):
+    parte = TAMANO_PARTE_MINIMO
+    while parte * MAXIMO_PARTES < tamano:
+        parte *= 2
+    return parte
+
+
+def copiar_simple(cliente, bucket_origen, bucket_destino, objeto, clave_destino=None):
+    cliente.copy_object(Bucket=bucket_destino, Key=clave_destino or objeto['key'],
+                        CopySource={'Bucket': bucket_origen, 'Key': objeto['key']},
+                        CopySourceIfMatch=objeto['etag'])
+
+
+def copiar_multiparte(cliente, ejecutor_partes, bucket_origen, bucket_destino, objeto, clave_destino=None, md5=None):
+    # Las partes se copian en paralelo dentro de COS; el contenido nunca pasa por el contenedor.
+    # Con el MD5 del contenido conocido, se guarda como lo hace rclone para que la copia sea verificable sin leerla.
+    clave_destino = clave_destino or objeto['key']
+    cabecera = cliente.head_object(Bucket=bucket_origen, Key=objeto['key'])
+    metadatos = cabecera.get('Metadata', {})
+    if md5 and 'md5chksum' not in metadatos:
+        metadatos['md5chksum'] = metadatos_md5(md5)
+    argumentos = {'Bucket': bucket_destino, 'Key': clave_destino, 'Metadata': metadatos}
+    if cabecera.get('ContentType'):
+        argumentos['ContentType'] = cabecera['ContentType']
+    carga = cliente.create_multipart_upload(**argumentos)
+    id_carga = carga['UploadId']
+
+    parte = tamano_parte(objeto['size'])
+
+    def copiar_parte(numero):
+        inicio = (numero - 1) * parte
+        fin = min(objeto['size'], inicio + parte) - 1
+        respuesta = cliente.upload_part_copy(
+            Bucket=bucket_destino, Key=clave_destino, UploadId=id_carga, PartNumber=numero,
+            CopySource={'Bucket': bucket_origen, 'Key': objeto['key']},
+            CopySourceRange=f"bytes={inicio}-{fin}",
+            CopySourceIfMatch=objeto['etag'],
+        )
+        return {'PartNumber': numero, 'ETag': respuesta['CopyPartResult']['ETag']}
+
+    total_partes = (objeto['size'] + parte - 1) // parte
+    try:
+        partes = list(ejecutor_partes.map(copiar_parte, range(1, total_partes + 1)))
+        cliente.complete_multipart_upload(Bucket=bucket_destino, Key=clave_destino, UploadId=id_carga,
+                                          MultipartUpload={'Parts': partes})
+    except Exception:
+        cliente.abort_multipart_upload(Bucket=bucket_destino, Key=clave_destino, UploadId=id_carga)
+        raise
+
+
+def copiar_objetos(cliente, bucket_origen, bucket_destino, objetos, hilos=64, hilos_partes=16,
+                   ruta_fallidos=None, intervalo_progreso=30, al_resultado=None, limite_concurrencia=None,
+                   md5_conocido=None):
+    # Devuelve estadísticas con las mismas claves que las de rclone para reutilizar reportes e historial.
+    # limite_concurrencia es una función que devuelve cuántas copias pueden estar activas en este momento;
+    # se consulta antes de cada objeto, así un cambio de horario se aplica sin reiniciar la copia.
+    # md5_conocido devuelve el MD5 del contenido de un objeto del origen si ya se calculó, o None.
+    estadisticas = {'bytes': 0, 'transfers': 0, 'errors': 0, 'elapsedTime': 0}
+    bloqueo = threading.Lock()
+    # Limita los objetos en vuelo para no cargar la lista completa en la cola del ejecutor
+    cupos = threading.BoundedSemaphore(hilos * 4)
+    activos = {'total': 0}
+    condicion = threading.Condition()
+    fallidos = open(ruta_fallidos, "w", encoding="utf-8") if ruta_fallidos else None
+    inicio = time.monotonic()
+    ultimo_progreso = inicio
+
+    def copiar(objeto):
+        if limite_concurrencia:
+            with condicion:
+                # Con tiempo de espera para notar también cuando el límite sube sin que termine ninguna copia
+                while not condicion.wait_for(lambda: activos['total'] < limite_concurrencia(), timeout=5):
+                    pass
+                activos['total'] += 1
+        inicio_objeto = time.monotonic()
+        try:
+            if objeto['size'] > UMBRAL_MULTIPARTE:
+                copiar_multiparte(cliente, ejecutor_partes, bucket_origen, bucket_destino, objeto,
+                                  md5=md5_conocido(objeto) if md5_conocido else None)
+            else:
+                copiar_simple(cliente, bucket_origen, bucket_destino, objeto)
+            with bloqueo:
+                estadisticas['bytes'] += objeto['size']
+                estadisticas['transfers'] += 1
+            if al_resultado:
+                al_resultado(objeto['key'], True, time.monotonic() - inicio_objeto)
+        except Exception as e:
+            print(f"ERROR : {objeto['key']}: copia en servidor fallida: {e}")
+            with bloqueo:
+                estadisticas['errors'] += 1
+                if fallidos:
+                    fallidos.write(objeto['key'] + "\n")
+            if al_resultado:
+                al_resultado(objeto['key'], False, time.monotonic() - inicio_objeto)
+        finally:
+            if limite_concurrencia:
+                with condicion:
+                    activos['total'] -= 1
+                    condicion.notify_all()
+            cupos.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=hilos_partes) as ejecutor_partes, \
+                ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            for objeto in objetos:
+                cupos.acquire()
+                ejecutor.submit(copiar, objeto)
+                if time.monotonic() - ultimo_progreso >= intervalo_progreso:
+                    ultimo_progreso = time.monotonic()
+                    with bloqueo:
+                        print(f"Progreso: {estadisticas['bytes']} bytes, {estadisticas['transfers']} transferencias, "
+                              f"{estadisticas['errors']} errores")
+    finally:
+        if fallidos:
+            fallidos.close()
+    estadisticas['elapsedTime'] = time.monotonic() - inicio
+    if estadisticas['elapsedTime']:
+        estadisticas['speed'] = estadisticas['bytes'] / estadisticas['elapsedTime']
+    return estadisticas
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+
+# Mensajes de rclone que indican que un objeto quedó en el destino
+MENSAJES_COPIADO = ("Copied (new)", "Copied (replaced existing)", "Copied (server-side copy)", "Unchanged skipping")
+
+# Un diario sin terminar se retoma solo si se creó dentro de este plazo
+VIGENCIA_SEGUNDOS = 24 * 3600
+
+
+def nombre_diario(indice_fragmento=None):
+    return "diario" if indice_fragmento is None else f"diario-fragmento-{indice_fragmento}"
+
+
+def ruta_estado(directorio, nombre):
+    return os.path.join(directorio, f"{nombre}.json")
+
+
+def ruta_eventos(directorio, nombre):
+    return os.path.join(directorio, f"{nombre}.objetos.jsonl")
+
+
+def nuevo_diario(bucket, nombre):
+    return {'nombre': nombre, 'bucket': bucket, 'creado': time.time(), 'fases': {}, 'terminado': False}
+
+
+def cargar_diario(directorio, nombre):
+    # Devuelve el diario de una ejecución anterior que no terminó, si todavía está vigente
+    ruta = ruta_estado(directorio, nombre)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as archivo:
+        diario = json.load(archivo)
+    if diario['terminado'] or time.time() - diario['creado'] > VIGENCIA_SEGUNDOS:
+        return None
+    return diario
+
+
+def guardar_diario(directorio, diario):
+    os.makedirs(directorio, exist_ok=True)
+    ruta = ruta_estado(directorio, diario['nombre'])
+    with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump(diario, archivo, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def fase_completa(diario, fase):
+    return fase in diario['fases']
+
+
+def completar_fase(directorio, diario, fase, **datos):
+    datos['completada'] = time.time()
+    diario['fases'][fase] = datos
+    return guardar_diario(directorio, diario)
+
+
+def reiniciar_eventos(directorio, nombre):
+    ruta = ruta_eventos(directorio, nombre)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def abrir_registro(directorio, nombre):
+    # Registro de solo agregado: una línea por objeto terminado; el último estado de cada clave es el válido
+    os.makedirs(directorio, exist_ok=True)
+    return {'archivo': open(ruta_eventos(directorio, nombre), "a", encoding="utf-8"), 'bloqueo': threading.Lock()}
+
+
+def cerrar_registro(registro):
+    registro['archivo'].close()
+
+
+def registrar_objeto(registro, clave, correcto):
+    with registro['bloqueo']:
+        registro['archivo'].write(json.dumps({'k': clave, 'ok': correcto}, separators=(",", ":")) + "\n")
+        registro['archivo'].flush()
+
+
+def registrar_evento_rclone(registro, evento):
+    if evento['tipo'] != 'log' or not evento.get('objeto'):
+        return
+    if evento['nivel'] in ('error', 'critical'):
+        registrar_objeto(registro, evento['objeto'], False)
+    elif evento['mensaje'].startswith(MENSAJES_COPIADO):
+        registrar_objeto(registro, evento['objeto'], True)
+
+
+def estados_objetos(directorio, nombre):
+    estados = {}
+    ruta = ruta_eventos(directorio, nombre)
+    if not os.path.exists(ruta):
+        return estados
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                # La última línea puede quedar cortada si el contenedor murió mientras escribía
+                continue
+            estados[evento['k']] = evento['ok']
+    return estados
+
+
+def escribir_pendientes(ruta_lista, ruta_pendientes, estados, solo_fallidos=False):
+    # Conserva el orden de la lista original para poder filtrar la instantánea a la par
+    total = 0
+    with open(ruta_lista, encoding="utf-8") as lista, open(ruta_pendientes, "w", encoding="utf-8") as pendientes:
+        for linea in lista:
+            clave = linea.rstrip("\n")
+            estado = estados.get(clave)
+            if estado is True or (solo_fallidos and estado is None):
+                continue
+            pendientes.write(clave + "\n")
+            total += 1
+    return total
+
+
+def motor_fallido(resultado):
+    # Un código distinto de cero sin líneas por objeto (credenciales, lista inválida, 403 en el destino)
+    # no deja rastro en el registro: en ese caso las claves sin estado también se consideran pendientes
+    return bool(resultado and resultado.get('codigo'))
+
+
+def sumar_estadisticas(total, estadisticas):
+    # Suma los contadores de un intento a los anteriores, también los anidados (las réplicas por destino).
+    # Las listas de transferencias en curso no se suman y la velocidad se recalcula con el total.
+    for campo, valor in (estadisticas or {}).items():
+        if isinstance(valor, dict):
+            sumar_estadisticas(total.setdefault(campo, {}), valor)
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool) and campo != 'speed':
+            total[campo] = total.get(campo, 0) + valor
+    if total.get('elapsedTime'):
+        total['speed'] = total.get('bytes', 0) / total['elapsedTime']
+    return total
+
+
+def acumular_resultado(acumulado, resultado):
+    # El código es el del último intento (decide qué se reintenta); las estadísticas son las de todos
+    if acumulado is None:
+        acumulado = {'codigo': 0, 'estadisticas': {}}
+    acumulado['codigo'] = resultado.get('codigo')
+    sumar_estadisticas(acumulado['estadisticas'], resultado.get('estadisticas'))
+    return acumulado
+
+
+def copiar_con_reintentos(copiar_lista, directorio, nombre, ruta_lista, reintentos=3, espera_inicial=30,
+                          al_reintento=None):
+    # Primero se copian las claves pendientes de la lista; luego solo las que fallaron, con espera exponencial.
+    # Si el motor terminó con error, se reintentan también las claves que no quedaron registradas.
+    # Devuelve el código del último intento con las estadísticas sumadas de todos.
+    ruta_pendientes = ruta_lista + ".pendientes"
+    pendientes = escribir_pendientes(ruta_lista, ruta_pendientes, estados_objetos(directorio, nombre))
+    print(f"Objetos pendientes de copiar: {pendientes}")
+    resultado = None
+    if pendientes:
+        resultado = acumular_resultado(resultado, copiar_lista(ruta_pendientes))
+
+    for intento in range(1, reintentos + 1):
+        fallidos = escribir_pendientes(ruta_lista, ruta_pendientes, estados_objetos(directorio, nombre),
+                                       solo_fallidos=not motor_fallido(resultado))
+        if not fallidos:
+            break
+        espera = espera_inicial * 2 ** (intento - 1)
+        print(f"Reintento {intento} de {reintentos}: {fallidos} objetos fallidos, esperando {espera} s...")
+        time.sleep(espera)
+        if al_reintento:
+            al_reintento(intento, fallidos)
+        resultado = acumular_resultado(resultado, copiar_lista(ruta_pendientes))
+
+    fallidos = escribir_pendientes(ruta_lista, ruta_pendientes, estados_objetos(directorio, nombre),
+                                   solo_fallidos=not motor_fallido(resultado))
+    return resultado, fallidos
@@ -0,0 +1,113 @@
+import collections
+import json
+import re
+import subprocess
+import threading
+
+# Cantidad de líneas crudas que se conservan de cada salida para reportar errores
+LINEAS_MAXIMAS = 200
+
+# Formato de texto de rclone: "2024/01/31 22:10:05 ERROR : clave/objeto: Failed to copy: ..."
+PATRON_LOG_TEXTO = re.compile(
+    r"^\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)? (DEBUG|INFO|NOTICE|ERROR|CRITICAL)\s*: (?:(.*?): )?(.*)$"
+)
+
+
+def interpretar_linea(linea):
+    # Convierte una línea de log de rclone (JSON con --use-json-log o texto plano) en un evento
+    if linea.startswith("{"):
+        try:
+            datos = json.loads(linea)
+        except ValueError:
+            return None
+        if 'stats' in datos:
+            return {'tipo': 'estadisticas', 'nivel': datos.get('level', 'info'), 'datos': datos['stats']}
+        return {
+            'tipo': 'log',
+            'nivel': datos.get('level', 'info'),
+            'mensaje': datos.get('msg', ''),
+            'objeto': datos.get('object'),
+        }
+    coincidencia = PATRON_LOG_TEXTO.match(linea)
+    if coincidencia:
+        nivel, objeto, mensaje = coincidencia.groups()
+        return {'tipo': 'log', 'nivel': nivel.lower(), 'mensaje': mensaje, 'objeto': objeto}
+    return None
+
+
+def _leer_stderr(flujo, resultado, al_evento, mostrar):
+    for linea in flujo:
+        linea = linea.rstrip("\n")
+        resultado['stderr'].append(linea)
+        evento = interpretar_linea(linea)
+        if evento is None:
+            if mostrar and linea:
+                print(linea)
+            continue
+        resultado['eventos'][evento['nivel']] += 1
+        if evento['tipo'] == 'estadisticas':
+            resultado['estadisticas'] = evento['datos']
+        elif evento['nivel'] in ('error', 'critical'):
+            resultado['errores'].append(linea)
+        if mostrar and evento['nivel'] != 'debug':
+            if evento['tipo'] == 'estadisticas':
+                datos = evento['datos']
+                print(f"Progreso: {datos.get('bytes', 0)} bytes, {datos.get('transfers', 0)} transferencias, "
+                      f"{datos.get('errors', 0)} errores, {int(datos.get('speed', 0))} B/s")
+            else:
+                objeto = f"{evento['objeto']}: " if evento['objeto'] else ""
+                print(f"{evento['nivel'].upper()} : {objeto}{evento['mensaje']}")
+        if al_evento:
+            al_evento(evento)
+
+
+def _leer_stdout(flujo, resultado, al_linea_stdout):
+    for linea in flujo:
+        linea = linea.rstrip("\n")
+        if al_linea_stdout:
+            al_linea_stdout(linea)
+        else:
+            resultado['stdout'].append(linea)
+
+
+def construir_comando_copia(origen, destino, flags_parametros, ruta_lista, dry_run=False, flags_extra="",
+                            config="rclone.conf"):
+    # Copia guiada por la lista de claves de la instantánea, sin volver a recorrer origen ni destino
+    return (
+        f"rclone {'--dry-run ' if dry_run else ''}copy {origen} {destino} "
+        f"{flags_parametros}"
+        f"--files-from-raw {ruta_lista} --no-traverse "
+        f"{flags_extra}"
+        f"-vv --use-json-log --stats 30s {'' if dry_run else '--checksum '}--config {config}"
+    )
+
+
+def ejecutar_rclone(comando, al_evento=None, al_linea_stdout=None, lineas_maximas=LINEAS_MAXIMAS, mostrar=True,
+                    al_iniciar=None):
+    # Lee stdout y stderr línea por línea mientras el proceso corre.
+    # Solo se conserva un búfer circular de líneas crudas, así la memoria no crece con la cantidad de objetos;
+    # quien necesite toda la salida (por ejemplo un listado) la recibe por al_linea_stdout.
+    print(f"Ejecutando comando: {comando}")
+    resultado = {
+        'codigo': None,
+        'stdout': collections.deque(maxlen=lineas_maximas),
+        'stderr': collections.deque(maxlen=lineas_maximas),
+        'errores': collections.deque(maxlen=lineas_maximas),
+        'eventos': collections.Counter(),
+        'estadisticas': None,
+    }
+    proceso = subprocess.Popen(comando, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding="utf-8", errors="replace", bufsize=1)
+    if al_iniciar:
+        al_iniciar(proceso)
+    hilo_stderr = threading.Thread(target=_leer_stderr, args=(proceso.stderr, resultado, al_evento, mostrar),
+                                   daemon=True)
+    hilo_stderr.start()
+    _leer_stdout(proceso.stdout, resultado, al_linea_stdout)
+    hilo_stderr.join()
+    resultado['codigo'] = proceso.wait()
+    if resultado['codigo'] != 0:
+        print(f"rclone terminó con código {resultado['codigo']}. Últimas líneas de error:")
+        for linea in resultado['errores'] or resultado['stderr']:
+            print(linea)
+    return resultado
@@ -0,0 +1,193 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+KB = 1024
+MB = 1024 * 1024
+PREFIJO_PAQUETES = "_paquetes"
+# Campos que se agregan a las entradas del manifiesto de los objetos empaquetados
+CAMPOS_PAQUETE = ('paquete', 'desplazamiento', 'longitud')
+
+
+def ruta_indice_local(directorio, nombre):
+    return os.path.join(directorio, f"{nombre}.indice.jsonl")
+
+
+def clave_paquete(nombre, numero):
+    return f"{PREFIJO_PAQUETES}/{nombre}/paquete-{numero:06d}.tar"
+
+
+def clave_indice(nombre):
+    return f"{PREFIJO_PAQUETES}/{nombre}/indice.jsonl.gz"
+
+
+def leer_indice(ruta):
+    # Índice local de solo agregado: una línea por objeto de cada paquete ya subido
+    entradas = {}
+    if not os.path.exists(ruta):
+        return entradas
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                continue
+            entradas[entrada['key']] = entrada
+    return entradas
+
+
+def descartar(ruta, claves):
+    # Quita del índice local los objetos cuyo paquete no pasó la verificación: el próximo empaquetado
+    # los vuelve a poner en un paquete nuevo. Devuelve cuántos se quitaron.
+    entradas = leer_indice(ruta)
+    quitados = [clave for clave in claves if clave in entradas]
+    if not quitados:
+        return 0
+    for clave in quitados:
+        del entradas[clave]
+    ruta_temporal = ruta + ".tmp"
+    with open(ruta_temporal, "w", encoding="utf-8") as archivo:
+        for entrada in entradas.values():
+            archivo.write(json.dumps(entrada, separators=(",", ":")) + "\n")
+    os.replace(ruta_temporal, ruta)
+    return len(quitados)
+
+
+def descargar(cliente, bucket, objeto):
+    # Los objetos pequeños nunca son multiparte: el ETag es el MD5 del contenido y sirve para verificarlo
+    contenido = cliente.get_object(Bucket=bucket, Key=objeto['key'], IfMatch=objeto['etag'])['Body'].read()
+    if len(contenido) != objeto['size'] or hashlib.md5(contenido).hexdigest() != objeto['etag']:
+        raise ValueError(f"el contenido descargado de {objeto['key']} no coincide con la instantánea")
+    return contenido
+
+
+def empaquetar(cliente_origen, cliente_destino, bucket_origen, bucket_destino, objetos, nombre, directorio,
+               ruta_lista_sueltos, umbral=64 * KB, tamano_paquete=256 * MB, hilos=64, subidas=2):
+    # Agrupa los objetos de hasta `umbral` bytes en archivos tar sin comprimir de ~tamano_paquete: un PUT por
+    # paquete en lugar de uno por objeto. Cada objeto queda contiguo dentro del tar, así se recupera con un
+    # solo GET con Range usando el desplazamiento y la longitud del índice.
+    # `objetos` es una función que devuelve los objetos a copiar; se recorre dos veces.
+    os.makedirs(directorio, exist_ok=True)
+    ruta_indice = ruta_indice_local(directorio, nombre)
+    empaquetados = leer_indice(ruta_indice)
+    resumen = {'objetos': 0, 'bytes': 0, 'paquetes': 0, 'errores': 0, 'reanudados': len(empaquetados)}
+
+    bloqueo = threading.Lock()
+    cupos = threading.BoundedSemaphore(hilos * 4)
+    indice = open(ruta_indice, "a", encoding="utf-8")
+    actual = {'tar': None, 'ruta': None, 'entradas': [],
+              'numero': max((entrada['numero'] for entrada in empaquetados.values()), default=0)}
+
+    def subir(ruta, numero, entradas):
+        # Los objetos de un paquete se anotan en el índice recién cuando el paquete está subido
+        try:
+            cliente_destino.upload_file(ruta, bucket_destino, clave_paquete(nombre, numero))
+        except Exception as e:
+            print(f"ERROR : {clave_paquete(nombre, numero)}: no se pudo subir el paquete: {e}")
+            with bloqueo:
+                resumen['errores'] += len(entradas)
+            return
+        finally:
+            os.remove(ruta)
+        with bloqueo:
+            for entrada in entradas:
+                indice.write(json.dumps(entrada, separators=(",", ":")) + "\n")
+                empaquetados[entrada['key']] = entrada
+            indice.flush()
+            resumen['paquetes'] += 1
+            resumen['objetos'] += len(entradas)
+            resumen['bytes'] += sum(entrada['longitud'] for entrada in entradas)
+        print(f"Paquete {clave_paquete(nombre, numero)}: {len(entradas)} objetos")
+
+    def cerrar_paquete():
+        actual['tar'].close()
+        ejecutor_subidas.submit(subir, actual['ruta'], actual['numero'], actual['entradas'])
+        actual['tar'] = None
+
+    def agregar(objeto):
+        try:
+            contenido = descargar(cliente_origen, bucket_origen, objeto)
+            with bloqueo:
+                if actual['tar'] is None:
+                    actual['numero'] += 1
+                    actual['ruta'] = os.path.join(directorio, f"{nombre}.paquete-{actual['numero']:06d}.tar")
+                    actual['tar'] = tarfile.open(actual['ruta'], "w", format=tarfile.PAX_FORMAT)
+                    actual['entradas'] = []
+                informacion = tarfile.TarInfo(objeto['key'])
+                informacion.size = len(contenido)
+                informacion.mtime = datetime.fromisoformat(objeto['mtime']).timestamp()
+                actual['tar'].addfile(informacion, io.BytesIO(contenido))
+                # Después de addfile, el contenido termina justo antes del relleno hasta el bloque de 512 bytes
+                relleno = (tarfile.BLOCKSIZE - len(contenido) % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+                actual['entradas'].append({
+                    'key': objeto['key'], 'size': objeto['size'], 'etag': objeto['etag'], 'mtime': objeto['mtime'],
+                    'numero': actual['numero'], 'paquete': clave_paquete(nombre, actual['numero']),
+                    'desplazamiento': actual['tar'].offset - relleno - len(contenido), 'longitud': len(contenido),
+                })
+                if actual['tar'].offset >= tamano_paquete:
+                    cerrar_paquete()
+        except Exception as e:
+            # El objeto sigue por la copia normal en lugar de quedar fuera del backup
+            print(f"ERROR : {objeto['key']}: no se pudo empaquetar: {e}")
+            with bloqueo:
+                resumen['errores'] += 1
+        finally:
+            cupos.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=subidas) as ejecutor_subidas:
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                for objeto in objetos():
+                    if objeto['size'] <= umbral and objeto['key'] not in empaquetados:
+                        cupos.acquire()
+                        ejecutor.submit(agregar, objeto)
+            if actual['tar'] is not None:
+                cerrar_paquete()
+    finally:
+        indice.close()
+
+    # Todo lo que no quedó en un paquete subido (objetos grandes y fallidos) va a la copia normal,
+    # en el mismo orden de la instantánea para poder filtrarla después con esta lista
+    with open(ruta_lista_sueltos, "w", encoding="utf-8") as lista:
+        for objeto in objetos():
+            if objeto['key'] not in empaquetados:
+                lista.write(objeto['key'] + "\n")
+    subir_indice(cliente_destino, bucket_destino, ruta_indice, nombre)
+    return resumen
+
+
+def subir_indice(cliente_destino, bucket_destino, ruta_indice, nombre):
+    # El índice queda junto a los paquetes, comprimido, para poder restaurar sin el disco del contenedor
+    ruta_comprimida = ruta_indice + ".gz"
+    with open(ruta_indice, "rb") as origen, gzip.open(ruta_comprimida, "wb") as destino:
+        destino.write(origen.read())
+    cliente_destino.upload_file(ruta_comprimida, bucket_destino, clave_indice(nombre))
+
+
+def anotar_manifiesto(ruta_manifiesto, ruta_indice, bucket_destino):
+    # Los objetos empaquetados hoy guardan en el manifiesto dónde quedaron, para restaurarlos
+    # y para que los manifiestos de los días siguientes conserven la ubicación al referenciarlos
+    indice = leer_indice(ruta_indice)
+    ruta_temporal = ruta_manifiesto + ".tmp"
+    with gzip.open(ruta_manifiesto, "rt", encoding="utf-8") as entrada, \
+            gzip.open(ruta_temporal, "wt", encoding="utf-8") as salida:
+        for linea in entrada:
+            registro = json.loads(linea)
+            ubicacion = indice.get(registro['key']) if registro['bucket'] == bucket_destino else None
+            if ubicacion:
+                registro.update({campo: ubicacion[campo] for campo in CAMPOS_PAQUETE})
+            salida.write(json.dumps(registro, separators=(",", ":")) + "\n")
+    os.replace(ruta_temporal, ruta_manifiesto)
+
+
+def leer_objeto(cliente, bucket, entrada):
+    # Un GET con Range sobre el paquete devuelve exactamente el contenido del objeto
+    inicio = entrada['desplazamiento']
+    fin = inicio + entrada['longitud'] - 1
+    return cliente.get_object(Bucket=bucket, Key=entrada['paquete'], Range=f"bytes={inicio}-{fin}")['Body'].read()
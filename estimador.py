@@ -0,0 +1,111 @@
+import json
+import math
+import os
+
+from copia_servidor import UMBRAL_MULTIPARTE, tamano_parte
+from replicacion import tamano_parte as tamano_parte_replica
+
+MB = 1024 * 1024
+# Ejecuciones anteriores del mismo origen que se usan para ajustar el modelo de duración
+EJECUCIONES_MODELO = 20
+
+
+def contar_peticiones(objetos, parametros, motor, destinos=1):
+    # Peticiones de clase A (PUT, COPY, POST de multiparte) y de clase B (GET, HEAD) que hará la copia.
+    # rclone con --no-traverse hace un HEAD en el destino y un GET en el origen por objeto; los objetos
+    # por encima de upload_cutoff se suben en partes de chunk_size. La copia en servidor hace un copy_object,
+    # o HEAD + create + una upload_part_copy por parte + complete por encima de UMBRAL_MULTIPARTE.
+    # La copia con réplicas hace un solo GET en el origen y, en cada uno de los `destinos`, un PUT
+    # o create + una upload_part por parte + complete por encima de chunk_size.
+    conteo = {'objetos': 0, 'bytes': 0, 'clase_a': 0, 'clase_b': 0, 'multiparte': 0}
+    corte = parametros['s3_upload_cutoff_mb'] * MB
+    parte = parametros['s3_chunk_size_mb'] * MB
+    for objeto in objetos:
+        conteo['objetos'] += 1
+        conteo['bytes'] += objeto['size']
+        if motor == "servidor":
+            if objeto['size'] > UMBRAL_MULTIPARTE:
+                conteo['multiparte'] += 1
+                conteo['clase_a'] += 2 + math.ceil(objeto['size'] / tamano_parte(objeto['size']))
+                conteo['clase_b'] += 1
+            else:
+                conteo['clase_a'] += 1
+            continue
+        if motor == "replicacion":
+            conteo['clase_b'] += 1
+            if objeto['size'] > parte:
+                conteo['multiparte'] += 1
+                conteo['clase_a'] += destinos * (2 + math.ceil(objeto['size'] / tamano_parte_replica(objeto['size'],
+                                                                                                     parte)))
+            else:
+                conteo['clase_a'] += destinos
+            continue
+        conteo['clase_b'] += 2
+        if objeto['size'] > corte:
+            conteo['multiparte'] += 1
+            conteo['clase_a'] += 2 + math.ceil(objeto['size'] / parte)
+        else:
+            conteo['clase_a'] += 1
+    return conteo
+
+
+def leer_historial(ruta_historial, origen, maximo=EJECUCIONES_MODELO):
+    if not os.path.exists(ruta_historial):
+        return []
+    registros = []
+    with open(ruta_historial, encoding="utf-8") as historial:
+        for linea in historial:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            if registro.get('origen') == origen and registro.get('segundos_copia') and registro.get('bytes_copiados'):
+                registros.append(registro)
+    return registros[-maximo:]
+
+
+def ajustar_modelo(registros):
+    # segundos ≈ segundos_por_byte * bytes + segundos_por_objeto * objetos, por mínimos cuadrados sin término
+    # independiente. El segundo término captura el costo por petición que domina con objetos pequeños.
+    # Con pocos datos, o si el ajuste da coeficientes negativos, queda solo la velocidad media.
+    puntos = [(registro['bytes_copiados'], registro.get('objetos_copiados') or 0, registro['segundos_copia'])
+              for registro in registros]
+    if not puntos:
+        return None
+    sbb = sum(b * b for b, _, _ in puntos)
+    soo = sum(o * o for _, o, _ in puntos)
+    sbo = sum(b * o for b, o, _ in puntos)
+    sbt = sum(b * t for b, _, t in puntos)
+    sot = sum(o * t for _, o, t in puntos)
+    determinante = sbb * soo - sbo * sbo
+    if len(puntos) >= 2 and determinante > 0:
+        por_byte = (sbt * soo - sot * sbo) / determinante
+        por_objeto = (sot * sbb - sbt * sbo) / determinante
+        if por_byte > 0 and por_objeto >= 0:
+            return {'segundos_por_byte': por_byte, 'segundos_por_objeto': por_objeto, 'ejecuciones': len(puntos)}
+    return {'segundos_por_byte': sum(t for _, _, t in puntos) / sum(b for b, _, _ in puntos),
+            'segundos_por_objeto': 0.0, 'ejecuciones': len(puntos)}
+
+
+def estimar(objetos, parametros, motor, ruta_historial, origen, velocidad_sondeo=None, ventana_minutos=0,
+            precio_clase_a=0.0, precio_clase_b=0.0, destinos=1):
+    # Predicción a partir de la lista a copiar y del historial de autoajuste; reemplaza al dry run completo
+    estimacion = contar_peticiones(objetos, parametros, motor, destinos)
+    estimacion['motor'] = motor
+    modelo = ajustar_modelo(leer_historial(ruta_historial, origen))
+    if modelo:
+        estimacion['segundos'] = round(modelo['segundos_por_byte'] * estimacion['bytes']
+                                       + modelo['segundos_por_objeto'] * estimacion['objetos'])
+        estimacion['fuente'] = f"historial ({modelo['ejecuciones']} ejecuciones)"
+    elif velocidad_sondeo:
+        estimacion['segundos'] = round(estimacion['bytes'] / velocidad_sondeo)
+        estimacion['fuente'] = "sondeo"
+    else:
+        estimacion['segundos'] = None
+        estimacion['fuente'] = "sin datos"
+    # Precios por cada 1000 peticiones; con 0 no se informa costo
+    if precio_clase_a or precio_clase_b:
+        estimacion['costo_peticiones'] = round(estimacion['clase_a'] / 1000 * precio_clase_a
+                                               + estimacion['clase_b'] / 1000 * precio_clase_b, 4)
+    estimacion['excede_ventana'] = bool(ventana_minutos and estimacion['segundos'] is not None
+                                        and estimacion['segundos'] > ventana_minutos * 60)
+    return estimacion
@@ -0,0 +1,109 @@
+import hashlib
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ejecutor import ejecutar_rclone
+
+# Campos de las estadísticas de rclone que se suman entre fragmentos
+CAMPOS_SUMABLES = ('bytes', 'totalBytes', 'checks', 'totalChecks', 'transfers', 'totalTransfers',
+                   'errors', 'retryError', 'deletes', 'renames')
+
+
+def fragmento_por_hash(clave, total):
+    # Rangos del espacio de hash: los primeros 8 bytes del MD5 se reparten en N rangos contiguos.
+    # El resultado es determinista, así cada réplica puede calcular su parte sin coordinarse.
+    valor = int.from_bytes(hashlib.md5(clave.encode("utf-8")).digest()[:8], "big")
+    return (valor * total) >> 64
+
+
+def prefijo_de(clave, profundidad=1):
+    partes = clave.split("/")
+    if len(partes) <= profundidad:
+        return ""
+    return "/".join(partes[:profundidad])
+
+
+def asignar_prefijos(objetos, total, profundidad=1):
+    # Reparte los prefijos en N fragmentos equilibrados por bytes:
+    # el prefijo más grande va al fragmento con menos carga (primero el trabajo más largo)
+    bytes_por_prefijo = {}
+    for objeto in objetos:
+        prefijo = prefijo_de(objeto['key'], profundidad)
+        bytes_por_prefijo[prefijo] = bytes_por_prefijo.get(prefijo, 0) + objeto['size']
+
+    cargas = [(0, indice) for indice in range(total)]
+    asignacion = {}
+    for prefijo, tamano in sorted(bytes_por_prefijo.items(), key=lambda item: (-item[1], item[0])):
+        carga, indice = heapq.heappop(cargas)
+        asignacion[prefijo] = indice
+        heapq.heappush(cargas, (carga + tamano, indice))
+    return asignacion
+
+
+def ruta_lista_fragmento(ruta_base, indice):
+    return f"{ruta_base}.fragmento-{indice}.txt"
+
+
+def escribir_listas_fragmentos(objetos, total, ruta_base, modo="hash", asignacion_prefijos=None, profundidad=1,
+                               solo_fragmento=None):
+    # Una lista --files-from-raw por fragmento; con solo_fragmento se escribe únicamente la propia
+    resumen = [{'indice': indice, 'objetos': 0, 'bytes': 0} for indice in range(total)]
+    indices = range(total) if solo_fragmento is None else [solo_fragmento]
+    listas = {indice: open(ruta_lista_fragmento(ruta_base, indice), "w", encoding="utf-8") for indice in indices}
+    try:
+        for objeto in objetos:
+            if modo == "prefijo":
+                indice = asignacion_prefijos[prefijo_de(objeto['key'], profundidad)]
+            else:
+                indice = fragmento_por_hash(objeto['key'], total)
+            resumen[indice]['objetos'] += 1
+            resumen[indice]['bytes'] += objeto['size']
+            if indice in listas:
+                listas[indice].write(objeto['key'] + "\n")
+    finally:
+        for lista in listas.values():
+            lista.close()
+    return resumen
+
+
+def reporte_fragmento(indice, total, resultado):
+    reporte = {'indice': indice, 'total': total, 'codigo': resultado['codigo']}
+    reporte.update(resultado['estadisticas'] or {})
+    reporte.pop('transferring', None)
+    reporte.pop('checking', None)
+    return reporte
+
+
+def combinar_reportes(reportes):
+    # Los contadores se suman; la duración es la del fragmento más lento
+    combinado = {'fragmentos': len(reportes), 'codigo': 0, 'elapsedTime': 0}
+    for campo in CAMPOS_SUMABLES:
+        combinado[campo] = sum(reporte.get(campo, 0) for reporte in reportes)
+    for reporte in reportes:
+        combinado['codigo'] = max(combinado['codigo'], reporte.get('codigo') or 0)
+        combinado['elapsedTime'] = max(combinado['elapsedTime'], reporte.get('elapsedTime', 0))
+    if combinado['elapsedTime']:
+        combinado['speed'] = combinado['bytes'] / combinado['elapsedTime']
+    combinado['detalle'] = sorted(reportes, key=lambda reporte: reporte['indice'])
+    return combinado
+
+
+def ejecutar_fragmentos_locales(comandos, al_evento=None):
+    # Un proceso rclone por fragmento; los hilos solo esperan y leen la salida de cada proceso
+    def ejecutar(indice_comando):
+        indice, comando = indice_comando
+        resultado = ejecutar_rclone(comando, mostrar=False, al_evento=al_evento)
+        print(f"Fragmento {indice} terminó con código {resultado['codigo']}.")
+        return reporte_fragmento(indice, len(comandos), resultado)
+
+    with ThreadPoolExecutor(max_workers=len(comandos)) as ejecutor:
+        reportes = list(ejecutor.map(ejecutar, enumerate(comandos)))
+    return combinar_reportes(reportes)
+
+
+def guardar_reporte(reporte, ruta):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(reporte, archivo, indent=2)
@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from cliente_cos import crear_cliente_iam
+from gestor_secretos import cargar_secretos
+from horario import ZONA_LIMA
+from manifiesto import SERIE_POR_DEFECTO, fecha_de_bucket, serie_de_bucket
+
+# Series de buckets diarios que se administran, separadas por comas (por ejemplo "backup,backup-local").
+# Siempre es una lista explícita: en la cuenta puede haber buckets con fecha en el nombre que no son respaldos
+SERIES_GESTION = os.environ.get("SERIES_GESTION", SERIE_POR_DEFECTO)
+HILOS_GESTION = int(os.environ.get("HILOS_GESTION", "32"))
+# Días después de la expiración antes de eliminar el bucket, para no competir con la política de ciclo de vida
+MARGEN_ELIMINACION_DIAS = int(os.environ.get("MARGEN_ELIMINACION_DIAS", "1"))
+# Por defecto solo se eliminan los buckets que la expiración ya dejó vacíos
+VACIAR_VENCIDOS = os.environ.get("VACIAR_VENCIDOS", "false").lower() == "true"
+SIMULAR_GESTION = os.environ.get("SIMULAR_GESTION", "false").lower() == "true"
+
+MAXIMO_CLAVES_BORRADO = 1000
+
+
+def politica_ciclo_vida(dias_archivar, dias_eliminar):
+    return {
+        'Rules': [
+            {
+                'ID': 'ArchiveAllObjects',
+                'Status': 'Enabled',
+                'Filter': {},
+                'Transitions': [
+                    {
+                        'Days': int(dias_archivar),
+                        'StorageClass': 'GLACIER'
+                    }
+                ]
+            },
+            {
+                'ID': 'DeleteAllObjects',
+                'Status': 'Enabled',
+                'Filter': {},
+                'Expiration': {
+                    'Days': int(dias_eliminar)
+                }
+            }
+        ]
+    }
+
+
+def listar_buckets_respaldo(cliente, series):
+    # Un solo ListBuckets para toda la cuenta; se quedan solo los buckets diarios de las series pedidas
+    buckets = []
+    for bucket in cliente.list_buckets().get('Buckets', []):
+        nombre = bucket['Name']
+        try:
+            fecha = fecha_de_bucket(nombre)
+        except ValueError:
+            continue
+        if fecha is None or serie_de_bucket(nombre) not in series:
+            continue
+        buckets.append({'nombre': nombre, 'serie': serie_de_bucket(nombre), 'fecha': fecha})
+    return sorted(buckets, key=lambda bucket: bucket['nombre'])
+
+
+def reglas_vigentes(cliente, bucket):
+    try:
+        return cliente.get_bucket_lifecycle_configuration(Bucket=bucket).get('Rules', [])
+    except cliente.exceptions.ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'NoSuchLifecycleConfiguration':
+            return []
+        raise
+
+
+def resumir_reglas(reglas):
+    # Solo lo que define la política: las respuestas de COS agregan campos vacíos que no importan al comparar
+    return sorted(
+        (regla.get('ID'), regla.get('Status'),
+         tuple((transicion.get('Days'), transicion.get('StorageClass')) for transicion in regla.get('Transitions', [])),
+         regla.get('Expiration', {}).get('Days'))
+        for regla in reglas
+    )
+
+
+def aplicar_politica(cliente, bucket, politica, simular=False):
+    # Devuelve True si la política cambió; los buckets que ya la tienen no reciben un PUT
+    if resumir_reglas(reglas_vigentes(cliente, bucket)) == resumir_reglas(politica['Rules']):
+        return False
+    if not simular:
+        cliente.put_bucket_lifecycle_configuration(Bucket=bucket, LifecycleConfiguration=politica)
+    return True
+
+
+def vaciar_bucket(cliente, bucket, simular=False):
+    # Borra los objetos en lotes de 1000 y cancela las cargas multiparte abiertas; devuelve los objetos borrados
+    borrados = 0
+    paginador = cliente.get_paginator('list_objects_v2')
+    for pagina in paginador.paginate(Bucket=bucket):
+        claves = [{'Key': objeto['Key']} for objeto in pagina.get('Contents', [])]
+        for inicio in range(0, len(claves), MAXIMO_CLAVES_BORRADO):
+            lote = claves[inicio:inicio + MAXIMO_CLAVES_BORRADO]
+            if not simular:
+                respuesta = cliente.delete_objects(Bucket=bucket, Delete={'Objects': lote, 'Quiet': True})
+                if respuesta.get('Errors'):
+                    raise RuntimeError(f"No se pudieron borrar {len(respuesta['Errors'])} objetos de {bucket}: "
+                                       f"{respuesta['Errors'][0]}")
+            borrados += len(lote)
+    for carga in cliente.list_multipart_uploads(Bucket=bucket).get('Uploads', []):
+        if not simular:
+            cliente.abort_multipart_upload(Bucket=bucket, Key=carga['Key'], UploadId=carga['UploadId'])
+    return borrados
+
+
+def bucket_vacio(cliente, bucket):
+    return not cliente.list_objects_v2(Bucket=bucket, MaxKeys=1).get('Contents')
+
+
+def gestionar(cliente, dias_archivar, dias_eliminar, series, hilos=32, hoy=None, margen_dias=1,
+              vaciar=False, simular=False):
+    # Revisa en paralelo, con el mismo cliente, los buckets diarios de las series indicadas: los vencidos
+    # se eliminan y los vigentes reciben la política de ciclo de vida actual si la que tienen es distinta
+    if not series or "*" in series:
+        raise ValueError("La gestión de buckets necesita una lista explícita de series.")
+    hoy = hoy or datetime.now(ZONA_LIMA).date()
+    limite = hoy - timedelta(days=int(dias_eliminar) + margen_dias)
+    politica = politica_ciclo_vida(dias_archivar, dias_eliminar)
+    buckets = listar_buckets_respaldo(cliente, series)
+    resumen = {'buckets': len(buckets), 'politicas_actualizadas': 0, 'eliminados': 0, 'vencidos_con_objetos': 0,
+               'objetos_borrados': 0, 'errores': 0}
+    bloqueo = threading.Lock()
+
+    def procesar(bucket):
+        nombre = bucket['nombre']
+        try:
+            if bucket['fecha'] <= limite:
+                if not bucket_vacio(cliente, nombre):
+                    if not vaciar:
+                        print(f"El bucket vencido {nombre} todavía tiene objetos; se conserva.")
+                        with bloqueo:
+                            resumen['vencidos_con_objetos'] += 1
+                        return
+                    borrados = vaciar_bucket(cliente, nombre, simular)
+                    with bloqueo:
+                        resumen['objetos_borrados'] += borrados
+                if not simular:
+                    cliente.delete_bucket(Bucket=nombre)
+                print(f"Bucket vencido eliminado: {nombre}{' (simulado)' if simular else ''}")
+                with bloqueo:
+                    resumen['eliminados'] += 1
+            elif aplicar_politica(cliente, nombre, politica, simular):
+                print(f"Política de ciclo de vida actualizada: {nombre}{' (simulado)' if simular else ''}")
+                with bloqueo:
+                    resumen['politicas_actualizadas'] += 1
+        except Exception as e:
+            print(f"ERROR : {nombre}: {e}")
+            with bloqueo:
+                resumen['errores'] += 1
+
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(procesar, buckets))
+    return resumen
+
+
+def main():
+    series = [serie.strip() for serie in SERIES_GESTION.split(",") if serie.strip()]
+    if not series or "*" in series:
+        # Con todas las series se podrían vaciar o eliminar buckets de otros equipos
+        print("Error: SERIES_GESTION tiene que listar las series a administrar, separadas por comas.")
+        return 1
+    secretos = cargar_secretos()
+    resumen = gestionar(
+        crear_cliente_iam(secretos), secretos['DIAS_PARA_ARCHIVAR'], secretos['DIAS_PARA_ELIMINAR'], series,
+        hilos=HILOS_GESTION, margen_dias=MARGEN_ELIMINACION_DIAS, vaciar=VACIAR_VENCIDOS, simular=SIMULAR_GESTION,
+    )
+    print(f"Gestión de buckets terminada: {resumen}")
+    return 1 if resumen['errores'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from perfil_arranque import importar
+
+URL_SECRETS_MANAGER = os.environ.get(
+    "SECRETS_MANAGER_URL",
+    'https://65e7ac31-7d3d-4c5f-9545-f848e11f8a26.private.us-south.secrets-manager.appdomain.cloud'
+)
+# Un secreto más nuevo que TTL se usa sin consultar; hasta ANTIGUEDAD_MAXIMA se usa y se refresca en segundo plano
+TTL_SECRETOS = int(os.environ.get("TTL_SECRETOS_SEGUNDOS", "3600"))
+ANTIGUEDAD_MAXIMA_SECRETOS = int(os.environ.get("ANTIGUEDAD_MAXIMA_SECRETOS_SEGUNDOS", "86400"))
+# El token IAM se renueva este número de segundos antes de expirar
+MARGEN_TOKEN = 300
+RUTA_CACHE = os.environ.get("RUTA_CACHE_SECRETOS")
+CLAVE_CACHE = os.environ.get("CLAVE_CACHE_SECRETOS")
+
+_bloqueo = threading.RLock()
+_token = {'access_token': None, 'expiration': 0}
+_secretos = {}
+_refrescos_en_curso = set()
+_cliente = None
+_cache_cargado = False
+
+
+def _fernet():
+    # El cifrado del caché en disco es opcional: requiere el paquete cryptography y una clave Fernet
+    if not (RUTA_CACHE and CLAVE_CACHE):
+        return None
+    try:
+        return importar("cryptography.fernet").Fernet(CLAVE_CACHE.encode())
+    except ImportError:
+        print("El paquete cryptography no está instalado, no se usa el caché de secretos en disco.")
+        return None
+
+
+def _cargar_cache_disco():
+    global _cache_cargado
+    if _cache_cargado:
+        return
+    _cache_cargado = True
+    fernet = _fernet()
+    if fernet is None or not os.path.exists(RUTA_CACHE):
+        return
+    try:
+        with open(RUTA_CACHE, "rb") as archivo:
+            contenido = json.loads(fernet.decrypt(archivo.read()))
+    except (OSError, ValueError, importar("cryptography.fernet").InvalidToken) as e:
+        print(f"No se pudo leer el caché de secretos, se ignora: {e}")
+        return
+    _token.update(contenido.get('token', {}))
+    _secretos.update(contenido.get('secretos', {}))
+
+
+def _guardar_cache_disco():
+    fernet = _fernet()
+    if fernet is None:
+        return
+    contenido = json.dumps({'token': _token, 'secretos': _secretos}).encode()
+    ruta_temporal = RUTA_CACHE + ".tmp"
+    descriptor = os.open(ruta_temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "wb") as archivo:
+        archivo.write(fernet.encrypt(contenido))
+    os.replace(ruta_temporal, RUTA_CACHE)
+
+
+def obtener_token_iam():
+    with _bloqueo:
+        _cargar_cache_disco()
+        if _token['access_token'] and _token['expiration'] - MARGEN_TOKEN > time.time():
+            return _token['access_token']
+        # Los SDK de IBM solo se cargan si el caché no alcanza
+        IAMTokenManager = importar("ibm_cloud_sdk_core.token_managers.iam_token_manager").IAMTokenManager
+        respuesta = IAMTokenManager(apikey=os.environ.get("SECRET_IBM_API_KEY")).request_token()
+        _token['access_token'] = respuesta['access_token']
+        _token['expiration'] = respuesta['expiration']
+        _guardar_cache_disco()
+        return _token['access_token']
+
+
+def _cliente_secrets_manager():
+    global _cliente
+    token = obtener_token_iam()
+    with _bloqueo:
+        if _cliente is None:
+            BearerTokenAuthenticator = importar("ibm_cloud_sdk_core.authenticators").BearerTokenAuthenticator
+            SecretsManagerV2 = importar("ibm_secrets_manager_sdk.secrets_manager_v2").SecretsManagerV2
+            _cliente = SecretsManagerV2(authenticator=BearerTokenAuthenticator(token))
+            _cliente.set_service_url(URL_SECRETS_MANAGER)
+        else:
+            _cliente.authenticator.set_bearer_token(token)
+        return _cliente
+
+
+def _consultar_secreto(secret_id):
+    response = _cliente_secrets_manager().get_secret(id=secret_id)
+    secret_data = response.get_result()
+    if 'data' not in secret_data:
+        print("La estructura del secreto no es como se esperaba.")
+        return {}
+    with _bloqueo:
+        _secretos[secret_id] = {'datos': secret_data['data'], 'obtenido': time.time()}
+        _guardar_cache_disco()
+    return secret_data['data']
+
+
+def _refrescar_en_segundo_plano(secret_id):
+    with _bloqueo:
+        if secret_id in _refrescos_en_curso:
+            return
+        _refrescos_en_curso.add(secret_id)
+
+    def refrescar():
+        try:
+            _consultar_secreto(secret_id)
+        except Exception as e:
+            print(f"No se pudo refrescar el secreto {secret_id}: {e}")
+        finally:
+            with _bloqueo:
+                _refrescos_en_curso.discard(secret_id)
+
+    threading.Thread(target=refrescar, daemon=True).start()
+
+
+def obtener_secreto(secret_id):
+    with _bloqueo:
+        _cargar_cache_disco()
+        entrada = _secretos.get(secret_id)
+    if entrada:
+        antiguedad = time.time() - entrada['obtenido']
+        if antiguedad < TTL_SECRETOS:
+            return entrada['datos']
+        if antiguedad < ANTIGUEDAD_MAXIMA_SECRETOS:
+            # Se usa el valor en caché y no se bloquea la ejecución esperando a Secrets Manager
+            _refrescar_en_segundo_plano(secret_id)
+            return entrada['datos']
+    return _consultar_secreto(secret_id)
+
+
+def obtener_secretos(secret_ids):
+    # Varias consultas a la vez; el token IAM se obtiene una sola vez antes de repartirlas
+    secret_ids = list(dict.fromkeys(secret_ids))
+    if len(secret_ids) > 1:
+        obtener_token_iam()
+    with ThreadPoolExecutor(max_workers=max(1, len(secret_ids))) as ejecutor:
+        return dict(zip(secret_ids, ejecutor.map(obtener_secreto, secret_ids)))
+
+
+def ids_portal():
+    # SECRET_ID_PORTAL puede tener varios IDs separados por comas
+    return [secret_id.strip() for secret_id in os.environ.get("SECRET_ID_PORTAL", "").split(",")
+            if secret_id.strip()]
+
+
+def cargar_secretos(secretos=None):
+    # Los IDs se consultan en paralelo y se combinan en orden,
+    # así un ID posterior sobrescribe las claves repetidas de los anteriores
+    secretos = {} if secretos is None else secretos
+    for datos_secreto in obtener_secretos(ids_portal()).values():
+        secretos.update(datos_secreto)
+    return secretos
+
+
+def iniciar_refresco_periodico(secret_ids, intervalo=None):
+    # Mantiene token y secretos frescos para procesos de larga duración
+    intervalo = intervalo or max(60, TTL_SECRETOS // 2)
+
+    def ciclo():
+        while True:
+            time.sleep(intervalo)
+            for secret_id in secret_ids:
+                try:
+                    _consultar_secreto(secret_id)
+                except Exception as e:
+                    print(f"No se pudo refrescar el secreto {secret_id}: {e}")
+
+    hilo = threading.Thread(target=ciclo, daemon=True)
+    hilo.start()
+    return hilo
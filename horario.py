@@ -0,0 +1,142 @@
+import json
+import re
+import socket
+import threading
+import urllib.request
+import zoneinfo
+from datetime import datetime
+
+ZONA_LIMA = zoneinfo.ZoneInfo("America/Lima")
+
+DIAS = {'lun': 0, 'mar': 1, 'mie': 2, 'jue': 3, 'vie': 4, 'sab': 5, 'dom': 6}
+PATRON_RANGO = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+PATRON_TAMANO = re.compile(r"^(\d+(?:\.\d+)?)([KMG]?)$", re.IGNORECASE)
+# Como en --bwlimit de rclone, un número sin sufijo ya está en KiB/s
+FACTORES_KIB = {'': 1, 'K': 1, 'M': 1024, 'G': 1024 * 1024}
+# Fuera de todos los tramos no hay límite; es siempre el mismo objeto para que el planificador no vea un cambio
+SIN_LIMITE = {'dias': frozenset(range(7)), 'inicio': 0, 'fin': 0, 'ancho_banda': "off", 'transfers': None}
+
+
+def interpretar_dias(texto):
+    # "lun-vie", "sab,dom" o "lun"; los rangos pueden cruzar el fin de semana ("vie-lun")
+    dias = set()
+    for parte in texto.lower().split(","):
+        if "-" in parte:
+            inicio, fin = (DIAS[dia] for dia in parte.split("-"))
+            dia = inicio
+            dias.add(dia)
+            while dia != fin:
+                dia = (dia + 1) % 7
+                dias.add(dia)
+        else:
+            dias.add(DIAS[parte])
+    return dias
+
+
+def interpretar_horario(texto):
+    # Tramos separados por ";" con el formato "[días] HH:MM-HH:MM ancho_de_banda [transfers]", por ejemplo
+    # "lun-vie 08:00-19:00 20M 16; 19:00-08:00 off". Gana el primer tramo que coincide con la hora de Lima.
+    tramos = []
+    for definicion in texto.split(";"):
+        partes = definicion.split()
+        if not partes:
+            continue
+        dias = set(range(7))
+        if not PATRON_RANGO.match(partes[0]):
+            dias = interpretar_dias(partes.pop(0))
+        coincidencia = PATRON_RANGO.match(partes[0]) if partes else None
+        if not coincidencia or len(partes) < 2:
+            raise ValueError(f"Tramo de horario inválido: {definicion.strip()}")
+        hora_inicio, minuto_inicio, hora_fin, minuto_fin = (int(grupo) for grupo in coincidencia.groups())
+        ancho_banda = partes[1]
+        if ancho_banda.lower() != "off" and not PATRON_TAMANO.match(ancho_banda):
+            raise ValueError(f"Ancho de banda inválido en el horario: {ancho_banda}")
+        tramos.append({
+            'dias': dias,
+            'inicio': hora_inicio * 60 + minuto_inicio,
+            'fin': hora_fin * 60 + minuto_fin,
+            'ancho_banda': ancho_banda.lower() if ancho_banda.lower() == "off" else ancho_banda.upper(),
+            'transfers': int(partes[2]) if len(partes) > 2 else None,
+        })
+    return tramos
+
+
+def tramo_actual(tramos, ahora=None):
+    # Un tramo como 19:00-08:00 cruza la medianoche: después de las 00:00 cuenta como parte del día anterior
+    ahora = ahora or datetime.now(ZONA_LIMA)
+    minuto = ahora.hour * 60 + ahora.minute
+    dia = ahora.weekday()
+    for tramo in tramos:
+        if tramo['inicio'] < tramo['fin']:
+            if dia in tramo['dias'] and tramo['inicio'] <= minuto < tramo['fin']:
+                return tramo
+        elif (dia in tramo['dias'] and minuto >= tramo['inicio']) or \
+                ((dia - 1) % 7 in tramo['dias'] and minuto < tramo['fin']):
+            return tramo
+    return SIN_LIMITE
+
+
+def repartir_ancho_banda(ancho_banda, partes):
+    # El enlace es compartido: cada proceso rclone (y cada réplica) recibe una parte del límite
+    if ancho_banda == "off" or partes <= 1:
+        return ancho_banda
+    valor, unidad = PATRON_TAMANO.match(ancho_banda).groups()
+    return f"{max(1, int(float(valor) * FACTORES_KIB[unidad.upper()] / partes))}K"
+
+
+def bytes_por_segundo(ancho_banda):
+    # Como en rclone, un número sin unidad está en KiB/s; "off" es sin límite
+    if ancho_banda == "off":
+        return None
+    valor, unidad = PATRON_TAMANO.match(ancho_banda).groups()
+    return int(float(valor) * FACTORES_KIB[unidad.upper()] * 1024)
+
+
+def transfers_permitidos(tramo, transfers):
+    return min(transfers, tramo['transfers']) if tramo['transfers'] else transfers
+
+
+def puerto_libre():
+    with socket.socket() as conexion:
+        conexion.bind(("127.0.0.1", 0))
+        return conexion.getsockname()[1]
+
+
+def flags_control_remoto(puerto, ancho_banda):
+    # El límite inicial va en la línea de comandos; los cambios posteriores llegan por la API rc de rclone
+    return f"--rc --rc-addr 127.0.0.1:{puerto} --rc-no-auth --bwlimit {ancho_banda} "
+
+
+def aplicar_ancho_banda(puerto, ancho_banda):
+    solicitud = urllib.request.Request(
+        f"http://127.0.0.1:{puerto}/core/bwlimit", data=json.dumps({'rate': ancho_banda}).encode("utf-8"),
+        headers={'Content-Type': "application/json"}, method="POST",
+    )
+    urllib.request.urlopen(solicitud, timeout=10).close()
+
+
+def iniciar_planificador(tramos, puertos=(), divisor=1, al_cambiar=None, intervalo=60):
+    # Revisa el horario cada minuto y ajusta en caliente los procesos rclone (por rc) y, con al_cambiar,
+    # la concurrencia de la copia en servidor. Devuelve el evento que detiene el planificador.
+    detener = threading.Event()
+    vigente = {'tramo': tramo_actual(tramos)}
+
+    def revisar():
+        while not detener.wait(intervalo):
+            tramo = tramo_actual(tramos)
+            if tramo is vigente['tramo']:
+                continue
+            vigente['tramo'] = tramo
+            ancho_banda = repartir_ancho_banda(tramo['ancho_banda'], divisor)
+            print(f"Cambio de horario: ancho de banda {ancho_banda}, transfers {tramo['transfers'] or 'sin límite'}")
+            for puerto in puertos:
+                try:
+                    aplicar_ancho_banda(puerto, ancho_banda)
+                except OSError as e:
+                    # El proceso pudo haber terminado entre una revisión y otra
+                    print(f"No se pudo ajustar el ancho de banda en el puerto {puerto}: {e}")
+            if al_cambiar:
+                al_cambiar(tramo)
+
+    threading.Thread(target=revisar, daemon=True).start()
+    return detener
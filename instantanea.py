@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+
+
+def listar_objetos(cliente, bucket):
+    # Recorre el bucket página por página sin guardar el listado completo en memoria
+    paginador = cliente.get_paginator('list_objects_v2')
+    for pagina in paginador.paginate(Bucket=bucket):
+        for objeto in pagina.get('Contents', []):
+            yield {
+                'key': objeto['Key'],
+                'size': objeto['Size'],
+                'etag': objeto['ETag'].strip('"'),
+                'mtime': objeto['LastModified'].isoformat(),
+            }
+
+
+def ruta_instantanea(directorio, bucket_origen, bucket_destino):
+    return os.path.join(directorio, f"{bucket_destino}.{bucket_origen}.jsonl.gz")
+
+
+def capturar_instantanea(objetos, ruta):
+    # Enumera el origen una sola vez y lo deja en disco como JSON por línea comprimido.
+    # Se escribe primero a un archivo temporal para no dejar instantáneas a medias.
+    resumen = {'objetos': 0, 'bytes': 0}
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    ruta_temporal = ruta + ".tmp"
+    with gzip.open(ruta_temporal, "wt", encoding="utf-8", compresslevel=5) as archivo:
+        for objeto in objetos:
+            archivo.write(json.dumps(objeto, separators=(",", ":")) + "\n")
+            resumen['objetos'] += 1
+            resumen['bytes'] += objeto['size']
+    os.replace(ruta_temporal, ruta)
+    return resumen
+
+
+def leer_instantanea(ruta):
+    with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+        for linea in archivo:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def escribir_lista_archivos(objetos, ruta_lista):
+    # Lista para --files-from-raw: una clave por línea, sin interpretar comentarios ni espacios
+    total = 0
+    with open(ruta_lista, "w", encoding="utf-8") as lista:
+        for objeto in objetos:
+            lista.write(objeto['key'] + "\n")
+            total += 1
+    return total
+
+
+def filtrar_por_lista(objetos, ruta_lista):
+    # Deja pasar solo los objetos cuya clave aparece en la lista. La lista tiene que haberse escrito
+    # recorriendo los mismos objetos en el mismo orden (por ejemplo, la lista de un fragmento),
+    # así basta con avanzar ambas secuencias a la par sin cargar la lista en memoria.
+    with open(ruta_lista, encoding="utf-8") as lista:
+        siguiente = lista.readline()
+        for objeto in objetos:
+            if not siguiente:
+                return
+            if objeto['key'] == siguiente.rstrip("\n"):
+                yield objeto
+                siguiente = lista.readline()
@@ -0,0 +1,124 @@
+import queue
+import threading
+
+# Límites para partir en rangos un prefijo plano (sin "/") con muchas claves: cada rango se lista por separado
+CARACTERES_RANGO = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_FIN = object()
+
+
+def convertir(objeto):
+    # Mismo formato que instantanea.listar_objetos
+    return {
+        'key': objeto['Key'],
+        'size': objeto['Size'],
+        'etag': objeto['ETag'].strip('"'),
+        'mtime': objeto['LastModified'].isoformat(),
+    }
+
+
+def dividir_rango(prefijo, desde=None, hasta=None):
+    # Rangos contiguos (desde, hasta] que cubren todas las claves del prefijo entre los dos límites
+    limites = [prefijo + caracter for caracter in CARACTERES_RANGO
+               if (desde is None or prefijo + caracter > desde) and (hasta is None or prefijo + caracter < hasta)]
+    extremos = [desde] + limites + [hasta]
+    return [(inicio, fin) for inicio, fin in zip(extremos, extremos[1:])]
+
+
+def listar_paralelo(cliente, bucket, hilos=32, profundidad=2, delimitador="/", maximo_en_cola=10000):
+    # Descubre el árbol de prefijos con consultas con delimitador hasta `profundidad` niveles y lista los prefijos
+    # disjuntos al mismo tiempo. Los objetos salen como generador a medida que llegan, en el orden en que
+    # terminan las páginas (no en orden alfabético); la cola acotada frena el listado si el consumidor es lento.
+    tareas = queue.Queue()
+    salida = queue.Queue(maxsize=maximo_en_cola)
+    detener = threading.Event()
+    bloqueo = threading.Lock()
+    pendientes = {'total': 0}
+    paginador = cliente.get_paginator('list_objects_v2')
+
+    def agregar(tarea):
+        with bloqueo:
+            pendientes['total'] += 1
+        tareas.put(tarea)
+
+    def entregar(elemento):
+        while not detener.is_set():
+            try:
+                salida.put(elemento, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def listar_arbol(prefijo, nivel):
+        # Un nivel del árbol: los objetos directos se entregan y cada subprefijo pasa a ser una tarea propia
+        for numero, pagina in enumerate(paginador.paginate(Bucket=bucket, Prefix=prefijo, Delimiter=delimitador)):
+            for subprefijo in pagina.get('CommonPrefixes', []):
+                if nivel + 1 < profundidad:
+                    agregar(('arbol', subprefijo['Prefix'], nivel + 1))
+                else:
+                    agregar(('rango', subprefijo['Prefix'], None, None))
+            contenidos = pagina.get('Contents', [])
+            for objeto in contenidos:
+                if not entregar(convertir(objeto)):
+                    return
+            if numero == 0 and pagina.get('IsTruncated') and contenidos and not pagina.get('CommonPrefixes'):
+                # Prefijo plano con más de una página: el resto se reparte en rangos después de la última clave
+                for desde, hasta in dividir_rango(prefijo, contenidos[-1]['Key']):
+                    agregar(('rango', prefijo, desde, hasta))
+                return
+
+    def listar_rango(prefijo, desde, hasta):
+        argumentos = {'Bucket': bucket, 'Prefix': prefijo}
+        if desde is not None:
+            argumentos['StartAfter'] = desde
+        for numero, pagina in enumerate(paginador.paginate(**argumentos)):
+            contenidos = pagina.get('Contents', [])
+            for objeto in contenidos:
+                if hasta is not None and objeto['Key'] > hasta:
+                    return
+                if not entregar(convertir(objeto)):
+                    return
+            if numero == 0 and pagina.get('IsTruncated') and contenidos:
+                # Un rango grande que todavía admite límites intermedios se sigue partiendo
+                subrangos = dividir_rango(prefijo, contenidos[-1]['Key'], hasta)
+                if len(subrangos) > 1:
+                    for subdesde, subhasta in subrangos:
+                        agregar(('rango', prefijo, subdesde, subhasta))
+                    return
+
+    def trabajar():
+        while not detener.is_set():
+            tarea = tareas.get()
+            if tarea is None:
+                return
+            try:
+                if tarea[0] == 'arbol':
+                    listar_arbol(tarea[1], tarea[2])
+                else:
+                    listar_rango(*tarea[1:])
+            except Exception as e:
+                entregar(e)
+                detener.set()
+            with bloqueo:
+                pendientes['total'] -= 1
+                terminado = pendientes['total'] == 0
+            if terminado:
+                entregar(_FIN)
+
+    agregar(('arbol', "", 0))
+    trabajadores = [threading.Thread(target=trabajar, daemon=True) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    try:
+        while True:
+            elemento = salida.get()
+            if elemento is _FIN:
+                return
+            if isinstance(elemento, Exception):
+                raise elemento
+            yield elemento
+    finally:
+        # También si el consumidor deja de leer antes del final: los hilos no quedan bloqueados en la cola
+        detener.set()
+        for _ in trabajadores:
+            tareas.put(None)
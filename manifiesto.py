@@ -0,0 +1,106 @@
+import gzip
+import json
+import os
+import re
+from datetime import date
+
+from empaquetado import CAMPOS_PAQUETE
+
+# Nombre de los buckets diarios: {serie}-YYYY-MM-DD o {serie}-YYYY-MM-DD-x; la serie es "backup"
+# salvo cuando el orquestador respalda varios buckets de origen, uno por serie
+PATRON_BUCKET_DIARIO = re.compile(r"^(.+?)-(\d{4})-(\d{2})-(\d{2})(?:-[a-z])?$")
+SERIE_POR_DEFECTO = "backup"
+
+# Ruta del manifiesto dentro de cada bucket diario
+RUTA_MANIFIESTO_REMOTO = "_manifiesto/manifiesto.jsonl.gz"
+
+
+def fecha_de_bucket(nombre_bucket):
+    coincidencia = PATRON_BUCKET_DIARIO.match(nombre_bucket)
+    if not coincidencia:
+        return None
+    anio, mes, dia = (int(parte) for parte in coincidencia.groups()[1:])
+    return date(anio, mes, dia)
+
+
+def serie_de_bucket(nombre_bucket):
+    coincidencia = PATRON_BUCKET_DIARIO.match(nombre_bucket)
+    return coincidencia.group(1) if coincidencia else None
+
+
+def nombre_bucket_diario(serie, ahora):
+    # Fecha de Lima y una letra según el segundo actual (0=a, 1=b, ..., 25=z)
+    return f"{serie}-{ahora.strftime('%Y-%m-%d')}-{chr(ahora.second % 26 + 97)}"
+
+
+def ruta_manifiesto(directorio, bucket_destino):
+    return os.path.join(directorio, f"{bucket_destino}.jsonl.gz")
+
+
+def buscar_manifiesto_anterior(directorio, bucket_actual):
+    # El manifiesto más reciente es el de mayor nombre anterior al bucket actual dentro de la misma serie
+    if not os.path.isdir(directorio):
+        return None
+    serie = serie_de_bucket(bucket_actual)
+    candidatos = sorted(
+        nombre for nombre in os.listdir(directorio)
+        if nombre.endswith(".jsonl.gz") and nombre[:-len(".jsonl.gz")] < bucket_actual
+        and fecha_de_bucket(nombre[:-len(".jsonl.gz")]) and serie_de_bucket(nombre[:-len(".jsonl.gz")]) == serie
+    )
+    if not candidatos:
+        return None
+    return os.path.join(directorio, candidatos[-1])
+
+
+def leer_manifiesto(ruta):
+    with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+        for linea in archivo:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def cargar_manifiesto(ruta):
+    if not ruta or not os.path.exists(ruta):
+        return {}
+    return {entrada['key']: entrada for entrada in leer_manifiesto(ruta)}
+
+
+def objeto_sin_cambios(actual, anterior):
+    return (actual['size'] == anterior['size']
+            and actual['etag'] == anterior['etag']
+            and actual['mtime'] == anterior['mtime'])
+
+
+def generar_manifiesto_incremental(objetos, manifiesto_anterior, bucket_destino, fecha_limite_referencias,
+                                   ruta_salida, ruta_lista_copia):
+    # Compara el listado vivo del origen con el manifiesto del día anterior.
+    # Los objetos sin cambios conservan la referencia al bucket donde ya viven;
+    # los nuevos o modificados se apuntan al bucket de hoy y se agregan a la lista de copia.
+    # Una referencia cuyo bucket está por expirar (política DeleteAllObjects) se vuelve a copiar.
+    resumen = {'objetos': 0, 'bytes': 0, 'a_copiar': 0, 'bytes_a_copiar': 0, 'referenciados': 0}
+    os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+    with gzip.open(ruta_salida, "wt", encoding="utf-8") as manifiesto, \
+            open(ruta_lista_copia, "w", encoding="utf-8") as lista:
+        for objeto in objetos:
+            anterior = manifiesto_anterior.get(objeto['key'])
+            bucket_referencia = None
+            if anterior and objeto_sin_cambios(objeto, anterior):
+                fecha_referencia = fecha_de_bucket(anterior['bucket'])
+                if fecha_referencia and fecha_referencia >= fecha_limite_referencias:
+                    bucket_referencia = anterior['bucket']
+
+            entrada = dict(objeto)
+            resumen['objetos'] += 1
+            resumen['bytes'] += objeto['size']
+            if bucket_referencia:
+                entrada['bucket'] = bucket_referencia
+                # Un objeto empaquetado en ese bucket se sigue leyendo desde su paquete
+                entrada.update({campo: anterior[campo] for campo in CAMPOS_PAQUETE if campo in anterior})
+                resumen['referenciados'] += 1
+            else:
+                entrada['bucket'] = bucket_destino
+                lista.write(objeto['key'] + "\n")
+                resumen['a_copiar'] += 1
+                resumen['bytes_a_copiar'] += objeto['size']
+            manifiesto.write(json.dumps(entrada, separators=(",", ":")) + "\n")
+    return resumen
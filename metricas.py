@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+# Archivo para el textfile collector de node_exporter y URL opcional de un Pushgateway
+RUTA_METRICAS = os.environ.get("METRICAS_ARCHIVO")
+URL_PUSHGATEWAY = os.environ.get("METRICAS_PUSHGATEWAY")
+TRABAJO = os.environ.get("METRICAS_TRABAJO", "backup_cos")
+
+PREFIJO = "backup_cos"
+# Límites en segundos del histograma de latencia por objeto
+LIMITES_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+# Mensajes de rclone que indican un reintento de una operación contra COS
+MENSAJES_REINTENTO = ("low level retry", "Received retry after error")
+
+_bloqueo = threading.Lock()
+_etiquetas_comunes = {}
+_fases = {}
+_contadores = {}
+_medidores = {}
+_latencias = {'cubetas': [0] * len(LIMITES_LATENCIA), 'suma': 0.0, 'total': 0}
+
+DESCRIPCIONES = {
+    'fase_segundos': ('gauge', "Duración de cada fase de la última ejecución"),
+    'fase_correcta': ('gauge', "1 si la fase terminó sin excepción"),
+    'bytes_copiados_total': ('counter', "Bytes copiados al bucket de destino"),
+    'objetos_copiados_total': ('counter', "Objetos copiados al bucket de destino"),
+    'objetos_revisados_total': ('counter', "Objetos que rclone comparó con el destino"),
+    'errores_total': ('counter', "Errores informados por el motor de copia"),
+    'reintentos_total': ('counter', "Reintentos de rclone y de la cola de objetos fallidos"),
+    'eventos_log_total': ('counter', "Líneas de log de rclone por nivel"),
+    'velocidad_bytes_por_segundo': ('gauge', "Bytes por segundo de la fase de copia"),
+    'objetos_por_segundo': ('gauge', "Objetos por segundo de la fase de copia"),
+    'origen_objetos': ('gauge', "Objetos en la instantánea del bucket de origen"),
+    'origen_bytes': ('gauge', "Bytes en la instantánea del bucket de origen"),
+    'objetos_fallidos': ('gauge', "Objetos que quedaron sin copiar después de los reintentos"),
+    'objetos_empaquetados': ('gauge', "Objetos pequeños guardados en paquetes tar en lugar de copiarse uno por uno"),
+    'paquetes_subidos': ('gauge', "Paquetes tar subidos al bucket de destino en esta ejecución"),
+    'estimacion_segundos': ('gauge', "Duración estimada de la copia antes de empezar"),
+    'estimacion_peticiones': ('gauge', "Peticiones estimadas de la copia por clase de COS"),
+    'estimacion_excede_ventana': ('gauge', "1 si la copia estimada no entra en la ventana de respaldo"),
+    'replica_bytes': ('gauge', "Bytes escritos en cada destino por la copia con réplicas"),
+    'replica_objetos': ('gauge', "Objetos escritos en cada destino por la copia con réplicas"),
+    'replica_errores': ('gauge', "Objetos que fallaron en cada destino de la copia con réplicas"),
+    'objeto_latencia_segundos': ('histogram', "Duración de la copia de cada objeto en la copia en servidor"),
+    'ejecucion_correcta': ('gauge', "1 si la última ejecución terminó sin errores"),
+    'ultima_ejecucion_timestamp_segundos': ('gauge', "Momento en que terminó la última ejecución"),
+}
+
+
+def etiquetar(**etiquetas):
+    # Etiquetas que se agregan a todas las series, por ejemplo los buckets de la ejecución
+    with _bloqueo:
+        _etiquetas_comunes.update({clave: str(valor) for clave, valor in etiquetas.items() if valor is not None})
+
+
+@contextmanager
+def fase(nombre):
+    inicio = time.perf_counter()
+    correcta = False
+    try:
+        yield
+        correcta = True
+    finally:
+        with _bloqueo:
+            # Una fase puede repetirse (por ejemplo, los reintentos de la copia); se acumula su duración
+            segundos, _ = _fases.get(nombre, (0.0, True))
+            _fases[nombre] = (segundos + time.perf_counter() - inicio, correcta)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    with _bloqueo:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def fijar(nombre, valor, **etiquetas):
+    with _bloqueo:
+        _medidores[(nombre, tuple(sorted(etiquetas.items())))] = valor
+
+
+def observar_latencia(segundos):
+    with _bloqueo:
+        for indice, limite in enumerate(LIMITES_LATENCIA):
+            if segundos <= limite:
+                _latencias['cubetas'][indice] += 1
+                break
+        _latencias['suma'] += segundos
+        _latencias['total'] += 1
+
+
+def observar_evento_rclone(evento):
+    # Se conecta como al_evento de ejecutar_rclone; las estadísticas acumuladas se suman al final con sumar_estadisticas
+    if evento['tipo'] != 'log':
+        return
+    incrementar('eventos_log_total', nivel=evento['nivel'])
+    if any(mensaje in evento['mensaje'] for mensaje in MENSAJES_REINTENTO):
+        incrementar('reintentos_total', origen="rclone")
+
+
+def sumar_estadisticas(estadisticas):
+    # Estadísticas finales de una copia (rclone, fragmentos locales o copia en servidor)
+    estadisticas = estadisticas or {}
+    incrementar('bytes_copiados_total', estadisticas.get('bytes', 0))
+    incrementar('objetos_copiados_total', estadisticas.get('transfers', 0))
+    incrementar('objetos_revisados_total', estadisticas.get('checks', 0))
+    incrementar('errores_total', estadisticas.get('errors', 0))
+
+
+def _valor_contador(nombre):
+    return sum(valor for (clave, _), valor in _contadores.items() if clave == nombre)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(etiquetas):
+    todas = dict(_etiquetas_comunes)
+    todas.update(etiquetas)
+    if not todas:
+        return ""
+    pares = ",".join(f'{clave}="{_escapar(valor)}"' for clave, valor in sorted(todas.items()))
+    return "{" + pares + "}"
+
+
+def texto_prometheus():
+    # Formato de exposición de texto de Prometheus
+    with _bloqueo:
+        series = {}
+        for nombre_fase, (segundos, correcta) in _fases.items():
+            series.setdefault('fase_segundos', []).append(({'fase': nombre_fase}, round(segundos, 3)))
+            series.setdefault('fase_correcta', []).append(({'fase': nombre_fase}, int(correcta)))
+        for (nombre, etiquetas), valor in list(_contadores.items()) + list(_medidores.items()):
+            series.setdefault(nombre, []).append((dict(etiquetas), valor))
+
+        segundos_copia = _fases.get('copia', (0.0, True))[0]
+        if segundos_copia:
+            series['velocidad_bytes_por_segundo'] = [({}, round(_valor_contador('bytes_copiados_total') / segundos_copia, 3))]
+            series['objetos_por_segundo'] = [({}, round(_valor_contador('objetos_copiados_total') / segundos_copia, 3))]
+
+        lineas = []
+        for nombre, valores in sorted(series.items()):
+            tipo, ayuda = DESCRIPCIONES.get(nombre, ('gauge', nombre))
+            lineas.append(f"# HELP {PREFIJO}_{nombre} {ayuda}")
+            lineas.append(f"# TYPE {PREFIJO}_{nombre} {tipo}")
+            for etiquetas, valor in valores:
+                lineas.append(f"{PREFIJO}_{nombre}{_formatear_etiquetas(etiquetas)} {valor}")
+
+        if _latencias['total']:
+            nombre = f"{PREFIJO}_objeto_latencia_segundos"
+            tipo, ayuda = DESCRIPCIONES['objeto_latencia_segundos']
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            acumulado = 0
+            for limite, cantidad in zip(LIMITES_LATENCIA, _latencias['cubetas']):
+                acumulado += cantidad
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas({'le': limite})} {acumulado}")
+            lineas.append(f"{nombre}_bucket{_formatear_etiquetas({'le': '+Inf'})} {_latencias['total']}")
+            lineas.append(f"{nombre}_sum{_formatear_etiquetas({})} {round(_latencias['suma'], 3)}")
+            lineas.append(f"{nombre}_count{_formatear_etiquetas({})} {_latencias['total']}")
+    return "\n".join(lineas) + "\n"
+
+
+def exportar(correcta, ruta=RUTA_METRICAS, url_pushgateway=URL_PUSHGATEWAY, instancia=None):
+    fijar('ejecucion_correcta', int(correcta))
+    fijar('ultima_ejecucion_timestamp_segundos', int(time.time()))
+    texto = texto_prometheus()
+    if ruta:
+        # El textfile collector puede leer en cualquier momento: se escribe a un temporal y se reemplaza
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
+        os.replace(ruta + ".tmp", ruta)
+        print(f"Métricas escritas en {ruta}")
+    if url_pushgateway:
+        # Cada réplica de una copia fragmentada reemplaza solo su propio grupo en el Pushgateway
+        url = f"{url_pushgateway.rstrip('/')}/metrics/job/{TRABAJO}"
+        if instancia is not None:
+            url += f"/instance/{instancia}"
+        solicitud = urllib.request.Request(
+            url, data=texto.encode("utf-8"), method="PUT",
+            headers={'Content-Type': "text/plain; version=0.0.4"},
+        )
+        try:
+            urllib.request.urlopen(solicitud, timeout=30).close()
+            print(f"Métricas enviadas a {url_pushgateway}")
+        except OSError as e:
+            # Las métricas no deben hacer fallar el backup
+            print(f"No se pudieron enviar las métricas al Pushgateway: {e}")
+    return texto
@@ -3,29 +3,15 @@ from datetime import datetime
 import zoneinfo
 import ibm_boto3
 from ibm_botocore.client import Config
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-from ibm_secrets_manager_sdk.secrets_manager_v2 import SecretsManagerV2
+import gestor_secretos
 import json  # Importar para manejar la conversión de la carga útil del secreto
 
 # Establecer la zona horaria de Lima, Perú
 timezone_lima = zoneinfo.ZoneInfo("America/Lima")
 
-# Configuración de IBM Secret Manager
-authenticator = IAMAuthenticator('dJxj9q28QtO_SvoAk6guuC1kqOE5UfwfXWCaP6FwbRII')
-secrets_manager = SecretsManagerV2(authenticator=authenticator)
-secrets_manager.set_service_url('https://65e7ac31-7d3d-4c5f-9545-f848e11f8a26.private.us-south.secrets-manager.appdomain.cloud')
-
-def obtener_secreto(secret_id):
-    response = secrets_manager.get_secret(id=secret_id)
-    secret_data = response.get_result()
-    # Accede a la clave 'data' para los secretos tipo clave-valor
-    secret_values = secret_data['resources'][0]['secret_data']['data']
-    return secret_values
-
-# Llama a la función una vez y almacena los valores para su uso posterior en el script
+# Los secretos se leen con gestor_secretos: token IAM de SECRET_IBM_API_KEY y caché compartido con rclone.py
 secret_id = 'e4d3d765-6255-f517-cd2e-b76551c9b56c'
-# Asegúrate de que los secretos estén en formato JSON apropiado para su uso
-secretos = obtener_secreto(secret_id)
+secretos = gestor_secretos.obtener_secreto(secret_id)
 
 def generar_nombre_bucket():
     fecha_actual = datetime.now(timezone_lima)
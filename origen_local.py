@@ -0,0 +1,526 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import queue
+import select
+import sqlite3
+import stat
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from autoajuste import PARAMETROS_POR_DEFECTO, flags_rendimiento
+from cliente_cos import crear_cliente_iam
+from ejecutor import construir_comando_copia, ejecutar_rclone
+from gestion_buckets import aplicar_politica, listar_buckets_respaldo, politica_ciclo_vida
+from gestor_secretos import cargar_secretos
+from horario import ZONA_LIMA
+import manifiesto
+
+# Directorio local o montaje NFS que se respalda en el bucket diario de la serie
+DIRECTORIO_ORIGEN = os.environ.get("DIRECTORIO_ORIGEN", "")
+# Serie y manifiestos propios: en el mismo directorio de trabajo que rclone.py no se comparan contra los de COS
+SERIE_BUCKET = os.environ.get("SERIE_BUCKET", "backup-local")
+HILOS_ESCANEO = int(os.environ.get("HILOS_ESCANEO", "32"))
+# Índice persistente de archivos y diario de cambios que escribe el vigilante (python origen_local.py vigilar)
+DIRECTORIO_INDICE_LOCAL = os.environ.get("DIRECTORIO_INDICE_LOCAL", "indice_local")
+DIRECTORIO_MANIFIESTOS = os.environ.get("DIRECTORIO_MANIFIESTOS", "manifiestos_local")
+MARGEN_REFERENCIAS_DIAS = int(os.environ.get("MARGEN_REFERENCIAS_DIAS", "2"))
+# Con true se recorre todo el árbol aunque haya un diario de cambios válido
+ESCANEO_COMPLETO = os.environ.get("ESCANEO_COMPLETO", "false").lower() == "true"
+INTERVALO_VIGILANCIA_SEGUNDOS = int(os.environ.get("INTERVALO_VIGILANCIA_SEGUNDOS", "10"))
+CONFIG_RCLONE_LOCAL = "rclone-local.conf"
+
+ARCHIVOS_POR_ENTREGA = 1000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    ruta TEXT PRIMARY KEY,
+    tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inodo INTEGER NOT NULL,
+    visto INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Eventos de inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+# IN_MODIFY cubre los archivos que se reescriben en el lugar y siguen abiertos al momento del respaldo
+MASCARA_VIGILANCIA = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                      | IN_DELETE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK)
+CABECERA_EVENTO = struct.Struct("iIII")
+
+_FIN = object()
+
+
+def ruta_indice():
+    return os.path.join(DIRECTORIO_INDICE_LOCAL, "indice.db")
+
+
+def ruta_diario_cambios():
+    return os.path.join(DIRECTORIO_INDICE_LOCAL, "cambios.jsonl")
+
+
+def ruta_vigilancia():
+    return os.path.join(DIRECTORIO_INDICE_LOCAL, "vigilancia.json")
+
+
+def unir(relativa, nombre):
+    return f"{relativa}/{nombre}" if relativa else nombre
+
+
+def escanear(raiz, hilos=32, subdirectorio="", maximo_en_cola=1000):
+    # Recorre el árbol con os.scandir en varios hilos: cada directorio es una tarea y sus subdirectorios se
+    # encolan para cualquier hilo libre. os.scandir trae el tipo de cada entrada sin un stat extra; solo los
+    # archivos regulares se consultan con stat. Los enlaces simbólicos no se siguen, como en rclone por defecto.
+    # Entrega listas de archivos (ruta relativa, tamaño, mtime en ns, inodo) a medida que se leen.
+    tareas = queue.Queue()
+    salida = queue.Queue(maxsize=maximo_en_cola)
+    detener = threading.Event()
+    bloqueo = threading.Lock()
+    pendientes = {'total': 0}
+
+    def agregar(relativa):
+        with bloqueo:
+            pendientes['total'] += 1
+        tareas.put(relativa)
+
+    def entregar(elemento):
+        while not detener.is_set():
+            try:
+                salida.put(elemento, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def leer_directorio(relativa):
+        archivos = []
+        try:
+            with os.scandir(os.path.join(raiz, relativa) if relativa else raiz) as entradas:
+                for entrada in entradas:
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            agregar(unir(relativa, entrada.name))
+                        elif entrada.is_file(follow_symlinks=False):
+                            datos = entrada.stat(follow_symlinks=False)
+                            archivos.append((unir(relativa, entrada.name), datos.st_size, datos.st_mtime_ns,
+                                             entrada.inode()))
+                    except FileNotFoundError:
+                        # Borrado mientras se recorría el directorio
+                        continue
+                    if len(archivos) >= ARCHIVOS_POR_ENTREGA:
+                        if not entregar(archivos):
+                            return
+                        archivos = []
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        except PermissionError as e:
+            print(f"Advertencia: no se puede leer {e.filename}: {e.strerror}")
+        if archivos:
+            entregar(archivos)
+
+    def trabajar():
+        while not detener.is_set():
+            relativa = tareas.get()
+            if relativa is None:
+                return
+            try:
+                leer_directorio(relativa)
+            except Exception as e:
+                entregar(e)
+                detener.set()
+            with bloqueo:
+                pendientes['total'] -= 1
+                terminado = pendientes['total'] == 0
+            if terminado:
+                entregar(_FIN)
+
+    agregar(subdirectorio)
+    trabajadores = [threading.Thread(target=trabajar, daemon=True) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    try:
+        while True:
+            elemento = salida.get()
+            if elemento is _FIN:
+                return
+            if isinstance(elemento, Exception):
+                raise elemento
+            yield elemento
+    finally:
+        detener.set()
+        for _ in trabajadores:
+            tareas.put(None)
+
+
+def abrir_indice(ruta):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+
+def leer_estado(conexion, clave):
+    fila = conexion.execute("SELECT valor FROM estado WHERE clave = ?", (clave,)).fetchone()
+    return fila[0] if fila else None
+
+
+def fijar_estado(conexion, clave, valor):
+    conexion.execute("INSERT OR REPLACE INTO estado VALUES (?, ?)", (clave, str(valor)))
+
+
+def rango_subdirectorio(relativa):
+    # Todas las rutas que empiezan con "relativa/": "0" es el carácter siguiente a "/"
+    return relativa + "/", relativa + "0"
+
+
+def registrar_escaneo(conexion, raiz, hilos, generacion, subdirectorio=""):
+    # Inserta o actualiza cada archivo visto con la generación actual; los que no se vieron en el
+    # subárbol recorrido ya no existen y se borran del índice
+    resumen = {'archivos': 0, 'bytes': 0, 'eliminados': 0}
+    with conexion:
+        for lote in escanear(raiz, hilos, subdirectorio):
+            conexion.executemany("INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?, ?)",
+                                 [fila + (generacion,) for fila in lote])
+            resumen['archivos'] += len(lote)
+            resumen['bytes'] += sum(fila[1] for fila in lote)
+        if subdirectorio:
+            desde, hasta = rango_subdirectorio(subdirectorio)
+            cursor = conexion.execute("DELETE FROM archivos WHERE ruta >= ? AND ruta < ? AND visto < ?",
+                                      (desde, hasta, generacion))
+        else:
+            cursor = conexion.execute("DELETE FROM archivos WHERE visto < ?", (generacion,))
+        resumen['eliminados'] = cursor.rowcount
+    return resumen
+
+
+def leer_diario_cambios(rutas_diario):
+    # Rutas tocadas desde el último respaldo; None si el vigilante perdió eventos y hay que recorrer todo
+    rutas = set()
+    for ruta in rutas_diario:
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8") as diario:
+            for linea in diario:
+                if not linea.strip():
+                    continue
+                evento = json.loads(linea)
+                if evento.get('desborde'):
+                    return None
+                rutas.add(evento['ruta'])
+    return rutas
+
+
+def aplicar_cambios(conexion, raiz, rutas, hilos, generacion):
+    # Solo se consultan las rutas del diario: un archivo se actualiza con un stat, una ruta que ya no existe
+    # se borra junto con todo lo que había debajo, y un directorio nuevo o movido se recorre completo
+    resumen = {'archivos': 0, 'bytes': 0, 'eliminados': 0}
+    directorios = []
+    with conexion:
+        for relativa in sorted(rutas):
+            try:
+                datos = os.lstat(os.path.join(raiz, relativa))
+            except FileNotFoundError:
+                desde, hasta = rango_subdirectorio(relativa)
+                resumen['eliminados'] += conexion.execute("DELETE FROM archivos WHERE ruta = ?", (relativa,)).rowcount
+                resumen['eliminados'] += conexion.execute("DELETE FROM archivos WHERE ruta >= ? AND ruta < ?",
+                                                          (desde, hasta)).rowcount
+                continue
+            if stat.S_ISDIR(datos.st_mode):
+                directorios.append(relativa)
+            elif stat.S_ISREG(datos.st_mode):
+                conexion.execute("INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?, ?)",
+                                 (relativa, datos.st_size, datos.st_mtime_ns, datos.st_ino, generacion))
+                resumen['archivos'] += 1
+                resumen['bytes'] += datos.st_size
+    # Un directorio dentro de otro que también se recorre ya queda cubierto
+    for relativa in directorios:
+        if any(relativa.startswith(otro + "/") for otro in directorios):
+            continue
+        parcial = registrar_escaneo(conexion, raiz, hilos, generacion, relativa)
+        for campo in resumen:
+            resumen[campo] += parcial[campo]
+    return resumen
+
+
+def diario_valido(conexion):
+    # El diario solo reemplaza al recorrido si el vigilante está vivo y empezó antes de la última actualización
+    # del índice: así no hubo un intervalo sin vigilar. inotify no ve los cambios hechos por otros clientes NFS;
+    # en ese caso no se corre el vigilante y cada respaldo recorre el árbol comparando tamaño, mtime e inodo.
+    inicio_indice = leer_estado(conexion, 'inicio_actualizacion')
+    if ESCANEO_COMPLETO or inicio_indice is None or not os.path.exists(ruta_vigilancia()):
+        return False
+    with open(ruta_vigilancia(), encoding="utf-8") as archivo:
+        vigilancia = json.load(archivo)
+    vigente = time.time() - vigilancia['latido'] < 3 * INTERVALO_VIGILANCIA_SEGUNDOS
+    return (vigente and vigilancia['raiz'] == os.path.abspath(DIRECTORIO_ORIGEN)
+            and vigilancia['inicio'] <= float(inicio_indice))
+
+
+def agregar_diario(origen, destino):
+    with open(origen, encoding="utf-8") as entrada, open(destino, "a", encoding="utf-8") as salida:
+        for linea in entrada:
+            salida.write(linea)
+    os.remove(origen)
+
+
+def apartar_diario_cambios():
+    # El vigilante sigue escribiendo en un diario nuevo mientras se procesa el que se aparta aquí.
+    # Si quedó apartado el de una ejecución fallida, el diario nuevo se agrega al final: sus cambios
+    # se aplican junto con los pendientes y no se pierden cuando el respaldo borra el apartado.
+    apartado = ruta_diario_cambios() + ".procesando"
+    agregando = ruta_diario_cambios() + ".agregando"
+    if os.path.exists(agregando):
+        # El contenedor murió mientras agregaba: repetir líneas no cambia el conjunto de rutas
+        agregar_diario(agregando, apartado)
+    if not os.path.exists(ruta_diario_cambios()):
+        return apartado
+    if not os.path.exists(apartado):
+        os.replace(ruta_diario_cambios(), apartado)
+        return apartado
+    os.replace(ruta_diario_cambios(), agregando)
+    agregar_diario(agregando, apartado)
+    return apartado
+
+
+def actualizar_indice(raiz, hilos):
+    # Devuelve la conexión al índice actualizado y las rutas del diario que hay que borrar si el respaldo termina
+    conexion = abrir_indice(ruta_indice())
+    inicio = time.time()
+    generacion = int(leer_estado(conexion, 'generacion') or 0) + 1
+    apartado = apartar_diario_cambios()
+    rutas = leer_diario_cambios([apartado]) if diario_valido(conexion) else None
+    if rutas is None:
+        print(f"Recorriendo {raiz} con {hilos} hilos...")
+        resumen = registrar_escaneo(conexion, raiz, hilos, generacion)
+        print(f"Recorrido completo: {resumen['archivos']} archivos ({resumen['bytes']} bytes), "
+              f"{resumen['eliminados']} eliminados desde el último respaldo.")
+    else:
+        print(f"Aplicando {len(rutas)} rutas del diario de cambios...")
+        resumen = aplicar_cambios(conexion, raiz, rutas, hilos, generacion)
+        print(f"Diario aplicado: {resumen['archivos']} archivos actualizados, {resumen['eliminados']} eliminados.")
+    with conexion:
+        fijar_estado(conexion, 'generacion', generacion)
+    return conexion, inicio, apartado
+
+
+def objetos_del_indice(conexion):
+    # Mismo formato que la instantánea de COS. El ETag no existe en disco: se usa el inodo, así un archivo
+    # reemplazado (por ejemplo con rename) cuenta como modificado aunque conserve tamaño y mtime.
+    for ruta, tamano, mtime_ns, inodo in conexion.execute(
+            "SELECT ruta, tamano, mtime_ns, inodo FROM archivos ORDER BY ruta"):
+        yield {
+            'key': ruta,
+            'size': tamano,
+            'etag': f"inodo-{inodo}",
+            'mtime': datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).isoformat(),
+        }
+
+
+def crear_configuracion_rclone(secretos):
+    # El origen es un directorio local: rclone solo necesita el remoto de destino
+    config = f"""
+    [COS_DESTINATION]
+    type = s3
+    provider = IBMCOS
+    env_auth = false
+    access_key_id = {secretos['DESTINATION_ACCESS_KEY_ID']}
+    secret_access_key = {secretos['DESTINATION_SECRET_ACCESS_KEY']}
+    endpoint = {secretos['DESTINATION_ENDPOINT']}
+    """
+    with open(CONFIG_RCLONE_LOCAL, "w") as archivo:
+        archivo.write(config)
+
+
+def obtener_manifiesto_anterior(cliente, bucket_actual):
+    ruta_local = manifiesto.buscar_manifiesto_anterior(DIRECTORIO_MANIFIESTOS, bucket_actual)
+    if ruta_local:
+        return ruta_local
+    for bucket in reversed(listar_buckets_respaldo(cliente, [SERIE_BUCKET])):
+        if bucket['nombre'] >= bucket_actual:
+            continue
+        ruta_local = manifiesto.ruta_manifiesto(DIRECTORIO_MANIFIESTOS, bucket['nombre'])
+        try:
+            os.makedirs(DIRECTORIO_MANIFIESTOS, exist_ok=True)
+            cliente.download_file(bucket['nombre'], manifiesto.RUTA_MANIFIESTO_REMOTO, ruta_local)
+            return ruta_local
+        except Exception as e:
+            print(f"No se pudo descargar el manifiesto de {bucket['nombre']}: {e}")
+    return None
+
+
+def respaldar(secretos):
+    raiz = os.path.abspath(DIRECTORIO_ORIGEN)
+    conexion, inicio, apartado = actualizar_indice(raiz, HILOS_ESCANEO)
+    try:
+        cliente = crear_cliente_iam(secretos)
+        bucket = manifiesto.nombre_bucket_diario(SERIE_BUCKET, datetime.now(ZONA_LIMA))
+        print(f"Creando bucket: {bucket}")
+        cliente.create_bucket(Bucket=bucket)
+        aplicar_politica(cliente, bucket, politica_ciclo_vida(secretos['DIAS_PARA_ARCHIVAR'],
+                                                              secretos['DIAS_PARA_ELIMINAR']))
+
+        ruta_anterior = obtener_manifiesto_anterior(cliente, bucket)
+        fecha_limite = (datetime.now(ZONA_LIMA).date() - timedelta(days=int(secretos['DIAS_PARA_ELIMINAR']))
+                        + timedelta(days=MARGEN_REFERENCIAS_DIAS))
+        # El manifiesto se escribe aparte y solo pasa a DIRECTORIO_MANIFIESTOS si la copia termina:
+        # una ejecución fallida no puede servir de referencia a la siguiente
+        directorio_trabajo = os.path.join(DIRECTORIO_INDICE_LOCAL, bucket)
+        os.makedirs(directorio_trabajo, exist_ok=True)
+        ruta_manifiesto = os.path.join(directorio_trabajo, "manifiesto.jsonl.gz")
+        ruta_lista = os.path.join(directorio_trabajo, "copiar.txt")
+        resumen = manifiesto.generar_manifiesto_incremental(
+            objetos_del_indice(conexion), manifiesto.cargar_manifiesto(ruta_anterior), bucket, fecha_limite,
+            ruta_manifiesto, ruta_lista,
+        )
+        print(f"Archivos en origen: {resumen['objetos']} ({resumen['bytes']} bytes), "
+              f"a copiar: {resumen['a_copiar']} ({resumen['bytes_a_copiar']} bytes), "
+              f"referenciados: {resumen['referenciados']}")
+
+        crear_configuracion_rclone(secretos)
+        if resumen['a_copiar']:
+            resultado = ejecutar_rclone(construir_comando_copia(
+                raiz, f"COS_DESTINATION:{bucket}", flags_rendimiento(PARAMETROS_POR_DEFECTO), ruta_lista,
+                config=CONFIG_RCLONE_LOCAL,
+            ))
+            if resultado['codigo'] != 0:
+                print("La copia no terminó; el diario de cambios se conserva para la próxima ejecución.")
+                return 1
+        cliente.upload_file(ruta_manifiesto, bucket, manifiesto.RUTA_MANIFIESTO_REMOTO)
+        os.makedirs(DIRECTORIO_MANIFIESTOS, exist_ok=True)
+        os.replace(ruta_manifiesto, manifiesto.ruta_manifiesto(DIRECTORIO_MANIFIESTOS, bucket))
+
+        # Desde aquí el diario siguiente describe los cambios posteriores a este respaldo
+        with conexion:
+            fijar_estado(conexion, 'inicio_actualizacion', inicio)
+        if os.path.exists(apartado):
+            os.remove(apartado)
+        return 0
+    finally:
+        conexion.close()
+
+
+def abrir_vigilancia(raiz):
+    # Observa el árbol con inotify (solo Linux) para anotar en el diario de cambios las rutas tocadas.
+    # Cada directorio necesita su propio watch; con muchos directorios hay que subir fs.inotify.max_user_watches.
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    if descriptor < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+    return {'raiz': raiz, 'libc': libc, 'descriptor': descriptor, 'rutas': {}, 'cambios': set(), 'desborde': False}
+
+
+def vigilar_arbol(vigilancia, relativa):
+    pendientes = [relativa]
+    while pendientes:
+        actual = pendientes.pop()
+        absoluta = os.path.join(vigilancia['raiz'], actual) if actual else vigilancia['raiz']
+        watch = vigilancia['libc'].inotify_add_watch(vigilancia['descriptor'], os.fsencode(absoluta),
+                                                     MASCARA_VIGILANCIA)
+        if watch < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                # Sin watches disponibles ese subárbol no queda vigilado: el próximo respaldo recorre todo
+                print(f"Advertencia: se alcanzó max_user_watches en {absoluta}.")
+                vigilancia['desborde'] = True
+            continue
+        # inotify devuelve el mismo watch para un directorio movido: solo se actualiza su ruta
+        vigilancia['rutas'][watch] = actual
+        try:
+            with os.scandir(absoluta) as entradas:
+                pendientes.extend(unir(actual, entrada.name) for entrada in entradas
+                                  if entrada.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+
+
+def procesar_eventos(vigilancia, datos):
+    desplazamiento = 0
+    while desplazamiento < len(datos):
+        watch, mascara, _, longitud = CABECERA_EVENTO.unpack_from(datos, desplazamiento)
+        inicio_nombre = desplazamiento + CABECERA_EVENTO.size
+        nombre = os.fsdecode(datos[inicio_nombre:inicio_nombre + longitud].rstrip(b"\0"))
+        desplazamiento = inicio_nombre + longitud
+        if mascara & IN_Q_OVERFLOW:
+            vigilancia['desborde'] = True
+            continue
+        if mascara & IN_IGNORED:
+            vigilancia['rutas'].pop(watch, None)
+            continue
+        if watch not in vigilancia['rutas'] or not nombre:
+            continue
+        relativa = unir(vigilancia['rutas'][watch], nombre)
+        vigilancia['cambios'].add(relativa)
+        if mascara & IN_ISDIR and mascara & (IN_CREATE | IN_MOVED_TO):
+            vigilar_arbol(vigilancia, relativa)
+
+
+def volcar_cambios(vigilancia, inicio):
+    # El diario se abre y se cierra en cada volcado: el respaldo puede apartarlo en cualquier momento
+    if vigilancia['cambios'] or vigilancia['desborde']:
+        with open(ruta_diario_cambios(), "a", encoding="utf-8") as diario:
+            for relativa in sorted(vigilancia['cambios']):
+                diario.write(json.dumps({'ruta': relativa}) + "\n")
+            if vigilancia['desborde']:
+                diario.write(json.dumps({'desborde': True}) + "\n")
+        vigilancia['cambios'] = set()
+        vigilancia['desborde'] = False
+    with open(ruta_vigilancia() + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump({'raiz': vigilancia['raiz'], 'inicio': inicio, 'latido': time.time()}, archivo)
+    os.replace(ruta_vigilancia() + ".tmp", ruta_vigilancia())
+
+
+def vigilar(raiz):
+    os.makedirs(DIRECTORIO_INDICE_LOCAL, exist_ok=True)
+    inicio = time.time()
+    vigilancia = abrir_vigilancia(raiz)
+    print(f"Registrando watches en {raiz}...")
+    vigilar_arbol(vigilancia, "")
+    print(f"Vigilando {len(vigilancia['rutas'])} directorios.")
+    ultimo_volcado = 0
+    while True:
+        listos, _, _ = select.select([vigilancia['descriptor']], [], [], INTERVALO_VIGILANCIA_SEGUNDOS)
+        if listos:
+            procesar_eventos(vigilancia, os.read(vigilancia['descriptor'], 1024 * 1024))
+        # El latido se renueva en cada volcado, también cuando los eventos no paran
+        if time.time() - ultimo_volcado >= INTERVALO_VIGILANCIA_SEGUNDOS:
+            volcar_cambios(vigilancia, inicio)
+            ultimo_volcado = time.time()
+
+
+def main():
+    # python origen_local.py [respaldo | vigilar]
+    if not DIRECTORIO_ORIGEN or not os.path.isdir(DIRECTORIO_ORIGEN):
+        print("Error: DIRECTORIO_ORIGEN tiene que ser un directorio existente.")
+        return 1
+    if len(sys.argv) > 1 and sys.argv[1] == "vigilar":
+        vigilar(os.path.abspath(DIRECTORIO_ORIGEN))
+        return 0
+    secretos = cargar_secretos()
+    return respaldar(secretos)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+# Buckets de origen separados por comas; cada uno puede llevar su serie de buckets diarios: "ventas=backup-ventas"
+BUCKETS_ORIGEN = os.environ.get("BUCKETS_ORIGEN", "")
+BUCKETS_SIMULTANEOS = int(os.environ.get("BUCKETS_SIMULTANEOS", "4"))
+# Presupuesto global contra el endpoint, repartido entre los buckets que corren al mismo tiempo
+PRESUPUESTO_TRANSFERS = int(os.environ.get("PRESUPUESTO_TRANSFERS_GLOBAL", "256"))
+PRESUPUESTO_CHECKERS = int(os.environ.get("PRESUPUESTO_CHECKERS_GLOBAL", "128"))
+PRESUPUESTO_MEMORIA_MB = int(os.environ.get("PRESUPUESTO_MEMORIA_MB_GLOBAL", "4096"))
+TRANSFERS_MINIMOS = int(os.environ.get("TRANSFERS_MINIMOS", "8"))
+MEMORIA_MINIMA_MB = 256
+DIRECTORIO_TRABAJO = os.environ.get("DIRECTORIO_TRABAJO", "trabajo")
+
+SCRIPT_RESPALDO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rclone.py")
+# Nombre de bucket: {serie}-YYYY-MM-DD-x, como máximo 63 caracteres
+LARGO_MAXIMO_SERIE = 63 - len("-YYYY-MM-DD-x")
+
+
+def interpretar_buckets(texto):
+    buckets = []
+    for definicion in texto.split(","):
+        definicion = definicion.strip()
+        if not definicion:
+            continue
+        origen, _, serie = definicion.partition("=")
+        serie = serie.strip() or f"backup-{origen.strip()}"
+        if len(serie) > LARGO_MAXIMO_SERIE:
+            raise ValueError(f"La serie {serie} supera los {LARGO_MAXIMO_SERIE} caracteres; indícala con origen=serie")
+        buckets.append({'origen': origen.strip(), 'serie': serie})
+    return buckets
+
+
+def duracion_anterior(directorio):
+    # Segundos de copia de la última ejecución de este bucket según su historial de autoajuste
+    ruta = os.path.join(directorio, "historial", "autoajuste.jsonl")
+    if not os.path.exists(ruta):
+        return None
+    ultima = None
+    with open(ruta, encoding="utf-8") as historial:
+        for linea in historial:
+            if linea.strip():
+                ultima = json.loads(linea)
+    return ultima['segundos_copia'] if ultima else None
+
+
+def repartir(libres, huecos, minimo=1):
+    # La parte de cada hueco nunca pasa de lo que queda libre, aunque eso sea menos que el mínimo
+    return max(1, min(libres, max(minimo, libres // max(1, huecos))))
+
+
+def ejecutar_bucket(bucket, cupo, directorio, terminados):
+    # Cada bucket corre como un proceso rclone.py propio, con su directorio de trabajo y su parte del presupuesto
+    os.makedirs(directorio, exist_ok=True)
+    entorno = dict(os.environ)
+    entorno.update({
+        'BUCKET_ORIGEN': bucket['origen'],
+        'SERIE_BUCKET': bucket['serie'],
+        'PRESUPUESTO_TRANSFERS': str(cupo['transfers']),
+        'PRESUPUESTO_CHECKERS': str(cupo['checkers']),
+        'MEMORIA_MAXIMA_MB': str(cupo['memoria_mb']),
+        'METRICAS_TRABAJO': f"{os.environ.get('METRICAS_TRABAJO', 'backup_cos')}_{bucket['origen']}",
+    })
+    if os.environ.get("METRICAS_ARCHIVO"):
+        raiz, extension = os.path.splitext(os.path.abspath(os.environ["METRICAS_ARCHIVO"]))
+        entorno['METRICAS_ARCHIVO'] = f"{raiz}-{bucket['origen']}{extension}"
+    if os.environ.get("RUTA_CACHE_SECRETOS"):
+        entorno['RUTA_CACHE_SECRETOS'] = os.path.abspath(os.environ["RUTA_CACHE_SECRETOS"])
+
+    inicio = time.monotonic()
+    proceso = subprocess.Popen([sys.executable, SCRIPT_RESPALDO], cwd=directorio, env=entorno,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, encoding="utf-8", errors="replace", bufsize=1)
+    for linea in proceso.stdout:
+        print(f"[{bucket['origen']}] {linea.rstrip()}")
+    codigo = proceso.wait()
+    terminados.put((bucket, cupo, codigo, time.monotonic() - inicio))
+
+
+def orquestar(buckets, maximo=BUCKETS_SIMULTANEOS, transfers=PRESUPUESTO_TRANSFERS, checkers=PRESUPUESTO_CHECKERS,
+              memoria_mb=PRESUPUESTO_MEMORIA_MB, directorio=DIRECTORIO_TRABAJO):
+    # Los buckets más largos de la última ejecución arrancan primero (los que no tienen historial, antes que todos),
+    # así el final de la ventana no queda esperando a un solo bucket grande.
+    # rclone fija --transfers al arrancar: el presupuesto que libera un bucket al terminar pasa a los que arrancan
+    # después, y cuando quedan menos buckets pendientes que huecos, cada uno recibe una parte mayor.
+    for bucket in buckets:
+        bucket['directorio'] = os.path.join(directorio, bucket['origen'])
+        bucket['duracion_anterior'] = duracion_anterior(bucket['directorio'])
+    pendientes = sorted(buckets, key=lambda bucket: -(float("inf") if bucket['duracion_anterior'] is None
+                                                      else bucket['duracion_anterior']))
+
+    libres = {'transfers': transfers, 'checkers': checkers, 'memoria_mb': memoria_mb}
+    minimos = {'transfers': TRANSFERS_MINIMOS, 'checkers': 1, 'memoria_mb': MEMORIA_MINIMA_MB}
+    terminados = queue.Queue()
+    activos = 0
+    resultados = []
+    inicio = time.monotonic()
+    while pendientes or activos:
+        # Un bucket nuevo arranca solo si queda al menos el mínimo de cada presupuesto
+        while pendientes and activos < maximo and (all(libres[clave] >= minimos[clave] for clave in libres)
+                                                    or not activos):
+            huecos = min(len(pendientes), maximo - activos)
+            cupo = {clave: repartir(libres[clave], huecos, minimos[clave]) for clave in libres}
+            for clave in libres:
+                libres[clave] -= cupo[clave]
+            bucket = pendientes.pop(0)
+            print(f"Iniciando respaldo de {bucket['origen']} con {cupo['transfers']} transfers, "
+                  f"{cupo['checkers']} checkers y {cupo['memoria_mb']} MB")
+            threading.Thread(target=ejecutar_bucket, args=(bucket, cupo, bucket['directorio'], terminados),
+                             daemon=True).start()
+            activos += 1
+
+        bucket, cupo, codigo, segundos = terminados.get()
+        activos -= 1
+        for clave in libres:
+            libres[clave] += cupo[clave]
+        print(f"Respaldo de {bucket['origen']} terminado con código {codigo} en {segundos:.0f} s "
+              f"({len(pendientes)} pendientes, {activos} en curso)")
+        resultados.append({'origen': bucket['origen'], 'serie': bucket['serie'], 'codigo': codigo,
+                           'segundos': round(segundos, 1), 'transfers': cupo['transfers'],
+                           'checkers': cupo['checkers']})
+
+    resumen = {'segundos': round(time.monotonic() - inicio, 1), 'buckets': resultados,
+               'fallidos': [resultado['origen'] for resultado in resultados if resultado['codigo'] != 0]}
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, "orquestacion.json"), "w", encoding="utf-8") as archivo:
+        json.dump(resumen, archivo, indent=2)
+    return resumen
+
+
+def main():
+    buckets = interpretar_buckets(BUCKETS_ORIGEN)
+    if not buckets:
+        print("Error: BUCKETS_ORIGEN no tiene buckets de origen.")
+        return 1
+    resumen = orquestar(buckets)
+    print(f"Orquestación terminada en {resumen['segundos']:.0f} s; buckets con errores: "
+          f"{', '.join(resumen['fallidos']) or 'ninguno'}")
+    return 1 if resumen['fallidos'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
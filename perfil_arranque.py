@@ -0,0 +1,79 @@
+import importlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Se importa antes que cualquier otro módulo del script para medir desde lo más cerca posible del arranque
+INICIO = time.perf_counter()
+
+RUTA_REPORTE = os.environ.get("PERFIL_ARRANQUE")
+
+_importaciones = []
+_marcas = []
+
+
+def segundos_desde_inicio_proceso():
+    # Incluye el arranque del intérprete: se lee el inicio del proceso en /proc (solo Linux)
+    try:
+        with open("/proc/self/stat") as archivo:
+            inicio_ticks = int(archivo.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as archivo:
+            segundos_encendido = float(archivo.read().split()[0])
+        return segundos_encendido - inicio_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def transcurrido():
+    return time.perf_counter() - INICIO
+
+
+def importar(nombre_modulo):
+    # Importación diferida que registra cuánto costó cargar el módulo la primera vez
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nombre_modulo)
+    duracion = time.perf_counter() - inicio
+    if duracion > 0.001:
+        _importaciones.append({'modulo': nombre_modulo, 'segundos': round(duracion, 4),
+                               'desde_inicio': round(transcurrido(), 4)})
+    return modulo
+
+
+def marcar(etiqueta):
+    _marcas.append({'etapa': etiqueta, 'desde_inicio': round(transcurrido(), 4)})
+
+
+@contextmanager
+def medir(etiqueta):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _marcas.append({'etapa': etiqueta, 'segundos': round(time.perf_counter() - inicio, 4),
+                        'desde_inicio': round(transcurrido(), 4)})
+
+
+def reporte():
+    datos = {
+        'proceso_hasta_script': segundos_desde_inicio_proceso(),
+        'script': round(transcurrido(), 4),
+        'importaciones': _importaciones,
+        'etapas': _marcas,
+    }
+    if datos['proceso_hasta_script'] is not None:
+        # Tiempo que pasó entre el arranque del proceso y la importación de este módulo
+        datos['proceso_hasta_script'] = round(datos['proceso_hasta_script'] - transcurrido(), 4)
+    print("Perfil de arranque:")
+    if datos['proceso_hasta_script'] is not None:
+        print(f"  intérprete e importaciones iniciales: {datos['proceso_hasta_script']:.3f} s")
+    for importacion in _importaciones:
+        print(f"  import {importacion['modulo']}: {importacion['segundos']:.3f} s")
+    for marca in _marcas:
+        duracion = f"{marca['segundos']:.3f} s, " if 'segundos' in marca else ""
+        print(f"  {marca['etapa']}: {duracion}a los {marca['desde_inicio']:.3f} s")
+    if RUTA_REPORTE:
+        os.makedirs(os.path.dirname(RUTA_REPORTE) or ".", exist_ok=True)
+        with open(RUTA_REPORTE, "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps(datos) + "\n")
+    return datos
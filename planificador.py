@@ -0,0 +1,85 @@
+import os
+
+from fragmentos import CAMPOS_SUMABLES
+
+MB = 1024 * 1024
+
+
+def interpretar_prefijos(texto):
+    # Prefijos críticos separados por comas, en el orden en que tienen que llegar al bucket diario
+    return [prefijo.strip() for prefijo in texto.split(",") if prefijo.strip()]
+
+
+def ruta_lista_etapa(ruta_lista, indice):
+    return f"{ruta_lista}.etapa-{indice}.txt"
+
+
+def separar_por_prioridad(ruta_lista, prefijos):
+    # Una lista por prefijo crítico y una última con el resto. Cada lista conserva el orden de ruta_lista,
+    # así sigue sirviendo para filtrar la instantánea. Sin prefijos se devuelve la lista original.
+    if not prefijos:
+        return [("todo", ruta_lista)]
+    etapas = [(prefijo, ruta_lista_etapa(ruta_lista, indice)) for indice, prefijo in enumerate(prefijos)]
+    etapas.append(("resto", ruta_lista_etapa(ruta_lista, len(prefijos))))
+    archivos = [open(ruta, "w", encoding="utf-8") for _, ruta in etapas]
+    cantidades = [0] * len(etapas)
+    try:
+        with open(ruta_lista, encoding="utf-8") as lista:
+            for linea in lista:
+                # Gana el primer prefijo que coincide, como en el horario
+                indice = next((indice for indice, prefijo in enumerate(prefijos) if linea.startswith(prefijo)),
+                              len(prefijos))
+                archivos[indice].write(linea)
+                cantidades[indice] += 1
+    finally:
+        for archivo in archivos:
+            archivo.close()
+    for (_, ruta), cantidad in zip(etapas, cantidades):
+        if not cantidad:
+            os.remove(ruta)
+    return [etapa for etapa, cantidad in zip(etapas, cantidades) if cantidad]
+
+
+def orden_mayores_primero(objetos, umbral=64 * MB, porcentaje_grandes=75):
+    # Para la copia en servidor, donde el orden de envío es el orden de inicio. Igual que "--order-by size,mixed"
+    # de rclone: de cada 100 objetos enviados, porcentaje_grandes son los grandes (de mayor a menor) y el resto
+    # pequeños en el orden de la lista, así los grandes arrancan al principio sin dejar huecos sin trabajo.
+    # Solo los objetos de al menos `umbral` se guardan en memoria; `objetos` es una función y se recorre dos veces.
+    grandes = sorted((objeto for objeto in objetos() if objeto['size'] >= umbral),
+                     key=lambda objeto: objeto['size'], reverse=True)
+    enviados = 0
+    siguiente_grande = 0
+    for objeto in objetos():
+        if objeto['size'] >= umbral:
+            continue
+        while siguiente_grande < len(grandes) and siguiente_grande * 100 < (enviados + 1) * porcentaje_grandes:
+            yield grandes[siguiente_grande]
+            siguiente_grande += 1
+            enviados += 1
+        yield objeto
+        enviados += 1
+    yield from grandes[siguiente_grande:]
+
+
+def flags_orden(porcentaje_grandes, backlog):
+    # rclone ordena su cola de transferencias: "mixed" reparte los huecos entre los más grandes y los más pequeños.
+    # El orden solo abarca lo que está en la cola, por eso se amplía --max-backlog.
+    return f"--order-by size,mixed,{porcentaje_grandes} --max-backlog {backlog} "
+
+
+def orden_rcd(porcentaje_grandes):
+    return f"size,mixed,{porcentaje_grandes}"
+
+
+def combinar_etapas(resultados):
+    # Las etapas corren una después de otra: los contadores y la duración se suman
+    if len(resultados) == 1:
+        return resultados[0]
+    estadisticas = {campo: 0 for campo in CAMPOS_SUMABLES}
+    estadisticas['elapsedTime'] = 0
+    for resultado in resultados:
+        for campo in list(CAMPOS_SUMABLES) + ['elapsedTime']:
+            estadisticas[campo] += (resultado['estadisticas'] or {}).get(campo, 0)
+    if estadisticas['elapsedTime']:
+        estadisticas['speed'] = estadisticas['bytes'] / estadisticas['elapsedTime']
+    return {'codigo': max(resultado['codigo'] or 0 for resultado in resultados), 'estadisticas': estadisticas}
@@ -0,0 +1,195 @@
+import collections
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from ejecutor import LINEAS_MAXIMAS, interpretar_linea
+from horario import puerto_libre
+
+INTERVALO_ESTADO = 2
+INTERVALO_ESTADISTICAS = 30
+
+
+def iniciar_demonio(config="rclone.conf", flags_extra="", espera_maxima=30):
+    # Un solo proceso rclone por ejecución: la configuración se lee una vez y las conexiones HTTP
+    # a COS se reutilizan entre mkdir, listados, dry run y copia.
+    # Con -vv, como la copia por procesos: "Unchanged skipping" es DEBUG y el diario lo necesita
+    # para dar por copiados los objetos que ya estaban en el destino.
+    puerto = puerto_libre()
+    comando = (f"rclone rcd --rc-addr 127.0.0.1:{puerto} --rc-no-auth --config {config} "
+               f"-vv --use-json-log {flags_extra}")
+    print(f"Iniciando demonio de rclone: {comando}")
+    proceso = subprocess.Popen(comando, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True, encoding="utf-8", errors="replace", bufsize=1)
+    demonio = {
+        'proceso': proceso,
+        'puerto': puerto,
+        'url': f"http://127.0.0.1:{puerto}/",
+        'al_evento': None,
+        'errores': collections.deque(maxlen=LINEAS_MAXIMAS),
+    }
+    threading.Thread(target=_leer_log, args=(demonio,), daemon=True).start()
+
+    limite = time.monotonic() + espera_maxima
+    while True:
+        try:
+            llamar(demonio, "rc/noop")
+            return demonio
+        except OSError:
+            if proceso.poll() is not None or time.monotonic() > limite:
+                detener_demonio(demonio)
+                raise RuntimeError(f"El demonio de rclone no respondió: {list(demonio['errores'])}")
+            time.sleep(0.2)
+
+
+def _leer_log(demonio):
+    # Los objetos copiados y los errores siguen llegando como log JSON, igual que con un proceso por comando
+    for linea in demonio['proceso'].stderr:
+        evento = interpretar_linea(linea.rstrip("\n"))
+        if evento is None:
+            continue
+        if evento['nivel'] in ('error', 'critical'):
+            demonio['errores'].append(linea.rstrip("\n"))
+            objeto = f"{evento['objeto']}: " if evento.get('objeto') else ""
+            print(f"{evento['nivel'].upper()} : {objeto}{evento.get('mensaje', '')}")
+        if demonio['al_evento']:
+            demonio['al_evento'](evento)
+
+
+def llamar(demonio, metodo, **parametros):
+    solicitud = urllib.request.Request(
+        demonio['url'] + metodo, data=json.dumps(parametros).encode("utf-8"),
+        headers={'Content-Type': "application/json"}, method="POST",
+    )
+    try:
+        with urllib.request.urlopen(solicitud, timeout=300) as respuesta:
+            return json.loads(respuesta.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        # rclone responde los errores como JSON con el campo "error"
+        try:
+            detalle = json.loads(e.read()).get('error', str(e))
+        except ValueError:
+            detalle = str(e)
+        raise RuntimeError(f"rclone rc {metodo}: {detalle}") from None
+
+
+def detener_demonio(demonio):
+    try:
+        llamar(demonio, "core/quit")
+    except (OSError, RuntimeError):
+        pass
+    try:
+        demonio['proceso'].wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        demonio['proceso'].kill()
+        demonio['proceso'].wait()
+
+
+def separar_remoto(ruta):
+    # "COS_DESTINATION:bucket/clave" -> ("COS_DESTINATION:", "bucket/clave"); una ruta local usa su directorio
+    if ":" in ruta and not os.path.isabs(ruta):
+        remoto, _, resto = ruta.partition(":")
+        return f"{remoto}:", resto
+    ruta = os.path.abspath(ruta)
+    return os.path.dirname(ruta), os.path.basename(ruta)
+
+
+def crear_directorio(demonio, ruta):
+    fs, remoto = separar_remoto(ruta)
+    llamar(demonio, "operations/mkdir", fs=fs, remote=remoto)
+
+
+def listar(demonio, ruta, solo_directorios=False):
+    fs, remoto = separar_remoto(ruta)
+    respuesta = llamar(demonio, "operations/list", fs=fs, remote=remoto, opt={'dirsOnly': solo_directorios})
+    return respuesta.get('list', [])
+
+
+def copiar_archivo(demonio, origen, destino):
+    # Equivalente a "rclone copyto" para un solo archivo, local o remoto en cualquiera de los dos lados
+    fs_origen, remoto_origen = separar_remoto(origen)
+    fs_destino, remoto_destino = separar_remoto(destino)
+    if not fs_destino.endswith(":"):
+        os.makedirs(fs_destino, exist_ok=True)
+    llamar(demonio, "operations/copyfile", srcFs=fs_origen, srcRemote=remoto_origen,
+           dstFs=fs_destino, dstRemote=remoto_destino)
+
+
+def configuracion_copia(parametros, dry_run=False, orden=None, backlog=None, duracion_maxima=None):
+    # Opciones globales de la copia; las del backend S3 van en la cadena de conexión del destino
+    configuracion = {
+        'Transfers': parametros['transfers'],
+        'Checkers': parametros['checkers'],
+        'MultiThreadStreams': parametros['multi_thread_streams'],
+        'NoTraverse': True,
+        'CheckSum': not dry_run,
+        'DryRun': dry_run,
+    }
+    if orden:
+        configuracion['OrderBy'] = orden
+    if backlog:
+        configuracion['MaxBacklog'] = backlog
+    if duracion_maxima:
+        configuracion['MaxDuration'] = f"{duracion_maxima}s"
+    return configuracion
+
+
+def remoto_con_opciones(ruta, parametros):
+    remoto, _, resto = ruta.partition(":")
+    opciones = (f"upload_concurrency={parametros['s3_upload_concurrency']},"
+                f"chunk_size={parametros['s3_chunk_size_mb']}M,"
+                f"upload_cutoff={parametros['s3_upload_cutoff_mb']}M")
+    return f"{remoto},{opciones}:{resto}"
+
+
+def escuchar(demonio, al_evento):
+    # Los eventos de log del demonio (objetos copiados, errores) se entregan a al_evento; None deja de entregarlos
+    demonio['al_evento'] = al_evento
+
+
+def copiar_lista(demonio, origen, destino, parametros, ruta_lista, dry_run=False, mostrar=True, orden=None,
+                 backlog=None, duracion_maxima=None):
+    # Copia asíncrona guiada por la lista de claves; el progreso se lee de core/stats mientras el trabajo corre.
+    # Devuelve un resultado con las mismas claves que ejecutor.ejecutar_rclone.
+    trabajo = llamar(
+        demonio, "sync/copy",
+        srcFs=origen, dstFs=remoto_con_opciones(destino, parametros),
+        _async=True,
+        _config=configuracion_copia(parametros, dry_run, orden, backlog, duracion_maxima),
+        _filter={'FilesFromRaw': [os.path.abspath(ruta_lista)]},
+    )
+    id_trabajo = trabajo['jobid']
+    grupo = f"job/{id_trabajo}"
+    print(f"Trabajo {id_trabajo} de rclone: copia de {origen} a {destino}{' (dry run)' if dry_run else ''}")
+
+    ultimo_reporte = time.monotonic()
+    while True:
+        time.sleep(INTERVALO_ESTADO)
+        estado = llamar(demonio, "job/status", jobid=id_trabajo)
+        if estado.get('finished'):
+            break
+        if time.monotonic() - ultimo_reporte >= INTERVALO_ESTADISTICAS:
+            ultimo_reporte = time.monotonic()
+            estadisticas = llamar(demonio, "core/stats", group=grupo)
+            if mostrar:
+                print(f"Progreso: {estadisticas.get('bytes', 0)} bytes, {estadisticas.get('transfers', 0)} "
+                      f"transferencias, {estadisticas.get('errors', 0)} errores, {int(estadisticas.get('speed', 0))} B/s")
+
+    estadisticas = llamar(demonio, "core/stats", group=grupo)
+    resultado = {
+        'codigo': 0 if estado.get('success') else 1,
+        'stdout': collections.deque(maxlen=LINEAS_MAXIMAS),
+        'stderr': collections.deque(maxlen=LINEAS_MAXIMAS),
+        'errores': collections.deque([estado['error']] if estado.get('error') else [], maxlen=LINEAS_MAXIMAS),
+        'eventos': collections.Counter(),
+        'estadisticas': estadisticas,
+    }
+    if resultado['codigo'] != 0:
+        print(f"El trabajo {id_trabajo} de rclone terminó con error: {estado.get('error')}")
+    # Libera los contadores del grupo para que el demonio no acumule estadísticas de trabajos terminados
+    llamar(demonio, "core/stats-delete", group=grupo)
+    return resultado
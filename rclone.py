@@ -1,73 +1,182 @@
-import subprocess
+import perfil_arranque
 import os
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 import zoneinfo
-import ibm_boto3
-from ibm_botocore.client import Config
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-from ibm_secrets_manager_sdk.secrets_manager_v2 import SecretsManagerV2
 import json
+import gestor_secretos
+from ejecutor import construir_comando_copia, ejecutar_rclone
+from cliente_cos import crear_cliente_destino, crear_cliente_iam, crear_cliente_origen
+import autoajuste
+import cache_hashes
+import catalogo
+import copia_servidor
+import diario
+import empaquetado
+import estimador
+import fragmentos
+import gestion_buckets
+import horario
+import instantanea
+import listado_paralelo
+import manifiesto
+import metricas
+import planificador
+import rcd
+import replicacion
+import verificacion
 
 # Establecer la zona horaria de Lima, Perú
 timezone_lima = zoneinfo.ZoneInfo("America/Lima")
 
-secret_api_key = os.environ.get("SECRET_IBM_API_KEY")
+# Se completa en main() con los valores de Secrets Manager
+secretos = {}
+cliente_cos = None
+# Demonio rclone rcd de la ejecución cuando BACKEND_RCLONE=rcd
+demonio_rclone = None
+# Caché de MD5 de objetos multiparte, abierto la primera vez que se necesita
+cache_md5 = None
+# Destinos que ya tienen cada clave en la copia con réplicas; los reintentos solo escriben en los que faltan
+replicas_completadas = {}
 
-# Configuración de IBM Secret Manager
-authenticator = IAMAuthenticator(secret_api_key)
-secrets_manager = SecretsManagerV2(authenticator=authenticator)
-secrets_manager.set_service_url('https://65e7ac31-7d3d-4c5f-9545-f848e11f8a26.private.us-south.secrets-manager.appdomain.cloud')
+# Modo incremental: solo se copian los objetos nuevos o modificados respecto al manifiesto anterior
+MODO_INCREMENTAL = os.environ.get("MODO_INCREMENTAL", "false").lower() == "true"
+DIRECTORIO_MANIFIESTOS = os.environ.get("DIRECTORIO_MANIFIESTOS", "manifiestos")
+# Días antes de la expiración en los que una referencia deja de ser válida y el objeto se vuelve a copiar
+MARGEN_REFERENCIAS_DIAS = int(os.environ.get("MARGEN_REFERENCIAS_DIAS", "2"))
+# Directorio donde se guarda el listado único del origen que comparten todas las fases
+DIRECTORIO_INSTANTANEAS = os.environ.get("DIRECTORIO_INSTANTANEAS", "instantaneas")
 
-def obtener_secreto(secret_id):
-    response = secrets_manager.get_secret(id=secret_id)
-    secret_data = response.get_result()
-    # Corrección basada en la nueva comprensión de la estructura de los datos
-    if 'data' in secret_data:
-        secret_values = secret_data['data']
-        return secret_values
-    else:
-        print("La estructura del secreto no es como se esperaba.")
-        return {}
+# Autoajuste de concurrencia según la distribución de tamaños y ventanas de prueba cortas
+AUTOAJUSTE = os.environ.get("AUTOAJUSTE", "true").lower() == "true"
+AUTOAJUSTE_SONDEO = os.environ.get("AUTOAJUSTE_SONDEO", "true").lower() == "true"
+AUTOAJUSTE_SEGUNDOS_SONDEO = int(os.environ.get("AUTOAJUSTE_SEGUNDOS_SONDEO", "20"))
+MEMORIA_MAXIMA_MB = int(os.environ.get("MEMORIA_MAXIMA_MB", "2048"))
+HISTORIAL_AUTOAJUSTE = os.environ.get("HISTORIAL_AUTOAJUSTE", "historial/autoajuste.jsonl")
+
+# Copia fragmentada: N procesos locales, o N réplicas del contenedor con su índice de fragmento
+FRAGMENTOS_LOCALES = int(os.environ.get("FRAGMENTOS_LOCALES", "1"))
+TOTAL_FRAGMENTOS = int(os.environ.get("TOTAL_FRAGMENTOS", "1"))
+INDICE_FRAGMENTO = int(os.environ.get("INDICE_FRAGMENTO", os.environ.get("JOB_COMPLETION_INDEX", "0")))
+MODO_FRAGMENTOS = os.environ.get("MODO_FRAGMENTOS", "hash")  # hash o prefijo
+PROFUNDIDAD_PREFIJO = int(os.environ.get("PROFUNDIDAD_PREFIJO", "1"))
+
+# procesos: un rclone por comando; rcd: un solo demonio por ejecución manejado por su API de control remoto
+BACKEND_RCLONE = os.environ.get("BACKEND_RCLONE", "procesos")
+
+# Motor de copia: auto (copia en servidor si el endpoint lo permite), rclone o servidor
+MOTOR_COPIA = os.environ.get("MOTOR_COPIA", "auto")
+
+# Verificación posterior a la copia contra la instantánea; la fracción indica cuántos objetos se vuelven a leer
+VERIFICAR = os.environ.get("VERIFICAR", "true").lower() == "true"
+VERIFICACION_MUESTRA = float(os.environ.get("VERIFICACION_MUESTRA", "0"))
+VERIFICACION_HILOS = int(os.environ.get("VERIFICACION_HILOS", "16"))
+# Caché de MD5 por versión de objeto que se guarda junto al manifiesto; con CALCULAR_HASHES, los objetos multiparte
+# que no se pueden comparar por ETag se leen una vez y las ejecuciones siguientes solo consultan el caché.
+# Solo se llena al calcular hashes o al releer la muestra de la verificación: por omisión se activa en esos casos,
+# así no se descarga ni se sube un caché vacío en cada ejecución
+CALCULAR_HASHES = os.environ.get("CALCULAR_HASHES", "false").lower() == "true"
+CACHE_HASHES = os.environ.get(
+    "CACHE_HASHES", "true" if VERIFICAR and (CALCULAR_HASHES or VERIFICACION_MUESTRA > 0) else "false"
+).lower() == "true"
+
+# Diario de la ejecución: bucket de destino, fases completas y resultado de cada objeto
+DIRECTORIO_DIARIO = os.environ.get("DIRECTORIO_DIARIO", "diario")
+REINTENTOS_OBJETOS = int(os.environ.get("REINTENTOS_OBJETOS", "3"))
+ESPERA_REINTENTO_SEGUNDOS = int(os.environ.get("ESPERA_REINTENTO_SEGUNDOS", "30"))
+
+# Horario de ancho de banda y transfers en hora de Lima, por ejemplo "lun-vie 08:00-19:00 20M 16; 19:00-08:00 off"
+HORARIO_COPIA = horario.interpretar_horario(os.environ.get("HORARIO_COPIA", ""))
 
-secret_id = os.environ.get("SECRET_ID_PORTAL")
-secretos = obtener_secreto(secret_id)
+# El orquestador fija el bucket de origen, la serie de buckets diarios y la parte del presupuesto global
+# de checkers y transfers que corresponde a esta ejecución (0 = sin límite)
+BUCKET_ORIGEN = os.environ.get("BUCKET_ORIGEN")
+SERIE_BUCKET = os.environ.get("SERIE_BUCKET", manifiesto.SERIE_POR_DEFECTO)
+PRESUPUESTO_TRANSFERS = int(os.environ.get("PRESUPUESTO_TRANSFERS", "0"))
+PRESUPUESTO_CHECKERS = int(os.environ.get("PRESUPUESTO_CHECKERS", "0"))
+
+# Empaquetado de objetos pequeños en archivos tar con índice, para no pagar un PUT por objeto
+EMPAQUETAR = os.environ.get("EMPAQUETAR", "false").lower() == "true"
+UMBRAL_EMPAQUETADO_KB = int(os.environ.get("UMBRAL_EMPAQUETADO_KB", "64"))
+TAMANO_PAQUETE_MB = int(os.environ.get("TAMANO_PAQUETE_MB", "256"))
+HILOS_EMPAQUETADO = int(os.environ.get("HILOS_EMPAQUETADO", "64"))
+
+# Listado del origen por prefijos en paralelo; con false se usa el paginador secuencial
+LISTADO_PARALELO = os.environ.get("LISTADO_PARALELO", "true").lower() == "true"
+HILOS_LISTADO = int(os.environ.get("HILOS_LISTADO", "32"))
+PROFUNDIDAD_LISTADO = int(os.environ.get("PROFUNDIDAD_LISTADO", "2"))
+
+# Orden de la copia: "tamano" empieza por los objetos grandes mezclados con pequeños; "lista" respeta la instantánea
+ORDEN_COPIA = os.environ.get("ORDEN_COPIA", "tamano")
+PORCENTAJE_GRANDES = int(os.environ.get("PORCENTAJE_GRANDES", "75"))
+UMBRAL_GRANDE_MB = int(os.environ.get("UMBRAL_GRANDE_MB", "64"))
+BACKLOG_ORDEN = int(os.environ.get("BACKLOG_ORDEN", "200000"))
+# Prefijos críticos separados por comas: se copian completos, en ese orden, antes que el resto
+PREFIJOS_PRIORITARIOS = planificador.interpretar_prefijos(os.environ.get("PREFIJOS_PRIORITARIOS", ""))
+
+# El dry run completo de rclone es opcional; por defecto la vista previa la da el estimador
+EJECUTAR_DRY_RUN = os.environ.get("EJECUTAR_DRY_RUN", "false").lower() == "true"
+VENTANA_RESPALDO_MINUTOS = int(os.environ.get("VENTANA_RESPALDO_MINUTOS", "0"))
+PRECIO_CLASE_A_POR_MIL = float(os.environ.get("PRECIO_CLASE_A_POR_MIL", "0"))
+PRECIO_CLASE_B_POR_MIL = float(os.environ.get("PRECIO_CLASE_B_POR_MIL", "0"))
+
+# Catálogo local de las copias de todos los buckets diarios, actualizado al final de cada ejecución
+CATALOGO_ACTIVO = os.environ.get("CATALOGO_ACTIVO", "true").lower() == "true"
+
+# Al terminar, revisa todos los buckets diarios de la serie: actualiza su política y elimina los vencidos
+GESTIONAR_BUCKETS = os.environ.get("GESTIONAR_BUCKETS", "false").lower() == "true"
 
 def generar_nombre_bucket():
-    fecha_actual = datetime.now(timezone_lima).strftime('%Y-%m-%d')
-    
-    # Generar una letra aleatoria basada en la hora actual
-    letra_aleatoria = generar_letra_aleatoria()
-    
-    return f"backup-{fecha_actual}-{letra_aleatoria}"
-
-def generar_letra_aleatoria():
-    # Obtener el segundo actual
-    segundo_actual = datetime.now().second
-    
-    # Convertir el segundo en un índice de letra (0=a, 1=b, ..., 25=z)
-    indice_letra = segundo_actual % 26
-    
-    # Convertir el índice de letra en la letra correspondiente
-    letra = chr(indice_letra + 97)
-    
-    return letra
-
-def crear_bucket_con_rclone(bucket_name):
-    comando = f"rclone mkdir COS_DESTINATION:{bucket_name} --config rclone.conf"
+    return manifiesto.nombre_bucket_diario(SERIE_BUCKET, datetime.now(timezone_lima))
+
+def crear_bucket_con_rclone(bucket_name, remoto="COS_DESTINATION"):
     print(f"Creando bucket: {bucket_name}")
+    if demonio_rclone:
+        try:
+            rcd.crear_directorio(demonio_rclone, f"{remoto}:{bucket_name}")
+        except RuntimeError as e:
+            print(f"No se pudo crear el bucket {bucket_name}: {e}")
+        return
+    comando = f"rclone mkdir {remoto}:{bucket_name} --config rclone.conf"
     stdout, stderr = ejecutar_comando_rclone(comando)
     if stderr:
         print(f"No se pudo crear el bucket {bucket_name}: {stderr}")
 
 def ejecutar_comando_rclone(comando):
-    print(f"Ejecutando comando: {comando}")
-    proceso = subprocess.Popen(comando, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = proceso.communicate()
-    if stdout:
-        print("Salida del comando:", stdout.decode())
-    if stderr:
-        print("Errores del comando:", stderr.decode())
-    return stdout.decode(), stderr.decode()
+    # La salida se procesa en streaming; se devuelven solo las últimas líneas de cada flujo
+    resultado = ejecutar_rclone(comando)
+    return "\n".join(resultado['stdout']), "\n".join(resultado['stderr'])
+
+def copiar_archivo_rclone(origen, destino):
+    # Equivalente a "rclone copyto"; con el demonio no se lanza un proceso nuevo por archivo
+    if demonio_rclone:
+        try:
+            rcd.copiar_archivo(demonio_rclone, origen, destino)
+        except RuntimeError as e:
+            print(f"No se pudo copiar {origen} a {destino}: {e}")
+        return
+    ejecutar_comando_rclone(f"rclone copyto {origen} {destino} --config rclone.conf")
+
+def listar_buckets_destino():
+    if demonio_rclone:
+        return [entrada['Name'] for entrada in rcd.listar(demonio_rclone, "COS_DESTINATION:", solo_directorios=True)]
+    buckets = []
+
+    def registrar_bucket(linea):
+        if linea.split():
+            buckets.append(linea.split()[-1])
+
+    ejecutar_rclone("rclone lsd COS_DESTINATION: --config rclone.conf", al_linea_stdout=registrar_bucket)
+    return buckets
+
+def verificar_bucket_destino(bucket):
+    if demonio_rclone:
+        try:
+            rcd.listar(demonio_rclone, f"COS_DESTINATION:{bucket}", solo_directorios=True)
+        except RuntimeError as e:
+            print(f"No se pudo listar el bucket {bucket}: {e}")
+        return
+    ejecutar_comando_rclone(f"rclone lsd COS_DESTINATION:{bucket} --config rclone.conf")
 
 def crear_configuracion_rclone():
     # Asegurarse de que todos los valores necesarios están presentes
@@ -90,42 +199,36 @@ def crear_configuracion_rclone():
         secret_access_key = {secretos['DESTINATION_SECRET_ACCESS_KEY']}
         endpoint = {secretos['DESTINATION_ENDPOINT']}
         """
+        # Un remoto por cada destino adicional (DESTINATION_2_*, DESTINATION_3_*, ...)
+        for prefijo in replicacion.prefijos_replicas(secretos):
+            config += f"""
+        [{replicacion.remoto_replica(prefijo)}]
+        type = s3
+        provider = IBMCOS
+        env_auth = false
+        access_key_id = {secretos[f'{prefijo}_ACCESS_KEY_ID']}
+        secret_access_key = {secretos[f'{prefijo}_SECRET_ACCESS_KEY']}
+        endpoint = {secretos[f'{prefijo}_ENDPOINT']}
+        """
         with open("rclone.conf", "w") as file:
             file.write(config)
         print("Configuración de rclone creada exitosamente.")
     else:
         print("Error: No se encontraron las claves esperadas en los secretos. Revisa la recuperación del secreto.")
 
+def obtener_cliente_cos():
+    # Un solo cliente IAM por ejecución, compartido por la política de ciclo de vida y la copia en servidor.
+    # El SDK de COS solo se carga cuando hace falta (dentro de crear_cliente_iam).
+    global cliente_cos
+    if cliente_cos is None:
+        cliente_cos = crear_cliente_iam(secretos)
+    return cliente_cos
+
 def aplicar_politica_ciclo_vida(bucket_name):
-    cos_client = ibm_boto3.client('s3',
-                                  ibm_api_key_id=secretos['IBM_COS_API_KEY'],
-                                  ibm_service_instance_id=secretos['IBM_SERVICE_INSTANCE_ID'],
-                                  config=Config(signature_version='oauth'),
-                                  endpoint_url=secretos['IBM_COS_ENDPOINT'])
-
-    politica_ciclo_vida = {
-        'Rules': [
-            {
-                'ID': 'ArchiveAllObjects',
-                'Status': 'Enabled',
-                'Filter': {},
-                'Transitions': [
-                    {
-                        'Days': int(secretos['DIAS_PARA_ARCHIVAR']),
-                        'StorageClass': 'GLACIER'
-                    }
-                ]
-            },
-            {
-                'ID': 'DeleteAllObjects',
-                'Status': 'Enabled',
-                'Filter': {},
-                'Expiration': {
-                    'Days': int(secretos['DIAS_PARA_ELIMINAR'])
-                }
-            }
-        ]
-    }
+    cos_client = obtener_cliente_cos()
+
+    politica_ciclo_vida = gestion_buckets.politica_ciclo_vida(secretos['DIAS_PARA_ARCHIVAR'],
+                                                              secretos['DIAS_PARA_ELIMINAR'])
 
     try:
         cos_client.put_bucket_lifecycle_configuration(
@@ -136,44 +239,849 @@ def aplicar_politica_ciclo_vida(bucket_name):
     except cos_client.exceptions.ClientError as e:
         print(f"Error al aplicar la política de ciclo de vida: {e}")
 
-crear_configuracion_rclone()
-nombre_bucket_fecha = generar_nombre_bucket()
-crear_bucket_con_rclone(nombre_bucket_fecha)
-aplicar_politica_ciclo_vida(nombre_bucket_fecha)
-
-# Continuación del script...
-checkers = 64  # Número de hilos de verificación en paralelo
-transfers = 128  # Número de objetos a transferir en paralelo
-multi_thread_streams = 4  # Descarga de archivos grandes en partes en paralelo
-s3_upload_concurrency = 4  # Número de partes de archivos grandes a subir en paralelo
-
-cos_source_bucket = secretos['COS_SOURCE_NAME']
-cos_destination_bucket = nombre_bucket_fecha
-
-print("Verificando la configuración del bucket de origen...")
-ejecutar_comando_rclone(f"rclone lsd COS_SOURCE:{cos_source_bucket} --config rclone.conf")
-
-print("Verificando la configuración del bucket de destino...")
-ejecutar_comando_rclone(f"rclone lsd COS_DESTINATION:{cos_destination_bucket} --config rclone.conf")
-
-comando_dry_run = (
-    f"rclone --dry-run copy COS_SOURCE:{cos_source_bucket} COS_DESTINATION:{cos_destination_bucket} "
-    f"--checkers {checkers} "
-    f"--transfers {transfers} "
-    f"--multi-thread-streams {multi_thread_streams} "
-    f"--s3-upload-concurrency {s3_upload_concurrency} "
-    f"-vv --config rclone.conf"
-)
-print("Iniciando dry run de rclone...")
-stdout, stderr = ejecutar_comando_rclone(comando_dry_run)
-
-comando_copia = (
-    f"rclone copy COS_SOURCE:{cos_source_bucket} COS_DESTINATION:{cos_destination_bucket} "
-    f"--checkers {checkers} "
-    f"--transfers {transfers} "
-    f"--multi-thread-streams {multi_thread_streams} "
-    f"--s3-upload-concurrency {s3_upload_concurrency} "
-    f"-vv --checksum --config rclone.conf"
-)
-print("Iniciando copia real de rclone...")
-stdout, stderr = ejecutar_comando_rclone(comando_copia)
+def preparar_replicas(bucket_name):
+    # Cada réplica tiene su bucket diario en su propio endpoint, con la misma política de ciclo de vida
+    politica = gestion_buckets.politica_ciclo_vida(secretos['DIAS_PARA_ARCHIVAR'], secretos['DIAS_PARA_ELIMINAR'])
+    for replica in replicacion.replicas(secretos, bucket_name):
+        crear_bucket_con_rclone(replica['bucket'], replica['remoto'])
+        try:
+            gestion_buckets.aplicar_politica(crear_cliente_destino(secretos, prefijo=replica['prefijo']),
+                                             replica['bucket'], politica)
+            print(f"Política de ciclo de vida aplicada al bucket: {replica['bucket']}.")
+        except Exception as e:
+            print(f"Error al aplicar la política de ciclo de vida en {replica['bucket']}: {e}")
+
+def copiar_control_a_replicas(bucket_destino, ruta_manifiesto_nuevo):
+    # Los archivos de control no pasan por la copia con réplicas: se copian del bucket principal,
+    # sin volver a leer el origen
+    for replica in replicacion.replicas(secretos, bucket_destino):
+        if ruta_manifiesto_nuevo:
+            copiar_archivo_rclone(ruta_manifiesto_nuevo,
+                                  f"{replica['remoto']}:{replica['bucket']}/{manifiesto.RUTA_MANIFIESTO_REMOTO}")
+        if EMPAQUETAR:
+            ejecutar_comando_rclone(
+                f"rclone copy COS_DESTINATION:{bucket_destino}/{empaquetado.PREFIJO_PAQUETES} "
+                f"{replica['remoto']}:{replica['bucket']}/{empaquetado.PREFIJO_PAQUETES} --config rclone.conf"
+            )
+
+def buckets_anteriores(bucket_actual):
+    # Buckets diarios de la misma serie anteriores al actual, del más reciente al más antiguo
+    return sorted(
+        (nombre for nombre in listar_buckets_destino()
+         if manifiesto.fecha_de_bucket(nombre) and nombre < bucket_actual
+         and manifiesto.serie_de_bucket(nombre) == manifiesto.serie_de_bucket(bucket_actual)),
+        reverse=True,
+    )
+
+def obtener_manifiesto_anterior(bucket_actual):
+    # Primero se busca en el directorio local; si el contenedor es nuevo, se descarga del último bucket diario
+    ruta_local = manifiesto.buscar_manifiesto_anterior(DIRECTORIO_MANIFIESTOS, bucket_actual)
+    if ruta_local:
+        return ruta_local
+
+    for bucket_anterior in buckets_anteriores(bucket_actual):
+        ruta_local = manifiesto.ruta_manifiesto(DIRECTORIO_MANIFIESTOS, bucket_anterior)
+        copiar_archivo_rclone(f"COS_DESTINATION:{bucket_anterior}/{manifiesto.RUTA_MANIFIESTO_REMOTO}", ruta_local)
+        if os.path.exists(ruta_local):
+            return ruta_local
+    return None
+
+def obtener_catalogo(bucket_actual):
+    # Si el contenedor es nuevo, el catálogo se recupera del último bucket diario de la serie que lo tenga
+    if os.path.exists(catalogo.RUTA_CATALOGO):
+        return
+    for bucket_anterior in buckets_anteriores(bucket_actual):
+        copiar_archivo_rclone(f"COS_DESTINATION:{bucket_anterior}/{catalogo.RUTA_CATALOGO_REMOTO}",
+                              catalogo.RUTA_CATALOGO)
+        if os.path.exists(catalogo.RUTA_CATALOGO):
+            return
+
+def obtener_cache_hashes(bucket_actual):
+    # Igual que el catálogo: el archivo local se arrastra entre días y, si falta, se recupera del último bucket diario
+    global cache_md5
+    if cache_md5 is None:
+        ruta_local = cache_hashes.ruta_cache(DIRECTORIO_MANIFIESTOS, SERIE_BUCKET, INDICE_FRAGMENTO)
+        if not os.path.exists(ruta_local):
+            for bucket_anterior in buckets_anteriores(bucket_actual):
+                copiar_archivo_rclone(
+                    f"COS_DESTINATION:{bucket_anterior}/{cache_hashes.ruta_cache_remoto(INDICE_FRAGMENTO)}", ruta_local
+                )
+                if os.path.exists(ruta_local):
+                    break
+        cache_md5 = cache_hashes.abrir_cache(ruta_local)
+    return cache_md5
+
+def guardar_cache_hashes(bucket_destino):
+    cache = obtener_cache_hashes(bucket_destino)
+    ruta_local = cache_hashes.ruta_cache(DIRECTORIO_MANIFIESTOS, SERIE_BUCKET, INDICE_FRAGMENTO)
+    # Después de DIAS_PARA_ELIMINAR días sin consultarse, la versión ya no está en ningún bucket diario
+    guardadas = cache_hashes.guardar_cache(cache, ruta_local, dias_vigencia=int(secretos['DIAS_PARA_ELIMINAR']))
+    print(f"Caché de hashes: {guardadas} versiones, {cache['aciertos']} consultas resueltas sin leer objetos, "
+          f"{cache['calculados']} MD5 calculados en esta ejecución.")
+    copiar_archivo_rclone(ruta_local,
+                          f"COS_DESTINATION:{bucket_destino}/{cache_hashes.ruta_cache_remoto(INDICE_FRAGMENTO)}")
+
+def actualizar_catalogo(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino, nombre_diario):
+    obtener_catalogo(bucket_destino)
+    if ruta_manifiesto_nuevo:
+        # El manifiesto ya trae el bucket de cada objeto y, si se empaquetó, su ubicación en el paquete
+        objetos = manifiesto.leer_manifiesto(ruta_manifiesto_nuevo)
+        ubicaciones = None
+    else:
+        objetos = instantanea.leer_instantanea(ruta_instantanea_origen)
+        ubicaciones = empaquetado.leer_indice(empaquetado.ruta_indice_local(DIRECTORIO_DIARIO, nombre_diario)) \
+            if EMPAQUETAR else None
+    resumen = catalogo.registrar_respaldo(catalogo.RUTA_CATALOGO, bucket_destino, objetos, ubicaciones)
+    # Los buckets que ya expiraron no tienen copias que consultar
+    podados = catalogo.podar(catalogo.RUTA_CATALOGO, datetime.now(timezone_lima).date()
+                             - timedelta(days=int(secretos['DIAS_PARA_ELIMINAR'])))
+    print(f"Catálogo actualizado: {resumen}; buckets vencidos quitados: {podados}")
+    copiar_archivo_rclone(catalogo.RUTA_CATALOGO, f"COS_DESTINATION:{bucket_destino}/{catalogo.RUTA_CATALOGO_REMOTO}")
+
+def preparar_copia_incremental(ruta_origen, bucket_destino):
+    ruta_anterior = obtener_manifiesto_anterior(bucket_destino)
+    if ruta_anterior:
+        print(f"Manifiesto anterior: {ruta_anterior}")
+    else:
+        print("No hay manifiesto anterior, se copiarán todos los objetos.")
+    manifiesto_anterior = manifiesto.cargar_manifiesto(ruta_anterior)
+
+    # Solo se referencian buckets cuyos objetos no expiran en los próximos días
+    fecha_limite = (datetime.now(timezone_lima).date()
+                    - timedelta(days=int(secretos['DIAS_PARA_ELIMINAR']))
+                    + timedelta(days=MARGEN_REFERENCIAS_DIAS))
+
+    # El manifiesto se escribe aparte y solo pasa a DIRECTORIO_MANIFIESTOS cuando la copia y la verificación
+    # terminan bien: una ejecución fallida no puede servir de referencia a la siguiente
+    directorio_trabajo = os.path.join(DIRECTORIO_MANIFIESTOS, "trabajo")
+    os.makedirs(directorio_trabajo, exist_ok=True)
+    ruta_nuevo = manifiesto.ruta_manifiesto(directorio_trabajo, bucket_destino)
+    ruta_lista = os.path.join(directorio_trabajo, f"{bucket_destino}.copiar.txt")
+    resumen = manifiesto.generar_manifiesto_incremental(
+        instantanea.leer_instantanea(ruta_origen), manifiesto_anterior, bucket_destino, fecha_limite, ruta_nuevo, ruta_lista
+    )
+    print(f"Objetos en origen: {resumen['objetos']} ({resumen['bytes']} bytes), "
+          f"a copiar: {resumen['a_copiar']} ({resumen['bytes_a_copiar']} bytes), "
+          f"referenciados: {resumen['referenciados']}")
+    return ruta_nuevo, ruta_lista
+
+def promover_manifiesto(ruta_trabajo, bucket_destino):
+    # Sube el manifiesto al bucket diario y lo deja en DIRECTORIO_MANIFIESTOS para la próxima ejecución
+    print("Guardando manifiesto en el bucket de destino...")
+    copiar_archivo_rclone(ruta_trabajo, f"COS_DESTINATION:{bucket_destino}/{manifiesto.RUTA_MANIFIESTO_REMOTO}")
+    ruta_final = manifiesto.ruta_manifiesto(DIRECTORIO_MANIFIESTOS, bucket_destino)
+    os.replace(ruta_trabajo, ruta_final)
+    return ruta_final
+
+def objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino):
+    # En modo incremental son las entradas del manifiesto que apuntan al bucket de hoy
+    if ruta_manifiesto_nuevo:
+        return (entrada for entrada in manifiesto.leer_manifiesto(ruta_manifiesto_nuevo)
+                if entrada['bucket'] == bucket_destino)
+    return instantanea.leer_instantanea(ruta_instantanea_origen)
+
+def escribir_listas_fragmentos(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino, ruta_lista, total,
+                               solo_fragmento=None, ruta_filtro=None):
+    # Con ruta_filtro solo se reparten las claves de esa lista (por ejemplo, las pendientes del diario)
+    def objetos():
+        fuente = objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino)
+        return instantanea.filtrar_por_lista(fuente, ruta_filtro) if ruta_filtro else fuente
+
+    asignacion_prefijos = None
+    if MODO_FRAGMENTOS == "prefijo":
+        asignacion_prefijos = fragmentos.asignar_prefijos(objetos(), total, PROFUNDIDAD_PREFIJO)
+    resumen = fragmentos.escribir_listas_fragmentos(
+        objetos(), total, ruta_lista,
+        modo=MODO_FRAGMENTOS, asignacion_prefijos=asignacion_prefijos, profundidad=PROFUNDIDAD_PREFIJO,
+        solo_fragmento=solo_fragmento,
+    )
+    for fragmento in resumen:
+        print(f"Fragmento {fragmento['indice']}: {fragmento['objetos']} objetos, {fragmento['bytes']} bytes.")
+    return resumen
+
+def combinar_reportes_remotos(bucket_destino, directorio):
+    # Cada réplica sube su reporte; la que termina al final deja el reporte combinado completo
+    directorio_reportes = os.path.join(directorio, "reportes")
+    if demonio_rclone:
+        os.makedirs(directorio_reportes, exist_ok=True)
+        for entrada in rcd.listar(demonio_rclone, f"COS_DESTINATION:{bucket_destino}/_reportes"):
+            if entrada['Name'].startswith("fragmento-") and entrada['Name'].endswith(".json"):
+                copiar_archivo_rclone(f"COS_DESTINATION:{bucket_destino}/_reportes/{entrada['Name']}",
+                                      os.path.join(directorio_reportes, entrada['Name']))
+    else:
+        ejecutar_comando_rclone(
+            f"rclone copy COS_DESTINATION:{bucket_destino}/_reportes {directorio_reportes} "
+            f"--include 'fragmento-*.json' --config rclone.conf"
+        )
+    reportes = []
+    for nombre in sorted(os.listdir(directorio_reportes)):
+        if nombre.startswith("fragmento-") and nombre.endswith(".json"):
+            with open(os.path.join(directorio_reportes, nombre), encoding="utf-8") as archivo:
+                reportes.append(json.load(archivo))
+    combinado = fragmentos.combinar_reportes(reportes)
+    combinado['completo'] = len(reportes) == TOTAL_FRAGMENTOS
+    ruta_combinado = os.path.join(directorio_reportes, "ejecucion.json")
+    fragmentos.guardar_reporte(combinado, ruta_combinado)
+    copiar_archivo_rclone(ruta_combinado, f"COS_DESTINATION:{bucket_destino}/_reportes/ejecucion.json")
+    return combinado
+
+def elegir_motor_copia(bucket_origen, bucket_destino):
+    # Con destinos adicionales cada objeto se lee una vez y se escribe en todos;
+    # ejecutar_respaldo ya rechazó otro MOTOR_COPIA explícito
+    if MOTOR_COPIA == "replicacion" or replicacion.prefijos_replicas(secretos):
+        return "replicacion"
+    if MOTOR_COPIA == "rclone":
+        return "rclone"
+    if MOTOR_COPIA == "servidor":
+        return "servidor"
+    if copia_servidor.copia_en_servidor_posible(secretos, obtener_cliente_cos(), bucket_origen, bucket_destino):
+        return "servidor"
+    return "rclone"
+
+def ruta_reporte_verificacion(bucket):
+    return os.path.join(DIRECTORIO_INSTANTANEAS, f"{bucket}.verificacion", "problemas.jsonl")
+
+def verificar_destino(ruta_instantanea_origen, ruta_manifiesto_nuevo, ruta_lista_copia, bucket_origen,
+                      bucket_destino, cliente_destino, bucket_verificado, remoto, nombre_diario=None):
+    # Las claves esperadas son las mismas en todos los destinos: se calculan siempre contra el bucket principal
+    ruta_reporte = ruta_reporte_verificacion(bucket_verificado)
+    directorio = os.path.dirname(ruta_reporte)
+    resumen = verificacion.verificar(
+        crear_cliente_origen(secretos), cliente_destino, bucket_origen, bucket_verificado,
+        instantanea.filtrar_por_lista(
+            objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino), ruta_lista_copia
+        ),
+        directorio, ruta_reporte, hilos=VERIFICACION_HILOS, fraccion_muestra=VERIFICACION_MUESTRA,
+        cache=obtener_cache_hashes(bucket_destino) if CACHE_HASHES else None, calcular=CALCULAR_HASHES,
+    )
+    ruta_indice = empaquetado.ruta_indice_local(DIRECTORIO_DIARIO, nombre_diario) if nombre_diario else None
+    if EMPAQUETAR and ruta_indice and os.path.exists(ruta_indice):
+        # La lista de copia no tiene los objetos empaquetados: se verifican contra el índice
+        resumen['paquetes'] = verificacion.verificar_paquetes(
+            cliente_destino, bucket_verificado, empaquetado.leer_indice(ruta_indice),
+            f"{empaquetado.PREFIJO_PAQUETES}/{nombre_diario}/", empaquetado.clave_indice(nombre_diario),
+            ruta_reporte, hilos=VERIFICACION_HILOS, fraccion_muestra=VERIFICACION_MUESTRA,
+        )
+        resumen['correcto'] = resumen['correcto'] and resumen['paquetes']['correcto']
+    ruta_resumen = os.path.join(directorio, "resumen.json")
+    with open(ruta_resumen, "w", encoding="utf-8") as archivo:
+        json.dump(resumen, archivo, indent=2)
+    print(f"Verificación de {remoto}:{bucket_verificado}: {resumen}")
+    # El reporte queda junto al backup para poder auditarlo después
+    for ruta in (ruta_reporte, ruta_resumen):
+        copiar_archivo_rclone(ruta, f"{remoto}:{bucket_verificado}/_verificacion/{os.path.basename(ruta)}")
+    return resumen
+
+def verificar_copia(ruta_instantanea_origen, ruta_manifiesto_nuevo, ruta_lista_copia, bucket_origen, bucket_destino,
+                    nombre_diario):
+    # Los paquetes se verifican solo en el bucket principal: llegan a las réplicas después, con copiar_control_a_replicas
+    resumen = verificar_destino(ruta_instantanea_origen, ruta_manifiesto_nuevo, ruta_lista_copia, bucket_origen,
+                                bucket_destino, crear_cliente_destino(secretos), bucket_destino, "COS_DESTINATION",
+                                nombre_diario)
+    # Con réplicas, cada destino se verifica por separado y la copia es correcta solo si lo son todos
+    replicas = replicacion.replicas(secretos, bucket_destino)
+    if replicas:
+        resumen['replicas'] = {}
+        for replica in replicas:
+            propio = verificar_destino(
+                ruta_instantanea_origen, ruta_manifiesto_nuevo, ruta_lista_copia, bucket_origen, bucket_destino,
+                crear_cliente_destino(secretos, prefijo=replica['prefijo']), replica['bucket'], replica['remoto'],
+            )
+            resumen['replicas'][replica['remoto']] = propio
+            resumen['correcto'] = resumen['correcto'] and propio['correcto']
+    return resumen
+
+def reabrir_copia(estado, nombre_diario, bucket_destino):
+    # Las claves con problemas en cualquier destino vuelven a quedar como fallidas en el registro por objeto
+    # y la fase de copia se reabre: la próxima ejecución copia solo esas claves y vuelve a verificar
+    claves = set()
+    indice_faltante = False
+    for bucket in [bucket_destino] + [replica['bucket'] for replica in replicacion.replicas(secretos, bucket_destino)]:
+        ruta = ruta_reporte_verificacion(bucket)
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8") as reporte:
+            for linea in reporte:
+                problema = json.loads(linea)
+                if problema['problema'] in verificacion.PROBLEMAS_COPIA:
+                    claves.add(problema['key'])
+                indice_faltante = indice_faltante or problema['problema'] == 'indice_faltante'
+    # Los objetos empaquetados con problemas salen del índice y el empaquetado se repite: vuelven a un paquete
+    # nuevo y el índice se sube otra vez
+    descartados = empaquetado.descartar(empaquetado.ruta_indice_local(DIRECTORIO_DIARIO, nombre_diario), claves)
+    if descartados or indice_faltante:
+        estado['fases'].pop('empaquetado', None)
+    registro = diario.abrir_registro(DIRECTORIO_DIARIO, nombre_diario)
+    try:
+        for clave in sorted(claves):
+            diario.registrar_objeto(registro, clave, False)
+    finally:
+        diario.cerrar_registro(registro)
+    estado['fases'].pop('copia', None)
+    completar_fase(estado, 'verificacion_fallida', claves_a_copiar=len(claves))
+    print(f"La verificación falló: {len(claves)} objetos quedan pendientes. La próxima ejecución retomará "
+          f"el bucket {bucket_destino}, los volverá a copiar y verificará de nuevo.")
+
+def cargar_secretos():
+    # Los secretos se leen del caché (memoria y archivo cifrado opcional) antes de consultar Secrets Manager
+    gestor_secretos.cargar_secretos(secretos)
+
+def buscar_diario_remoto(nombre):
+    # Si el contenedor se reemplazó, el diario se recupera del bucket diario de hoy o de ayer
+    hoy = datetime.now(timezone_lima).date()
+    candidatos = [
+        bucket for bucket in listar_buckets_destino()
+        if manifiesto.fecha_de_bucket(bucket) and (hoy - manifiesto.fecha_de_bucket(bucket)).days <= 1
+        and manifiesto.serie_de_bucket(bucket) == SERIE_BUCKET
+    ]
+    for bucket in sorted(candidatos, reverse=True):
+        copiar_archivo_rclone(f"COS_DESTINATION:{bucket}/_diario/{nombre}.json",
+                              diario.ruta_estado(DIRECTORIO_DIARIO, nombre))
+        estado = diario.cargar_diario(DIRECTORIO_DIARIO, nombre)
+        if estado:
+            return estado
+    return None
+
+def completar_fase(estado, fase, **datos):
+    # El diario se guarda en disco y en el bucket diario, así sobrevive a un reemplazo del contenedor
+    ruta = diario.completar_fase(DIRECTORIO_DIARIO, estado, fase, **datos)
+    copiar_archivo_rclone(ruta, f"COS_DESTINATION:{estado['bucket']}/_diario/{estado['nombre']}.json")
+
+def objetos_en_orden(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino, ruta_lista):
+    def objetos():
+        return instantanea.filtrar_por_lista(
+            objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino), ruta_lista
+        )
+
+    if ORDEN_COPIA == "tamano":
+        return planificador.orden_mayores_primero(objetos, UMBRAL_GRANDE_MB * planificador.MB, PORCENTAJE_GRANDES)
+    return objetos()
+
+def copiar_por_etapas(motor_copia, bucket_origen, bucket_destino, parametros, ruta_lista, ruta_instantanea_origen,
+                      ruta_manifiesto_nuevo, registro):
+    # Los prefijos críticos se copian completos antes que el resto; dentro de cada etapa manda ORDEN_COPIA
+    etapas = planificador.separar_por_prioridad(ruta_lista, PREFIJOS_PRIORITARIOS)
+    resultados = []
+    for etiqueta, ruta_etapa in etapas:
+        if len(etapas) > 1:
+            print(f"Copiando etapa {etiqueta}...")
+        resultados.append(copiar_lista(motor_copia, bucket_origen, bucket_destino, parametros, ruta_etapa,
+                                       ruta_instantanea_origen, ruta_manifiesto_nuevo, registro))
+    return planificador.combinar_etapas(resultados)
+
+def copiar_sondeo(bucket_origen, bucket_destino, nombre_diario, parametros, ruta_porcion, segundos):
+    # Las ventanas de prueba copian de verdad: van por el mismo backend que la copia real
+    # y sus objetos quedan en el diario, así la copia no los repite y los fallidos se reintentan
+    registro = diario.abrir_registro(DIRECTORIO_DIARIO, nombre_diario)
+    try:
+        def al_evento(evento):
+            diario.registrar_evento_rclone(registro, evento)
+
+        if demonio_rclone:
+            rcd.escuchar(demonio_rclone, al_evento)
+            try:
+                return rcd.copiar_lista(demonio_rclone, f"COS_SOURCE:{bucket_origen}",
+                                        f"COS_DESTINATION:{bucket_destino}", parametros, ruta_porcion,
+                                        mostrar=False, duracion_maxima=segundos)
+            finally:
+                rcd.escuchar(demonio_rclone, None)
+        return autoajuste.copia_sondeo(f"COS_SOURCE:{bucket_origen}", f"COS_DESTINATION:{bucket_destino}",
+                                       parametros, ruta_porcion, segundos, al_evento=al_evento)
+    finally:
+        diario.cerrar_registro(registro)
+
+def copiar_lista(motor_copia, bucket_origen, bucket_destino, parametros, ruta_lista, ruta_instantanea_origen,
+                 ruta_manifiesto_nuevo, registro):
+    # Copia las claves de ruta_lista con el motor elegido y anota en el diario el resultado de cada objeto
+    def al_resultado(clave, correcto, segundos):
+        diario.registrar_objeto(registro, clave, correcto)
+        metricas.observar_latencia(segundos)
+
+    def al_evento(evento):
+        diario.registrar_evento_rclone(registro, evento)
+        metricas.observar_evento_rclone(evento)
+
+    # Con HORARIO_COPIA, el tramo vigente limita ancho de banda y transfers y se ajusta en caliente al cambiar
+    tramo = horario.tramo_actual(HORARIO_COPIA)
+    if motor_copia == "replicacion":
+        destinos = [{'nombre': "COS_DESTINATION", 'cliente': crear_cliente_destino(secretos, parametros['transfers']),
+                     'bucket': bucket_destino}]
+        destinos += [{'nombre': replica['remoto'],
+                      'cliente': crear_cliente_destino(secretos, parametros['transfers'], prefijo=replica['prefijo']),
+                      'bucket': replica['bucket']}
+                     for replica in replicacion.replicas(secretos, bucket_destino)]
+        print(f"Iniciando copia con réplicas en {', '.join(destino['nombre'] for destino in destinos)}...")
+        vigente = {'tramo': tramo}
+        detener = None
+        if HORARIO_COPIA:
+            detener = horario.iniciar_planificador(HORARIO_COPIA, al_cambiar=lambda nuevo: vigente.update(tramo=nuevo))
+        try:
+            estadisticas_copia = replicacion.copiar_objetos(
+                crear_cliente_origen(secretos, parametros['transfers']), bucket_origen, destinos,
+                objetos_en_orden(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino, ruta_lista),
+                hilos=parametros['transfers'],
+                corte=parametros['s3_chunk_size_mb'] * replicacion.MB,
+                parte_minima=parametros['s3_chunk_size_mb'] * replicacion.MB,
+                memoria_maxima=MEMORIA_MAXIMA_MB * replicacion.MB,
+                ruta_fallidos=os.path.join(DIRECTORIO_INSTANTANEAS, f"{bucket_destino}.fallidos.txt"),
+                al_resultado=al_resultado,
+                limite_concurrencia=(
+                    (lambda: horario.transfers_permitidos(vigente['tramo'], parametros['transfers']))
+                    if HORARIO_COPIA else None
+                ),
+                completados=replicas_completadas,
+                # Las escrituras en todos los destinos comparten el límite del tramo, repartido entre fragmentos
+                limite_ancho_banda=(
+                    (lambda: horario.bytes_por_segundo(
+                        horario.repartir_ancho_banda(vigente['tramo']['ancho_banda'], TOTAL_FRAGMENTOS)))
+                    if HORARIO_COPIA else None
+                ),
+            )
+        finally:
+            if detener:
+                detener.set()
+        metricas.sumar_estadisticas(estadisticas_copia)
+        for nombre, propias in estadisticas_copia['destinos'].items():
+            metricas.fijar('replica_bytes', propias['bytes'], destino=nombre)
+            metricas.fijar('replica_objetos', propias['transfers'], destino=nombre)
+            metricas.fijar('replica_errores', propias['errors'], destino=nombre)
+        return {'codigo': 1 if estadisticas_copia['errors'] else 0, 'estadisticas': estadisticas_copia}
+
+    if motor_copia == "servidor":
+        # COS copia los objetos internamente; los bytes no pasan por el contenedor ni por el enlace,
+        # así que del horario solo se aplica el límite de transfers
+        print("Iniciando copia en servidor con copy_object/upload_part_copy...")
+        vigente = {'tramo': tramo}
+        detener = None
+        # Los MD5 ya conocidos se guardan en la copia como X-Amz-Meta-Md5chksum
+        cache = obtener_cache_hashes(bucket_destino) if CACHE_HASHES else None
+        if HORARIO_COPIA:
+            detener = horario.iniciar_planificador(HORARIO_COPIA, al_cambiar=lambda nuevo: vigente.update(tramo=nuevo))
+        try:
+            estadisticas_copia = copia_servidor.copiar_objetos(
+                obtener_cliente_cos(), bucket_origen, bucket_destino,
+                objetos_en_orden(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino, ruta_lista),
+                hilos=parametros['transfers'],
+                ruta_fallidos=os.path.join(DIRECTORIO_INSTANTANEAS, f"{bucket_destino}.fallidos.txt"),
+                al_resultado=al_resultado,
+                limite_concurrencia=(
+                    (lambda: horario.transfers_permitidos(vigente['tramo'], parametros['transfers']))
+                    if HORARIO_COPIA else None
+                ),
+                md5_conocido=(lambda objeto: cache_hashes.buscar(cache, bucket_origen, objeto)) if cache else None,
+            )
+        finally:
+            if detener:
+                detener.set()
+        metricas.sumar_estadisticas(estadisticas_copia)
+        return {'codigo': 1 if estadisticas_copia['errors'] else 0, 'estadisticas': estadisticas_copia}
+
+    if demonio_rclone:
+        # Un trabajo asíncrono en el demonio; el límite de ancho de banda del horario vale para todo el demonio
+        parametros_trabajo = dict(parametros)
+        parametros_trabajo['transfers'] = horario.transfers_permitidos(tramo, parametros['transfers'])
+        detener = None
+        if HORARIO_COPIA:
+            rcd.llamar(demonio_rclone, "core/bwlimit",
+                       rate=horario.repartir_ancho_banda(tramo['ancho_banda'], TOTAL_FRAGMENTOS))
+            detener = horario.iniciar_planificador(HORARIO_COPIA, puertos=[demonio_rclone['puerto']],
+                                                   divisor=TOTAL_FRAGMENTOS)
+        rcd.escuchar(demonio_rclone, al_evento)
+        try:
+            print("Iniciando copia real en el demonio de rclone...")
+            resultado = rcd.copiar_lista(
+                demonio_rclone, f"COS_SOURCE:{bucket_origen}", f"COS_DESTINATION:{bucket_destino}",
+                parametros_trabajo, ruta_lista,
+                orden=planificador.orden_rcd(PORCENTAJE_GRANDES) if ORDEN_COPIA == "tamano" else None,
+                backlog=BACKLOG_ORDEN if ORDEN_COPIA == "tamano" else None,
+            )
+        finally:
+            rcd.escuchar(demonio_rclone, None)
+            if detener:
+                detener.set()
+        metricas.sumar_estadisticas(resultado['estadisticas'])
+        return resultado
+
+    # rclone no cambia --transfers mientras corre: se usa el del tramo vigente al iniciar.
+    # El ancho de banda sí se ajusta en caliente con core/bwlimit, repartido entre procesos y réplicas.
+    procesos = max(1, FRAGMENTOS_LOCALES)
+    puertos = [horario.puerto_libre() for _ in range(procesos)] if HORARIO_COPIA else []
+    parametros_proceso = dict(parametros)
+    parametros_proceso['checkers'] = max(1, parametros['checkers'] // procesos)
+    parametros_proceso['transfers'] = max(1, horario.transfers_permitidos(tramo, parametros['transfers']) // procesos)
+
+    def flags_horario(indice):
+        orden = planificador.flags_orden(PORCENTAJE_GRANDES, BACKLOG_ORDEN) if ORDEN_COPIA == "tamano" else ""
+        if not HORARIO_COPIA:
+            return orden
+        return orden + horario.flags_control_remoto(
+            puertos[indice], horario.repartir_ancho_banda(tramo['ancho_banda'], procesos * TOTAL_FRAGMENTOS)
+        )
+
+    detener = None
+    if HORARIO_COPIA:
+        print(f"Horario vigente: ancho de banda {tramo['ancho_banda']}, transfers {tramo['transfers'] or 'sin límite'}")
+        detener = horario.iniciar_planificador(HORARIO_COPIA, puertos=puertos, divisor=procesos * TOTAL_FRAGMENTOS)
+    try:
+        if FRAGMENTOS_LOCALES > 1:
+            # Cada proceso recibe una parte de la concurrencia total para no sobrepasar la memoria del contenedor
+            print(f"Iniciando copia real en {FRAGMENTOS_LOCALES} procesos de rclone...")
+            escribir_listas_fragmentos(ruta_instantanea_origen, ruta_manifiesto_nuevo, bucket_destino,
+                                       ruta_lista, FRAGMENTOS_LOCALES, ruta_filtro=ruta_lista)
+            comandos = [
+                construir_comando_copia(f"COS_SOURCE:{bucket_origen}", f"COS_DESTINATION:{bucket_destino}",
+                                        autoajuste.flags_rendimiento(parametros_proceso),
+                                        fragmentos.ruta_lista_fragmento(ruta_lista, indice),
+                                        flags_extra=flags_horario(indice))
+                for indice in range(FRAGMENTOS_LOCALES)
+            ]
+            reporte_copia = fragmentos.ejecutar_fragmentos_locales(comandos, al_evento=al_evento)
+            fragmentos.guardar_reporte(reporte_copia,
+                                       os.path.join(DIRECTORIO_INSTANTANEAS, f"{bucket_destino}.reporte.json"))
+            metricas.sumar_estadisticas(reporte_copia)
+            return {'codigo': reporte_copia['codigo'], 'estadisticas': reporte_copia}
+
+        comando_copia = construir_comando_copia(f"COS_SOURCE:{bucket_origen}", f"COS_DESTINATION:{bucket_destino}",
+                                                autoajuste.flags_rendimiento(parametros_proceso), ruta_lista,
+                                                flags_extra=flags_horario(0))
+        print("Iniciando copia real de rclone...")
+        resultado = ejecutar_rclone(comando_copia, al_evento=al_evento)
+        metricas.sumar_estadisticas(resultado['estadisticas'])
+        return resultado
+    finally:
+        if detener:
+            detener.set()
+
+def ejecutar_respaldo():
+    # Cada fase se mide con metricas.fase; devuelve True si la copia quedó completa y verificada
+    global demonio_rclone
+    if BACKEND_RCLONE == "rcd" and FRAGMENTOS_LOCALES > 1:
+        # Los fragmentos locales son procesos rclone separados; el demonio corre una sola copia a la vez
+        print("Error: FRAGMENTOS_LOCALES no se puede usar con BACKEND_RCLONE=rcd. "
+              "Usa BACKEND_RCLONE=procesos o TOTAL_FRAGMENTOS con varias réplicas del contenedor.")
+        return False
+    with perfil_arranque.medir("secretos"), metricas.fase("secretos"):
+        cargar_secretos()
+    # Una copia puede durar horas: el token IAM y el caché de secretos se renuevan en segundo plano,
+    # así los clientes creados más tarde y la próxima ejecución no esperan a Secrets Manager
+    gestor_secretos.iniciar_refresco_periodico(gestor_secretos.ids_portal())
+    if replicacion.prefijos_replicas(secretos) and MOTOR_COPIA not in ("auto", "replicacion"):
+        # rclone y la copia en servidor solo escriben en COS_DESTINATION: las réplicas quedarían vacías
+        print(f"Error: MOTOR_COPIA={MOTOR_COPIA} no se puede usar con destinos adicionales (DESTINATION_2_ENDPOINT). "
+              "Usa MOTOR_COPIA=auto o MOTOR_COPIA=replicacion.")
+        return False
+    with perfil_arranque.medir("configuracion_rclone"), metricas.fase("configuracion_rclone"):
+        crear_configuracion_rclone()
+    if BACKEND_RCLONE == "rcd":
+        # El demonio lee rclone.conf una vez y mantiene las conexiones abiertas para todas las fases
+        with perfil_arranque.medir("demonio_rclone"), metricas.fase("demonio_rclone"):
+            demonio_rclone = rcd.iniciar_demonio()
+    perfil_arranque.marcar("primer_comando_rclone")
+    perfil_arranque.reporte()
+
+    # Si una ejecución anterior no terminó, se retoma sobre el mismo bucket y sin repetir las fases completas
+    nombre_diario = diario.nombre_diario(INDICE_FRAGMENTO if TOTAL_FRAGMENTOS > 1 else None)
+    estado = diario.cargar_diario(DIRECTORIO_DIARIO, nombre_diario) or buscar_diario_remoto(nombre_diario)
+    if estado:
+        nombre_bucket_fecha = estado['bucket']
+        print(f"Reanudando la ejecución anterior sobre el bucket {nombre_bucket_fecha} "
+              f"(fases completas: {', '.join(estado['fases']) or 'ninguna'})...")
+    else:
+        if TOTAL_FRAGMENTOS > 1:
+            # Todas las réplicas tienen que escribir en el mismo bucket diario, sin la letra aleatoria
+            nombre_bucket_fecha = os.environ.get("BUCKET_DESTINO") or f"{SERIE_BUCKET}-{datetime.now(timezone_lima).strftime('%Y-%m-%d')}"
+        else:
+            nombre_bucket_fecha = generar_nombre_bucket()
+        estado = diario.nuevo_diario(nombre_bucket_fecha, nombre_diario)
+        diario.reiniciar_eventos(DIRECTORIO_DIARIO, nombre_diario)
+
+    cos_source_bucket = BUCKET_ORIGEN or secretos['COS_SOURCE_NAME']
+    cos_destination_bucket = nombre_bucket_fecha
+    metricas.etiquetar(origen=cos_source_bucket, fragmento=INDICE_FRAGMENTO if TOTAL_FRAGMENTOS > 1 else None)
+
+    if not diario.fase_completa(estado, 'bucket'):
+        with metricas.fase("crear_bucket"):
+            crear_bucket_con_rclone(nombre_bucket_fecha)
+        with metricas.fase("politica_ciclo_vida"):
+            aplicar_politica_ciclo_vida(nombre_bucket_fecha)
+        if replicacion.prefijos_replicas(secretos):
+            with metricas.fase("replicas"):
+                preparar_replicas(nombre_bucket_fecha)
+        completar_fase(estado, 'bucket')
+
+    # El origen se lista una sola vez; este listado también sirve para verificar el acceso al bucket
+    ruta_instantanea_origen = instantanea.ruta_instantanea(DIRECTORIO_INSTANTANEAS, cos_source_bucket, cos_destination_bucket)
+    if diario.fase_completa(estado, 'instantanea') and os.path.exists(ruta_instantanea_origen):
+        print(f"Usando la instantánea del origen ya capturada: {ruta_instantanea_origen}")
+    else:
+        print("Listando el bucket de origen...")
+        with metricas.fase("instantanea"):
+            if LISTADO_PARALELO:
+                objetos_origen = listado_paralelo.listar_paralelo(
+                    crear_cliente_origen(secretos, HILOS_LISTADO), cos_source_bucket,
+                    hilos=HILOS_LISTADO, profundidad=PROFUNDIDAD_LISTADO,
+                )
+            else:
+                objetos_origen = instantanea.listar_objetos(crear_cliente_origen(secretos), cos_source_bucket)
+            resumen_origen = instantanea.capturar_instantanea(objetos_origen, ruta_instantanea_origen)
+        print(f"Instantánea del origen: {resumen_origen['objetos']} objetos, {resumen_origen['bytes']} bytes.")
+        metricas.fijar('origen_objetos', resumen_origen['objetos'])
+        metricas.fijar('origen_bytes', resumen_origen['bytes'])
+        completar_fase(estado, 'instantanea', **resumen_origen)
+
+        print("Verificando la configuración del bucket de destino...")
+        with metricas.fase("lsd_destino"):
+            verificar_bucket_destino(cos_destination_bucket)
+
+    fase_lista = estado['fases'].get('lista', {})
+    if fase_lista and os.path.exists(fase_lista['ruta_lista_copia']):
+        ruta_manifiesto_nuevo = fase_lista['ruta_manifiesto_nuevo']
+        ruta_lista_copia = fase_lista['ruta_lista_copia']
+    else:
+        with metricas.fase("lista"):
+            # En modo incremental solo se copian los objetos nuevos o modificados desde el último manifiesto
+            if MODO_INCREMENTAL:
+                print("Calculando diferencias contra el manifiesto anterior...")
+                ruta_manifiesto_nuevo, ruta_lista_copia = preparar_copia_incremental(ruta_instantanea_origen,
+                                                                                     cos_destination_bucket)
+            else:
+                ruta_manifiesto_nuevo = None
+                ruta_lista_copia = ruta_instantanea_origen[:-len(".jsonl.gz")] + ".copiar.txt"
+                instantanea.escribir_lista_archivos(instantanea.leer_instantanea(ruta_instantanea_origen), ruta_lista_copia)
+
+            # Como réplica de una copia fragmentada, este contenedor solo copia las claves de su fragmento
+            if TOTAL_FRAGMENTOS > 1:
+                print(f"Réplica del fragmento {INDICE_FRAGMENTO} de {TOTAL_FRAGMENTOS}...")
+                escribir_listas_fragmentos(ruta_instantanea_origen, ruta_manifiesto_nuevo, cos_destination_bucket,
+                                           ruta_lista_copia, TOTAL_FRAGMENTOS, solo_fragmento=INDICE_FRAGMENTO)
+                ruta_lista_copia = fragmentos.ruta_lista_fragmento(ruta_lista_copia, INDICE_FRAGMENTO)
+        completar_fase(estado, 'lista', ruta_manifiesto_nuevo=ruta_manifiesto_nuevo, ruta_lista_copia=ruta_lista_copia)
+
+    fase_empaquetado = estado['fases'].get('empaquetado', {})
+    if EMPAQUETAR and fase_empaquetado and os.path.exists(fase_empaquetado['ruta_lista_copia']):
+        ruta_lista_copia = fase_empaquetado['ruta_lista_copia']
+    elif EMPAQUETAR:
+        # Los objetos pequeños viajan en paquetes; rclone o la copia en servidor solo reciben los grandes
+        # y los que no se pudieron empaquetar. Cada paquete se sube recién cuando está completo.
+        print("Empaquetando objetos pequeños...")
+        ruta_lista_sueltos = ruta_lista_copia[:-len(".txt")] + ".sueltos.txt"
+        lista_empaquetable = ruta_lista_copia
+        with metricas.fase("empaquetado"):
+            resumen_empaquetado = empaquetado.empaquetar(
+                crear_cliente_origen(secretos, HILOS_EMPAQUETADO), crear_cliente_destino(secretos),
+                cos_source_bucket, cos_destination_bucket,
+                lambda: instantanea.filtrar_por_lista(
+                    objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, cos_destination_bucket),
+                    lista_empaquetable
+                ),
+                nombre_diario, DIRECTORIO_DIARIO, ruta_lista_sueltos,
+                umbral=UMBRAL_EMPAQUETADO_KB * empaquetado.KB, tamano_paquete=TAMANO_PAQUETE_MB * empaquetado.MB,
+                hilos=HILOS_EMPAQUETADO,
+            )
+            if MODO_INCREMENTAL:
+                empaquetado.anotar_manifiesto(ruta_manifiesto_nuevo,
+                                              empaquetado.ruta_indice_local(DIRECTORIO_DIARIO, nombre_diario),
+                                              cos_destination_bucket)
+        print(f"Empaquetado: {resumen_empaquetado}")
+        metricas.fijar('objetos_empaquetados', resumen_empaquetado['objetos'] + resumen_empaquetado['reanudados'])
+        metricas.fijar('paquetes_subidos', resumen_empaquetado['paquetes'])
+        ruta_lista_copia = ruta_lista_sueltos
+        completar_fase(estado, 'empaquetado', ruta_lista_copia=ruta_lista_copia, **resumen_empaquetado)
+
+    # El motor se elige una sola vez y queda en el diario: la estimación, el autoajuste y la copia usan el mismo,
+    # también al reanudar
+    fase_motor = estado['fases'].get('motor', {})
+    if fase_motor:
+        motor_copia = fase_motor['motor']
+    else:
+        motor_copia = elegir_motor_copia(cos_source_bucket, cos_destination_bucket)
+        completar_fase(estado, 'motor', motor=motor_copia)
+
+    # Parámetros de concurrencia de esta ejecución, elegidos según los objetos que realmente se van a copiar:
+    # sin los que ya están en buckets anteriores, los de otros fragmentos ni los empaquetados
+    distribucion = autoajuste.muestrear_tamanos(instantanea.filtrar_por_lista(
+        objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, cos_destination_bucket), ruta_lista_copia
+    ))
+    velocidad_sondeo = None
+    if diario.fase_completa(estado, 'parametros'):
+        parametros = estado['fases']['parametros']['parametros']
+    elif AUTOAJUSTE:
+        print("Ajustando parámetros de concurrencia según la distribución de tamaños...")
+        if AUTOAJUSTE_SONDEO and motor_copia != "rclone":
+            # Las ventanas de prueba miden rclone; la copia en servidor y la de réplicas no usan sus parámetros
+            print(f"Sin sondeo: la copia se hará con el motor {motor_copia}.")
+        with metricas.fase("autoajuste"):
+            parametros, velocidad_sondeo = autoajuste.elegir_parametros(
+                distribucion,
+                f"COS_SOURCE:{cos_source_bucket}",
+                f"COS_DESTINATION:{cos_destination_bucket}",
+                ruta_lista_copia,
+                sondeo=AUTOAJUSTE_SONDEO and motor_copia == "rclone",
+                segundos=AUTOAJUSTE_SEGUNDOS_SONDEO,
+                memoria_maxima_mb=MEMORIA_MAXIMA_MB,
+                directorio=DIRECTORIO_INSTANTANEAS,
+                transfers_maximos=PRESUPUESTO_TRANSFERS,
+                checkers_maximos=PRESUPUESTO_CHECKERS,
+                copiar=lambda parametros_sondeo, ruta_porcion, segundos: copiar_sondeo(
+                    cos_source_bucket, cos_destination_bucket, nombre_diario, parametros_sondeo, ruta_porcion,
+                    segundos),
+            )
+        completar_fase(estado, 'parametros', parametros=parametros)
+    else:
+        parametros = dict(autoajuste.PARAMETROS_POR_DEFECTO)
+    parametros = autoajuste.ajustar_a_presupuesto(parametros, PRESUPUESTO_TRANSFERS, PRESUPUESTO_CHECKERS)
+    print(f"Parámetros de rclone: {parametros}")
+    flags_parametros = autoajuste.flags_rendimiento(parametros)
+
+    if not diario.fase_completa(estado, 'estimacion'):
+        with metricas.fase("estimacion"):
+            estimacion = estimador.estimar(
+                instantanea.filtrar_por_lista(
+                    objetos_a_copiar(ruta_instantanea_origen, ruta_manifiesto_nuevo, cos_destination_bucket),
+                    ruta_lista_copia
+                ),
+                parametros, motor_copia, HISTORIAL_AUTOAJUSTE,
+                cos_source_bucket, velocidad_sondeo=velocidad_sondeo, ventana_minutos=VENTANA_RESPALDO_MINUTOS,
+                precio_clase_a=PRECIO_CLASE_A_POR_MIL, precio_clase_b=PRECIO_CLASE_B_POR_MIL,
+                destinos=1 + len(replicacion.prefijos_replicas(secretos)),
+            )
+        duracion = f"{estimacion['segundos'] / 60:.0f} min" if estimacion['segundos'] is not None else "desconocida"
+        print(f"Estimación ({estimacion['fuente']}): {estimacion['objetos']} objetos, {estimacion['bytes']} bytes, "
+              f"duración {duracion}, {estimacion['clase_a']} peticiones de clase A y {estimacion['clase_b']} de clase B"
+              f"{', costo ' + str(estimacion['costo_peticiones']) if 'costo_peticiones' in estimacion else ''}.")
+        if estimacion['excede_ventana']:
+            print(f"ADVERTENCIA: la copia estimada supera la ventana de respaldo de {VENTANA_RESPALDO_MINUTOS} min.")
+        if estimacion['segundos'] is not None:
+            metricas.fijar('estimacion_segundos', estimacion['segundos'])
+        metricas.fijar('estimacion_peticiones', estimacion['clase_a'], clase="a")
+        metricas.fijar('estimacion_peticiones', estimacion['clase_b'], clase="b")
+        metricas.fijar('estimacion_excede_ventana', int(estimacion['excede_ventana']))
+        completar_fase(estado, 'estimacion', **estimacion)
+
+    if EJECUTAR_DRY_RUN and not diario.fase_completa(estado, 'dry_run'):
+        # rclone lee las claves de la instantánea en lugar de volver a listar el origen en cada fase
+        print("Iniciando dry run de rclone...")
+        with metricas.fase("dry_run"):
+            if demonio_rclone:
+                rcd.copiar_lista(demonio_rclone, f"COS_SOURCE:{cos_source_bucket}",
+                                 f"COS_DESTINATION:{cos_destination_bucket}", parametros, ruta_lista_copia, dry_run=True)
+            else:
+                comando_dry_run = construir_comando_copia(f"COS_SOURCE:{cos_source_bucket}",
+                                                          f"COS_DESTINATION:{cos_destination_bucket}",
+                                                          flags_parametros, ruta_lista_copia, dry_run=True)
+                stdout, stderr = ejecutar_comando_rclone(comando_dry_run)
+        completar_fase(estado, 'dry_run')
+
+    if not diario.fase_completa(estado, 'copia'):
+        registro = diario.abrir_registro(DIRECTORIO_DIARIO, nombre_diario)
+        try:
+            # Solo se copian las claves que el diario no tiene como copiadas; las fallidas se reintentan con espera
+            with metricas.fase("copia"):
+                resultado_copia, fallidos = diario.copiar_con_reintentos(
+                    lambda ruta_lista: copiar_por_etapas(motor_copia, cos_source_bucket, cos_destination_bucket,
+                                                         parametros, ruta_lista, ruta_instantanea_origen,
+                                                         ruta_manifiesto_nuevo, registro),
+                    DIRECTORIO_DIARIO, nombre_diario, ruta_lista_copia,
+                    reintentos=REINTENTOS_OBJETOS, espera_inicial=ESPERA_REINTENTO_SEGUNDOS,
+                    al_reintento=lambda intento, pendientes: metricas.incrementar('reintentos_total', origen="cola"),
+                )
+        finally:
+            diario.cerrar_registro(registro)
+        resultado_copia = resultado_copia or {'codigo': 0, 'estadisticas': {}}
+
+        if TOTAL_FRAGMENTOS > 1:
+            ruta_reporte = os.path.join(DIRECTORIO_INSTANTANEAS, f"fragmento-{INDICE_FRAGMENTO}.json")
+            fragmentos.guardar_reporte(fragmentos.reporte_fragmento(INDICE_FRAGMENTO, TOTAL_FRAGMENTOS, resultado_copia),
+                                       ruta_reporte)
+            copiar_archivo_rclone(ruta_reporte,
+                                  f"COS_DESTINATION:{cos_destination_bucket}/_reportes/fragmento-{INDICE_FRAGMENTO}.json")
+            reporte_ejecucion = combinar_reportes_remotos(cos_destination_bucket, DIRECTORIO_INSTANTANEAS)
+            print(f"Reporte combinado: {reporte_ejecucion['fragmentos']} de {TOTAL_FRAGMENTOS} fragmentos, "
+                  f"{reporte_ejecucion['bytes']} bytes, {reporte_ejecucion['errors']} errores.")
+
+        registro_autoajuste = autoajuste.registrar_resultado(
+            HISTORIAL_AUTOAJUSTE, cos_source_bucket, cos_destination_bucket, distribucion, parametros,
+            velocidad_sondeo, resultado_copia
+        )
+        print(f"Velocidad de la copia: {registro_autoajuste['velocidad_copia'] / autoajuste.MB:.1f} MB/s")
+
+        metricas.fijar('objetos_fallidos', fallidos)
+        if fallidos:
+            print(f"Quedaron {fallidos} objetos sin copiar después de {REINTENTOS_OBJETOS} reintentos. "
+                  f"La próxima ejecución retomará el bucket {cos_destination_bucket} y solo reintentará esos objetos.")
+            return False
+        completar_fase(estado, 'copia')
+
+    if VERIFICAR and not diario.fase_completa(estado, 'verificacion'):
+        print("Verificando el bucket de destino contra la instantánea del origen...")
+        with metricas.fase("verificacion"):
+            resumen_verificacion = verificar_copia(ruta_instantanea_origen, ruta_manifiesto_nuevo, ruta_lista_copia,
+                                                   cos_source_bucket, cos_destination_bucket, nombre_diario)
+        if not resumen_verificacion['correcto']:
+            # El manifiesto no se sube ni sirve de referencia; el diario queda abierto para la próxima ejecución
+            reabrir_copia(estado, nombre_diario, cos_destination_bucket)
+            if CACHE_HASHES:
+                guardar_cache_hashes(cos_destination_bucket)
+            return False
+        completar_fase(estado, 'verificacion', **resumen_verificacion)
+
+    fase_manifiesto = estado['fases'].get('manifiesto', {})
+    if fase_manifiesto:
+        ruta_manifiesto_nuevo = fase_manifiesto['ruta_manifiesto_nuevo']
+    elif MODO_INCREMENTAL:
+        # El manifiesto queda dentro del bucket diario para que la próxima ejecución pueda usarlo
+        with metricas.fase("subir_manifiesto"):
+            ruta_manifiesto_nuevo = promover_manifiesto(ruta_manifiesto_nuevo, cos_destination_bucket)
+        completar_fase(estado, 'manifiesto', ruta_manifiesto_nuevo=ruta_manifiesto_nuevo)
+
+    if replicacion.prefijos_replicas(secretos):
+        with metricas.fase("control_replicas"):
+            copiar_control_a_replicas(cos_destination_bucket, ruta_manifiesto_nuevo if MODO_INCREMENTAL else None)
+
+    if CACHE_HASHES:
+        # El caché de hashes también queda junto al manifiesto, en modo incremental o completo
+        with metricas.fase("cache_hashes"):
+            guardar_cache_hashes(cos_destination_bucket)
+
+    if CATALOGO_ACTIVO and INDICE_FRAGMENTO == 0:
+        with metricas.fase("catalogo"):
+            actualizar_catalogo(ruta_instantanea_origen, ruta_manifiesto_nuevo, cos_destination_bucket, nombre_diario)
+
+    if GESTIONAR_BUCKETS and INDICE_FRAGMENTO == 0:
+        # Con varias réplicas, solo la primera hace la limpieza
+        print("Revisando los buckets diarios de la serie...")
+        with metricas.fase("gestion_buckets"):
+            resumen_gestion = gestion_buckets.gestionar(
+                obtener_cliente_cos(), secretos['DIAS_PARA_ARCHIVAR'], secretos['DIAS_PARA_ELIMINAR'],
+                [SERIE_BUCKET], hilos=gestion_buckets.HILOS_GESTION, margen_dias=gestion_buckets.MARGEN_ELIMINACION_DIAS,
+                vaciar=gestion_buckets.VACIAR_VENCIDOS, simular=gestion_buckets.SIMULAR_GESTION,
+            )
+            print(f"Gestión de buckets: {resumen_gestion}")
+            # Cada réplica tiene su propia serie "{serie}-rN" en su endpoint y vence con la misma política
+            for replica in replicacion.replicas(secretos, cos_destination_bucket):
+                resumen_gestion = gestion_buckets.gestionar(
+                    crear_cliente_destino(secretos, prefijo=replica['prefijo']),
+                    secretos['DIAS_PARA_ARCHIVAR'], secretos['DIAS_PARA_ELIMINAR'], [replica['serie']],
+                    hilos=gestion_buckets.HILOS_GESTION, margen_dias=gestion_buckets.MARGEN_ELIMINACION_DIAS,
+                    vaciar=gestion_buckets.VACIAR_VENCIDOS, simular=gestion_buckets.SIMULAR_GESTION,
+                )
+                print(f"Gestión de buckets de {replica['remoto']}: {resumen_gestion}")
+
+    estado['terminado'] = True
+    completar_fase(estado, 'fin')
+    return True
+
+def main():
+    # Las métricas se exportan aunque la ejecución termine con una excepción
+    correcta = False
+    try:
+        correcta = ejecutar_respaldo()
+    finally:
+        if demonio_rclone:
+            rcd.detener_demonio(demonio_rclone)
+        metricas.exportar(correcta, instancia=INDICE_FRAGMENTO if TOTAL_FRAGMENTOS > 1 else None)
+    return correcta
+
+if __name__ == "__main__":
+    # Código de salida distinto de cero si quedaron objetos sin copiar o la verificación encontró diferencias
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,337 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from manifiesto import serie_de_bucket
+
+MB = 1024 * 1024
+MAXIMO_PARTES = 10000
+TAMANO_PARTE_MINIMO = 5 * MB
+
+
+def prefijos_replicas(secretos):
+    # Destinos adicionales en los secretos: DESTINATION_2_ENDPOINT, DESTINATION_3_ENDPOINT, ... con sus claves HMAC
+    prefijos = []
+    indice = 2
+    while f"DESTINATION_{indice}_ENDPOINT" in secretos:
+        prefijos.append(f"DESTINATION_{indice}")
+        indice += 1
+    return prefijos
+
+
+def remoto_replica(prefijo):
+    # Nombre del remoto en rclone.conf: COS_DESTINATION_2, COS_DESTINATION_3, ...
+    return f"COS_{prefijo}"
+
+
+def serie_replica(serie, indice):
+    return f"{serie}-r{indice}"
+
+
+def bucket_replica(bucket, indice):
+    # Los nombres de bucket son únicos en toda la cuenta: cada réplica usa la serie "{serie}-r{indice}"
+    # con la misma fecha y letra que el bucket principal, así sigue siendo un bucket diario de su propia serie
+    serie = serie_de_bucket(bucket)
+    return f"{serie_replica(serie, indice)}{bucket[len(serie):]}"
+
+
+def replicas(secretos, bucket):
+    # Una entrada por destino adicional con su remoto de rclone, su serie y su bucket diario
+    return [{'prefijo': prefijo, 'remoto': remoto_replica(prefijo),
+             'serie': serie_replica(serie_de_bucket(bucket), indice), 'bucket': bucket_replica(bucket, indice)}
+            for indice, prefijo in enumerate(prefijos_replicas(secretos), start=2)]
+
+
+def tamano_parte(tamano, minimo):
+    parte = max(minimo, TAMANO_PARTE_MINIMO)
+    while parte * MAXIMO_PARTES < tamano:
+        parte *= 2
+    return parte
+
+
+def con_reintentos(funcion, reintentos, espera=1.0):
+    intento = 0
+    while True:
+        try:
+            return funcion()
+        except Exception:
+            if intento >= reintentos:
+                raise
+            time.sleep(espera * 2 ** intento)
+            intento += 1
+
+
+def leer_exacto(cuerpo, cantidad):
+    datos = bytearray()
+    while len(datos) < cantidad:
+        bloque = cuerpo.read(cantidad - len(datos))
+        if not bloque:
+            break
+        datos.extend(bloque)
+    return bytes(datos)
+
+
+def nuevo_presupuesto(maximo):
+    # Bytes leídos del origen que todavía no se terminaron de subir, sumando todos los hilos
+    return {'maximo': maximo, 'en_uso': 0, 'condicion': threading.Condition()}
+
+
+def reservar(presupuesto, cantidad):
+    # Espera hasta que haya lugar; un bloque más grande que el máximo se admite solo cuando no hay otros en vuelo
+    cantidad = min(cantidad, presupuesto['maximo'])
+    with presupuesto['condicion']:
+        presupuesto['condicion'].wait_for(lambda: presupuesto['en_uso'] + cantidad <= presupuesto['maximo'])
+        presupuesto['en_uso'] += cantidad
+    return cantidad
+
+
+def liberar(presupuesto, cantidad):
+    with presupuesto['condicion']:
+        presupuesto['en_uso'] -= cantidad
+        presupuesto['condicion'].notify_all()
+
+
+def nuevo_limitador(tasa):
+    # Cubeta de fichas compartida por todos los hilos y destinos; tasa() devuelve los bytes por segundo
+    # permitidos en este momento, o None sin límite, así el horario puede cambiarla mientras se copia
+    return {'tasa': tasa, 'disponibles': 0.0, 'ultimo': time.monotonic(), 'bloqueo': threading.Lock()}
+
+
+def consumir(limitador, cantidad):
+    # Se acumula a lo sumo un segundo de tasa; un bloque más grande deja la cubeta en deuda
+    # y los siguientes esperan a que se pague, así el promedio respeta el límite
+    while True:
+        tasa = limitador['tasa']()
+        with limitador['bloqueo']:
+            ahora = time.monotonic()
+            if not tasa:
+                limitador['disponibles'] = 0.0
+                limitador['ultimo'] = ahora
+                return
+            limitador['disponibles'] = min(tasa, limitador['disponibles'] + (ahora - limitador['ultimo']) * tasa)
+            limitador['ultimo'] = ahora
+            if limitador['disponibles'] > 0:
+                limitador['disponibles'] -= cantidad
+                return
+            espera = -limitador['disponibles'] / tasa
+        # Se vuelve a mirar la tasa cada pocos segundos por si cambió el tramo del horario
+        time.sleep(min(espera, 5))
+
+
+def bloques_origen(cliente, bucket, objeto, cuerpo, tamano_bloque, reintentos, presupuesto):
+    # Lee el objeto una sola vez en bloques de tamano_bloque. Si la conexión se corta,
+    # se retoma con Range desde el último bloque entregado en lugar de empezar de nuevo.
+    # Cada bloque se entrega con su reserva en el presupuesto; quien lo recibe la libera al terminar de subirlo.
+    leido = 0
+    fallos = 0
+    while leido < objeto['size']:
+        reservado = reservar(presupuesto, min(tamano_bloque, objeto['size'] - leido))
+        try:
+            if cuerpo is None:
+                cuerpo = cliente.get_object(Bucket=bucket, Key=objeto['key'], IfMatch=objeto['etag'],
+                                            Range=f"bytes={leido}-")['Body']
+            bloque = leer_exacto(cuerpo, min(tamano_bloque, objeto['size'] - leido))
+            if not bloque:
+                raise IOError(f"el origen terminó en {leido} de {objeto['size']} bytes")
+        except Exception:
+            liberar(presupuesto, reservado)
+            cuerpo = None
+            fallos += 1
+            if fallos > reintentos:
+                raise
+            time.sleep(2 ** fallos)
+            continue
+        leido += len(bloque)
+        yield bloque, reservado
+
+
+def escribir_en_destinos(ejecutor, destinos, funcion):
+    # Ejecuta funcion(destino) en todos los destinos a la vez; devuelve los resultados y los errores por destino
+    futuros = {destino['nombre']: ejecutor.submit(funcion, destino) for destino in destinos}
+    resultados = {}
+    errores = {}
+    for nombre, futuro in futuros.items():
+        try:
+            resultados[nombre] = futuro.result()
+        except Exception as e:
+            errores[nombre] = e
+    return resultados, errores
+
+
+def copiar_a_destinos(cliente_origen, bucket_origen, objeto, destinos, ejecutor, corte, parte_minima, reintentos,
+                      presupuesto, limitador):
+    # Devuelve los errores por nombre de destino; un destino que falla no detiene a los demás
+    respuesta = cliente_origen.get_object(Bucket=bucket_origen, Key=objeto['key'], IfMatch=objeto['etag'])
+    argumentos = {'Metadata': respuesta.get('Metadata', {})}
+    if respuesta.get('ContentType'):
+        argumentos['ContentType'] = respuesta['ContentType']
+
+    if objeto['size'] <= corte:
+        # Solo los objetos de hasta un bloque se leen enteros
+        reservado = reservar(presupuesto, objeto['size'])
+        try:
+            cuerpo = leer_exacto(respuesta['Body'], objeto['size'])
+            if len(cuerpo) != objeto['size']:
+                raise IOError(f"se leyeron {len(cuerpo)} de {objeto['size']} bytes")
+
+            def subir_entero(destino):
+                # Cada escritura pasa por el enlace, también las de los reintentos
+                consumir(limitador, len(cuerpo))
+                return destino['cliente'].put_object(Bucket=destino['bucket'], Key=objeto['key'], Body=cuerpo,
+                                                     **argumentos)
+
+            _, errores = escribir_en_destinos(ejecutor, destinos, lambda destino: con_reintentos(
+                lambda: subir_entero(destino), reintentos))
+        finally:
+            liberar(presupuesto, reservado)
+        return errores
+
+    # Una carga multiparte por destino; cada bloque leído del origen se sube a todos antes de leer el siguiente,
+    # así en memoria hay un solo bloque por objeto en vuelo. Cada parte se reintenta con el mismo bloque.
+    cargas, errores = escribir_en_destinos(ejecutor, destinos, lambda destino: con_reintentos(
+        lambda: destino['cliente'].create_multipart_upload(Bucket=destino['bucket'], Key=objeto['key'],
+                                                           **argumentos)['UploadId'], reintentos))
+    vivos = [destino for destino in destinos if destino['nombre'] in cargas]
+    partes = {destino['nombre']: [] for destino in vivos}
+
+    def abortar(destino):
+        try:
+            destino['cliente'].abort_multipart_upload(Bucket=destino['bucket'], Key=objeto['key'],
+                                                      UploadId=cargas[destino['nombre']])
+        except Exception as e:
+            print(f"No se pudo cancelar la carga de {objeto['key']} en {destino['nombre']}: {e}")
+
+    try:
+        bloques = bloques_origen(cliente_origen, bucket_origen, objeto, respuesta['Body'],
+                                 tamano_parte(objeto['size'], parte_minima), reintentos, presupuesto)
+        for numero, (bloque, reservado) in enumerate(bloques, start=1):
+            def subir_parte(destino):
+                def subir():
+                    consumir(limitador, len(bloque))
+                    return destino['cliente'].upload_part(
+                        Bucket=destino['bucket'], Key=objeto['key'], UploadId=cargas[destino['nombre']],
+                        PartNumber=numero, Body=bloque)['ETag']
+
+                return con_reintentos(subir, reintentos)
+
+            try:
+                etags, fallidos = escribir_en_destinos(ejecutor, vivos, subir_parte)
+            finally:
+                liberar(presupuesto, reservado)
+            for destino in vivos:
+                if destino['nombre'] in fallidos:
+                    abortar(destino)
+                else:
+                    partes[destino['nombre']].append({'PartNumber': numero, 'ETag': etags[destino['nombre']]})
+            errores.update(fallidos)
+            vivos = [destino for destino in vivos if destino['nombre'] not in fallidos]
+            if not vivos:
+                return errores
+    except Exception:
+        # Falló la lectura del origen: ningún destino puede completar el objeto
+        for destino in vivos:
+            abortar(destino)
+        raise
+
+    _, fallidos = escribir_en_destinos(ejecutor, vivos, lambda destino: con_reintentos(
+        lambda: destino['cliente'].complete_multipart_upload(
+            Bucket=destino['bucket'], Key=objeto['key'], UploadId=cargas[destino['nombre']],
+            MultipartUpload={'Parts': partes[destino['nombre']]}), reintentos))
+    for destino in vivos:
+        if destino['nombre'] in fallidos:
+            abortar(destino)
+    errores.update(fallidos)
+    return errores
+
+
+def copiar_objetos(cliente_origen, bucket_origen, destinos, objetos, hilos=32, corte=16 * MB, parte_minima=16 * MB,
+                   reintentos=3, ruta_fallidos=None, intervalo_progreso=30, al_resultado=None,
+                   limite_concurrencia=None, completados=None, memoria_maxima=1024 * MB,
+                   limite_ancho_banda=None):
+    # Lee cada objeto del origen una sola vez y lo escribe en todos los destinos a la vez.
+    # destinos es una lista de {'nombre', 'cliente', 'bucket'}. Devuelve estadísticas con las claves de rclone
+    # (los bytes son los leídos del origen) más 'destinos' con bytes, transferencias y errores de cada uno.
+    # completados guarda, por clave, los destinos que ya tienen el objeto: en los reintentos de la cola
+    # solo se escribe en los que faltan. limite_concurrencia funciona como en copia_servidor.copiar_objetos.
+    # Los objetos de más de corte bytes se leen en partes; memoria_maxima acota los bytes en vuelo de todos los hilos.
+    # limite_ancho_banda() devuelve los bytes por segundo que se pueden escribir entre todos los destinos, o None.
+    completados = completados if completados is not None else {}
+    estadisticas = {'bytes': 0, 'transfers': 0, 'errors': 0, 'elapsedTime': 0,
+                    'destinos': {destino['nombre']: {'bytes': 0, 'transfers': 0, 'errors': 0} for destino in destinos}}
+    bloqueo = threading.Lock()
+    presupuesto = nuevo_presupuesto(memoria_maxima)
+    limitador = nuevo_limitador(limite_ancho_banda or (lambda: None))
+    cupos = threading.BoundedSemaphore(hilos * 4)
+    activos = {'total': 0}
+    condicion = threading.Condition()
+    fallidos = open(ruta_fallidos, "w", encoding="utf-8") if ruta_fallidos else None
+    inicio = time.monotonic()
+    ultimo_progreso = inicio
+
+    def copiar(objeto):
+        if limite_concurrencia:
+            with condicion:
+                while not condicion.wait_for(lambda: activos['total'] < limite_concurrencia(), timeout=5):
+                    pass
+                activos['total'] += 1
+        inicio_objeto = time.monotonic()
+        pendientes = [destino for destino in destinos
+                      if destino['nombre'] not in completados.get(objeto['key'], ())]
+        try:
+            errores = copiar_a_destinos(cliente_origen, bucket_origen, objeto, pendientes, ejecutor_destinos,
+                                        corte, parte_minima, reintentos, presupuesto,
+                                        limitador) if pendientes else {}
+        except Exception as e:
+            errores = {destino['nombre']: e for destino in pendientes}
+        try:
+            with bloqueo:
+                if pendientes:
+                    estadisticas['bytes'] += objeto['size']
+                for destino in pendientes:
+                    propias = estadisticas['destinos'][destino['nombre']]
+                    if destino['nombre'] in errores:
+                        propias['errors'] += 1
+                        continue
+                    propias['bytes'] += objeto['size']
+                    propias['transfers'] += 1
+                    completados.setdefault(objeto['key'], set()).add(destino['nombre'])
+                if errores:
+                    estadisticas['errors'] += 1
+                    if fallidos:
+                        fallidos.write(objeto['key'] + "\n")
+                else:
+                    estadisticas['transfers'] += 1
+            for nombre, error in errores.items():
+                print(f"ERROR : {objeto['key']}: réplica en {nombre} fallida: {error}")
+            if al_resultado:
+                al_resultado(objeto['key'], not errores, time.monotonic() - inicio_objeto)
+        finally:
+            if limite_concurrencia:
+                with condicion:
+                    activos['total'] -= 1
+                    condicion.notify_all()
+            cupos.release()
+
+    try:
+        # Los hilos de objetos leen del origen; los de destinos suben, uno por objeto en vuelo y destino
+        with ThreadPoolExecutor(max_workers=hilos * len(destinos)) as ejecutor_destinos, \
+                ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            for objeto in objetos:
+                cupos.acquire()
+                ejecutor.submit(copiar, objeto)
+                if time.monotonic() - ultimo_progreso >= intervalo_progreso:
+                    ultimo_progreso = time.monotonic()
+                    with bloqueo:
+                        print(f"Progreso: {estadisticas['bytes']} bytes leídos del origen, "
+                              f"{estadisticas['transfers']} objetos en todos los destinos, "
+                              f"{estadisticas['errors']} con errores")
+                        for nombre, propias in estadisticas['destinos'].items():
+                            print(f"  {nombre}: {propias['bytes']} bytes, {propias['transfers']} transferencias, "
+                                  f"{propias['errors']} errores")
+    finally:
+        if fallidos:
+            fallidos.close()
+    estadisticas['elapsedTime'] = time.monotonic() - inicio
+    if estadisticas['elapsedTime']:
+        estadisticas['speed'] = estadisticas['bytes'] / estadisticas['elapsedTime']
+    return estadisticas
@@ -0,0 +1,411 @@
+import json
+import os
+import queue
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cliente_cos import crear_cliente_iam
+from copia_servidor import UMBRAL_MULTIPARTE, copiar_multiparte, copiar_simple
+from empaquetado import PREFIJO_PAQUETES, leer_objeto
+from gestor_secretos import cargar_secretos
+from manifiesto import RUTA_MANIFIESTO_REMOTO, leer_manifiesto, ruta_manifiesto
+
+# Bucket diario archivado que se restaura y bucket (con prefijo opcional) donde quedan los objetos
+BUCKET_RESPALDO = os.environ.get("BUCKET_RESPALDO", "")
+BUCKET_RESTAURACION = os.environ.get("BUCKET_RESTAURACION", "")
+PREFIJO_RESTAURACION = os.environ.get("PREFIJO_RESTAURACION", "")
+# Prefijos separados por comas en orden de urgencia; "*" al final agrega el resto del bucket. Vacío: todo el bucket
+PREFIJOS_RESTAURACION = os.environ.get("PREFIJOS_RESTAURACION", "")
+DIAS_RESTAURACION = int(os.environ.get("DIAS_RESTAURACION", "2"))
+NIVEL_RESTAURACION = os.environ.get("NIVEL_RESTAURACION", "Bulk")  # Bulk, Standard o Accelerated
+HILOS_RESTAURACION = int(os.environ.get("HILOS_RESTAURACION", "64"))
+LOTE_RESTAURACION = int(os.environ.get("LOTE_RESTAURACION", "1000"))
+INTERVALO_SONDEO_SEGUNDOS = int(os.environ.get("INTERVALO_SONDEO_SEGUNDOS", "600"))
+ESPERA_MAXIMA_HORAS = float(os.environ.get("ESPERA_MAXIMA_HORAS", "48"))
+DIRECTORIO_RESTAURACION = os.environ.get("DIRECTORIO_RESTAURACION", "restauracion")
+# Manifiestos que dejó el backup en este equipo; si el del bucket está aquí no hace falta descongelarlo
+DIRECTORIO_MANIFIESTOS = os.environ.get("DIRECTORIO_MANIFIESTOS", "manifiestos")
+
+# Archivos de control del backup que no forman parte de los datos respaldados
+PREFIJOS_INTERNOS = ("_manifiesto/", "_diario/", "_reportes/", "_verificacion/", "_catalogo/")
+CLASES_ARCHIVADAS = ("GLACIER", "DEEP_ARCHIVE", "ACCELERATED")
+ERRORES_YA_SOLICITADO = ("RestoreAlreadyInProgress",)
+# El objeto no está archivado: se puede copiar sin solicitar la restauración
+ERRORES_NO_ARCHIVADO = ("InvalidObjectState",)
+ERRORES_NO_EXISTE = ("404", "NoSuchKey", "NotFound")
+
+
+def interpretar_prefijos(texto):
+    prefijos = [prefijo.strip() for prefijo in texto.split(",") if prefijo.strip()]
+    return prefijos or ["*"]
+
+
+def es_paquete(clave):
+    return clave.startswith(PREFIJO_PAQUETES + "/") and clave.endswith(".tar")
+
+
+def coincide(clave, prefijos):
+    return "*" in prefijos or any(clave.startswith(prefijo) for prefijo in prefijos)
+
+
+def listar_en_orden(cliente, bucket, prefijos):
+    # Primero los paquetes de objetos pequeños: pocas solicitudes descongelan muchos objetos.
+    # Después cada prefijo en su orden de urgencia; "*" recorre el resto del bucket sin repetir claves.
+    paginador = cliente.get_paginator('list_objects_v2')
+
+    def listar(prefijo):
+        for pagina in paginador.paginate(Bucket=bucket, Prefix=prefijo):
+            for objeto in pagina.get('Contents', []):
+                yield {
+                    'id': objeto['Key'],
+                    'bucket': bucket,
+                    'key': objeto['Key'],
+                    'size': objeto['Size'],
+                    'etag': objeto['ETag'].strip('"'),
+                    'clase': objeto.get('StorageClass', "STANDARD"),
+                }
+
+    for objeto in listar(PREFIJO_PAQUETES + "/"):
+        if es_paquete(objeto['key']):
+            yield objeto
+    anteriores = []
+    for prefijo in prefijos:
+        for objeto in listar("" if prefijo == "*" else prefijo):
+            clave = objeto['key']
+            if clave.startswith(PREFIJOS_INTERNOS) or clave.startswith(PREFIJO_PAQUETES + "/"):
+                continue
+            if prefijo == "*" and any(clave.startswith(anterior) for anterior in anteriores):
+                continue
+            yield objeto
+        anteriores.append(prefijo)
+
+
+def unidades_del_manifiesto(ruta, bucket_respaldo, prefijos):
+    # En un backup incremental cada entrada dice en qué bucket diario vive el objeto y, si se empaquetó,
+    # en qué paquete y en qué rango de bytes. Se restaura lo que dice el manifiesto del día y no lo que
+    # hay en el bucket: los objetos referenciados viven en buckets anteriores.
+    # El ETag y la clase de almacenamiento de la copia se conocen recién con el HEAD del sondeo.
+    def identificador(bucket, clave):
+        return clave if bucket == bucket_respaldo else f"{bucket}/{clave}"
+
+    # Primero los paquetes, cada uno con solo los miembros que el manifiesto todavía ubica en él
+    paquetes = {}
+    for entrada in leer_manifiesto(ruta):
+        if entrada.get('paquete') and coincide(entrada['key'], prefijos):
+            paquetes.setdefault((entrada['bucket'], entrada['paquete']), []).append(
+                {'key': entrada['key'], 'paquete': entrada['paquete'],
+                 'desplazamiento': entrada['desplazamiento'], 'longitud': entrada['longitud']})
+    for (bucket, paquete), miembros in sorted(paquetes.items()):
+        yield {'id': identificador(bucket, paquete), 'bucket': bucket, 'key': paquete,
+               'size': sum(miembro['longitud'] for miembro in miembros), 'etag': None, 'clase': None,
+               'miembros': miembros}
+    paquetes.clear()
+
+    anteriores = []
+    for prefijo in prefijos:
+        for entrada in leer_manifiesto(ruta):
+            clave = entrada['key']
+            if entrada.get('paquete') or not coincide(clave, [prefijo]):
+                continue
+            if prefijo == "*" and any(clave.startswith(anterior) for anterior in anteriores):
+                continue
+            yield {'id': identificador(entrada['bucket'], clave), 'bucket': entrada['bucket'], 'key': clave,
+                   'size': entrada['size'], 'etag': None, 'clase': None}
+        anteriores.append(prefijo)
+
+
+def obtener_manifiesto(cliente, bucket, directorio, dias=2, nivel="Bulk", intervalo=600, espera_maxima=48 * 3600):
+    # Devuelve la ruta local del manifiesto del bucket diario, o None si el backup fue completo y no tiene.
+    # El manifiesto también se archiva: si no hay copia local, se descongela antes de empezar.
+    ruta_local = ruta_manifiesto(DIRECTORIO_MANIFIESTOS, bucket)
+    if os.path.exists(ruta_local):
+        return ruta_local
+    ruta = os.path.join(directorio, f"{bucket}.manifiesto.jsonl.gz")
+    if os.path.exists(ruta):
+        return ruta
+    limite = time.monotonic() + espera_maxima
+    while True:
+        try:
+            cabecera = cliente.head_object(Bucket=bucket, Key=RUTA_MANIFIESTO_REMOTO)
+        except cliente.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ERRORES_NO_EXISTE:
+                return None
+            raise
+        if descongelado(cabecera):
+            break
+        if not cabecera.get('Restore'):
+            cliente.restore_object(Bucket=bucket, Key=RUTA_MANIFIESTO_REMOTO, RestoreRequest={
+                'Days': dias, 'GlacierJobParameters': {'Tier': nivel},
+            })
+            print("El manifiesto del bucket está archivado; se solicitó su restauración.")
+        if time.monotonic() > limite:
+            raise TimeoutError(f"el manifiesto de {bucket} no se descongeló en {espera_maxima / 3600:.0f} h")
+        time.sleep(intervalo)
+    os.makedirs(directorio, exist_ok=True)
+    cliente.download_file(bucket, RUTA_MANIFIESTO_REMOTO, ruta + ".tmp")
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def ruta_registro(directorio, bucket):
+    return os.path.join(directorio, f"{bucket}.jsonl")
+
+
+def leer_registro(ruta):
+    # Último estado de cada clave: "solicitado", "copiado" o "error"
+    estados = {}
+    if not os.path.exists(ruta):
+        return estados
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue
+            estados[evento['k']] = evento['e']
+    return estados
+
+
+def descongelado(cabecera):
+    # x-amz-restore: ongoing-request="false" indica que la copia temporal ya se puede leer
+    if cabecera.get('StorageClass', "STANDARD") not in CLASES_ARCHIVADAS:
+        return True
+    return 'ongoing-request="false"' in (cabecera.get('Restore') or "")
+
+
+def restaurar(cliente, bucket_respaldo, bucket_destino, prefijo_destino, prefijos, directorio, hilos=64,
+              lote=1000, dias=2, nivel="Bulk", intervalo=600, espera_maxima=48 * 3600, ruta_manifiesto=None):
+    # Con ruta_manifiesto, los objetos se toman del manifiesto del día (ver unidades_del_manifiesto);
+    # sin él, del listado del bucket de respaldo.
+    # Tres etapas en paralelo: las solicitudes de restauración se envían por lotes mientras se lista el bucket,
+    # un hilo revisa qué lotes ya se descongelaron y los objetos listos se copian al destino apenas aparecen.
+    # Cada lote se revisa primero con su objeto más antiguo; solo cuando ese está listo se consulta el resto,
+    # así no hace falta un HEAD por objeto en cada vuelta.
+    os.makedirs(directorio, exist_ok=True)
+    ruta = ruta_registro(directorio, bucket_respaldo)
+    estados = leer_registro(ruta)
+    registro = open(ruta, "a", encoding="utf-8")
+    bloqueo = threading.Lock()
+    resumen = {'solicitados': 0, 'solicitudes_fallidas': 0, 'copiados': 0, 'extraidos': 0, 'bytes': 0,
+               'errores': 0, 'ya_copiados': 0, 'pendientes': 0}
+    lotes = []
+    fin_listado = threading.Event()
+    # Limitan las solicitudes y copias en vuelo para no cargar millones de tareas en los ejecutores
+    cupos_solicitudes = threading.BoundedSemaphore(hilos * 4)
+    cupos_copias = threading.BoundedSemaphore(hilos * 4)
+
+    def anotar(clave, estado):
+        with bloqueo:
+            estados[clave] = estado
+            registro.write(json.dumps({'k': clave, 'e': estado}, separators=(",", ":")) + "\n")
+            registro.flush()
+
+    def solicitar(objeto, cupo=None):
+        try:
+            cliente.restore_object(Bucket=objeto['bucket'], Key=objeto['key'], RestoreRequest={
+                'Days': dias, 'GlacierJobParameters': {'Tier': nivel},
+            })
+        except cliente.exceptions.ClientError as e:
+            codigo = e.response.get('Error', {}).get('Code')
+            if codigo in ERRORES_NO_ARCHIVADO:
+                # El sondeo lo encuentra listo y lo copia
+                return
+            if codigo not in ERRORES_YA_SOLICITADO:
+                # El sondeo vuelve a solicitarla mientras el objeto siga archivado sin restauración en curso
+                print(f"ERROR : {objeto['id']}: no se pudo solicitar la restauración: {e}")
+                with bloqueo:
+                    resumen['solicitudes_fallidas'] += 1
+                return
+        finally:
+            if cupo:
+                cupo.release()
+        anotar(objeto['id'], "solicitado")
+        with bloqueo:
+            resumen['solicitados'] += 1
+
+    def extraer_paquete(objeto):
+        # El tar se lee como flujo: cada objeto empaquetado que pasa el filtro se sube al destino
+        cuerpo = cliente.get_object(Bucket=objeto['bucket'], Key=objeto['key'], IfMatch=objeto['etag'])['Body']
+        with tarfile.open(fileobj=cuerpo, mode="r|") as paquete:
+            for miembro in paquete:
+                if not miembro.isfile() or not coincide(miembro.name, prefijos):
+                    continue
+                contenido = paquete.extractfile(miembro).read()
+                cliente.put_object(Bucket=bucket_destino, Key=prefijo_destino + miembro.name, Body=contenido)
+                with bloqueo:
+                    resumen['extraidos'] += 1
+                    resumen['bytes'] += len(contenido)
+
+    def extraer_miembros(objeto):
+        # Cada miembro que el manifiesto ubica en el paquete se lee con un GET con Range
+        for miembro in objeto['miembros']:
+            contenido = leer_objeto(cliente, objeto['bucket'], miembro)
+            cliente.put_object(Bucket=bucket_destino, Key=prefijo_destino + miembro['key'], Body=contenido)
+            with bloqueo:
+                resumen['extraidos'] += 1
+                resumen['bytes'] += len(contenido)
+
+    def copiar(objeto):
+        try:
+            if 'miembros' in objeto:
+                extraer_miembros(objeto)
+            elif es_paquete(objeto['key']):
+                extraer_paquete(objeto)
+            elif objeto['size'] > UMBRAL_MULTIPARTE:
+                copiar_multiparte(cliente, ejecutor_partes, objeto['bucket'], bucket_destino, objeto,
+                                  prefijo_destino + objeto['key'])
+            else:
+                copiar_simple(cliente, objeto['bucket'], bucket_destino, objeto, prefijo_destino + objeto['key'])
+            anotar(objeto['id'], "copiado")
+            with bloqueo:
+                resumen['copiados'] += 1
+                resumen['bytes'] += 0 if es_paquete(objeto['key']) else objeto['size']
+        except Exception as e:
+            print(f"ERROR : {objeto['id']}: no se pudo copiar al destino: {e}")
+            anotar(objeto['id'], "error")
+            with bloqueo:
+                resumen['errores'] += 1
+        finally:
+            cupos_copias.release()
+
+    def revisar(objeto):
+        # Devuelve True si el objeto ya se puede copiar; una restauración vencida se vuelve a solicitar
+        cabecera = cliente.head_object(Bucket=objeto['bucket'], Key=objeto['key'])
+        if descongelado(cabecera):
+            # Las entradas del manifiesto traen el ETag del origen; la copia se condiciona al de la copia
+            objeto['etag'] = objeto['etag'] or cabecera['ETag'].strip('"')
+            return True
+        if not cabecera.get('Restore'):
+            solicitar(objeto)
+        return False
+
+    def sondear():
+        limite = time.monotonic() + espera_maxima
+        while True:
+            with bloqueo:
+                pendientes = [pendiente for pendiente in lotes if pendiente]
+            if not pendientes and fin_listado.is_set():
+                return
+            for pendiente in pendientes:
+                try:
+                    if not revisar(pendiente[0]):
+                        continue
+                    listos = [objeto for objeto, listo in zip(pendiente, ejecutor_sondeo.map(revisar, pendiente))
+                              if listo]
+                except Exception as e:
+                    print(f"ERROR : no se pudo revisar el estado de la restauración: {e}")
+                    continue
+                with bloqueo:
+                    for objeto in listos:
+                        pendiente.remove(objeto)
+                for objeto in listos:
+                    copias.put(objeto)
+            if time.monotonic() > limite:
+                print(f"Se alcanzó la espera máxima de {espera_maxima / 3600:.0f} h; "
+                      f"la próxima ejecución retomará los objetos pendientes.")
+                with bloqueo:
+                    resumen['pendientes'] = sum(len(pendiente) for pendiente in lotes)
+                return
+            with bloqueo:
+                print(f"Restauración: {resumen['solicitados']} solicitados, {resumen['copiados']} copiados, "
+                      f"{resumen['extraidos']} extraídos de paquetes, "
+                      f"{sum(len(pendiente) for pendiente in lotes)} esperando, {resumen['errores']} errores")
+            if not fin_listado.is_set():
+                # Al terminar el listado se revisa de inmediato el último lote
+                fin_listado.wait(intervalo)
+            else:
+                time.sleep(intervalo)
+
+    def copiar_cola():
+        while True:
+            objeto = copias.get()
+            if objeto is None:
+                return
+            cupos_copias.acquire()
+            ejecutor_copias.submit(copiar, objeto)
+
+    copias = queue.Queue()
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor_solicitudes, \
+                ThreadPoolExecutor(max_workers=hilos) as ejecutor_sondeo, \
+                ThreadPoolExecutor(max_workers=hilos) as ejecutor_copias, \
+                ThreadPoolExecutor(max_workers=16) as ejecutor_partes:
+            hilo_sondeo = threading.Thread(target=sondear, daemon=True)
+            hilo_copias = threading.Thread(target=copiar_cola, daemon=True)
+            hilo_sondeo.start()
+            hilo_copias.start()
+
+            actual = []
+            if ruta_manifiesto:
+                fuente = unidades_del_manifiesto(ruta_manifiesto, bucket_respaldo, prefijos)
+            else:
+                fuente = listar_en_orden(cliente, bucket_respaldo, prefijos)
+            for objeto in fuente:
+                if estados.get(objeto['id']) == "copiado":
+                    resumen['ya_copiados'] += 1
+                    continue
+                if objeto['clase'] is not None and objeto['clase'] not in CLASES_ARCHIVADAS:
+                    # Todavía no pasó a archivo: se copia sin esperar
+                    copias.put(objeto)
+                    continue
+                # Sin clase conocida (manifiesto) también se solicita: si no está archivado, la solicitud se ignora
+                if estados.get(objeto['id']) != "solicitado":
+                    cupos_solicitudes.acquire()
+                    ejecutor_solicitudes.submit(solicitar, objeto, cupos_solicitudes)
+                actual.append(objeto)
+                if len(actual) >= lote:
+                    with bloqueo:
+                        lotes.append(actual)
+                    actual = []
+            with bloqueo:
+                lotes.append(actual)
+            fin_listado.set()
+
+            hilo_sondeo.join()
+            copias.put(None)
+            hilo_copias.join()
+    finally:
+        registro.close()
+    return resumen
+
+
+def main():
+    if not BUCKET_RESPALDO or not BUCKET_RESTAURACION:
+        print("Error: BUCKET_RESPALDO y BUCKET_RESTAURACION son obligatorios.")
+        return 1
+    secretos = cargar_secretos()
+
+    prefijos = interpretar_prefijos(PREFIJOS_RESTAURACION)
+    cliente = crear_cliente_iam(secretos)
+    try:
+        ruta_manifiesto_dia = obtener_manifiesto(cliente, BUCKET_RESPALDO, DIRECTORIO_RESTAURACION,
+                                                 dias=DIAS_RESTAURACION, nivel=NIVEL_RESTAURACION,
+                                                 intervalo=INTERVALO_SONDEO_SEGUNDOS,
+                                                 espera_maxima=ESPERA_MAXIMA_HORAS * 3600)
+    except TimeoutError as e:
+        print(f"Error: {e}; la próxima ejecución retomará la espera.")
+        return 1
+    if ruta_manifiesto_dia:
+        print(f"Restaurando desde el manifiesto {ruta_manifiesto_dia}.")
+    else:
+        print("El bucket no tiene manifiesto (backup completo); se restaura su contenido.")
+    print(f"Restaurando {BUCKET_RESPALDO} en {BUCKET_RESTAURACION}/{PREFIJO_RESTAURACION} "
+          f"(prefijos: {', '.join(prefijos)}; nivel {NIVEL_RESTAURACION})...")
+    resumen = restaurar(
+        cliente, BUCKET_RESPALDO, BUCKET_RESTAURACION, PREFIJO_RESTAURACION, prefijos,
+        DIRECTORIO_RESTAURACION, hilos=HILOS_RESTAURACION, lote=LOTE_RESTAURACION, dias=DIAS_RESTAURACION,
+        nivel=NIVEL_RESTAURACION, intervalo=INTERVALO_SONDEO_SEGUNDOS, espera_maxima=ESPERA_MAXIMA_HORAS * 3600,
+        ruta_manifiesto=ruta_manifiesto_dia,
+    )
+    print(f"Restauración terminada: {resumen}")
+    with open(os.path.join(DIRECTORIO_RESTAURACION, f"{BUCKET_RESPALDO}.resumen.json"), "w",
+              encoding="utf-8") as archivo:
+        json.dump(resumen, archivo, indent=2)
+    return 1 if resumen['errores'] or resumen['pendientes'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diario  # noqa: E402
+
+
+class CopiarConReintentosTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporal = tempfile.TemporaryDirectory()
+        self.directorio = self.temporal.name
+        self.ruta_lista = os.path.join(self.directorio, "lista.txt")
+        with open(self.ruta_lista, "w", encoding="utf-8") as lista:
+            lista.write("a\nb\nc\n")
+
+    def tearDown(self):
+        self.temporal.cleanup()
+
+    def copiar(self, motor, **argumentos):
+        return diario.copiar_con_reintentos(motor, self.directorio, "diario", self.ruta_lista,
+                                            espera_inicial=0, **argumentos)
+
+    def test_codigo_de_error_sin_eventos_deja_las_claves_pendientes(self):
+        # Un error de credenciales o un 403 en el destino: rclone sale con código 1 sin líneas por objeto
+        llamadas = []
+
+        def motor(ruta_pendientes):
+            with open(ruta_pendientes, encoding="utf-8") as pendientes:
+                llamadas.append(pendientes.read().split())
+            return {'codigo': 1}
+
+        resultado, fallidos = self.copiar(motor, reintentos=2)
+        self.assertEqual(fallidos, 3)
+        self.assertEqual(resultado['codigo'], 1)
+        self.assertEqual(llamadas, [["a", "b", "c"]] * 3)
+
+    def test_reintento_que_copia_las_claves_sin_registrar(self):
+        registro = diario.abrir_registro(self.directorio, "diario")
+        llamadas = []
+
+        def motor(ruta_pendientes):
+            llamadas.append(ruta_pendientes)
+            if len(llamadas) == 1:
+                return {'codigo': 1}
+            with open(ruta_pendientes, encoding="utf-8") as pendientes:
+                for clave in pendientes.read().split():
+                    diario.registrar_objeto(registro, clave, True)
+            return {'codigo': 0}
+
+        try:
+            _, fallidos = self.copiar(motor)
+        finally:
+            diario.cerrar_registro(registro)
+        self.assertEqual(fallidos, 0)
+        self.assertEqual(len(llamadas), 2)
+
+    def test_codigo_cero_solo_reintenta_fallidos(self):
+        registro = diario.abrir_registro(self.directorio, "diario")
+        llamadas = []
+
+        def motor(ruta_pendientes):
+            llamadas.append(ruta_pendientes)
+            diario.registrar_objeto(registro, "a", True)
+            diario.registrar_objeto(registro, "b", len(llamadas) > 1)
+            return {'codigo': 0}
+
+        try:
+            _, fallidos = self.copiar(motor)
+        finally:
+            diario.cerrar_registro(registro)
+        self.assertEqual(fallidos, 0)
+        self.assertEqual(len(llamadas), 2)
+
+    def test_estadisticas_sumadas_de_todos_los_intentos(self):
+        registro = diario.abrir_registro(self.directorio, "diario")
+        llamadas = []
+
+        def motor(ruta_pendientes):
+            llamadas.append(ruta_pendientes)
+            with open(ruta_pendientes, encoding="utf-8") as pendientes:
+                claves = pendientes.read().split()
+            for clave in claves:
+                diario.registrar_objeto(registro, clave, clave != "c" or len(llamadas) > 1)
+            return {'codigo': 0, 'estadisticas': {
+                'bytes': 100 * len(claves), 'transfers': len(claves), 'elapsedTime': 2, 'speed': 50,
+                'transferring': [], 'destinos': {'COS_DESTINATION': {'bytes': 100 * len(claves)}}}}
+
+        try:
+            resultado, fallidos = self.copiar(motor)
+        finally:
+            diario.cerrar_registro(registro)
+        self.assertEqual(fallidos, 0)
+        estadisticas = resultado['estadisticas']
+        self.assertEqual(estadisticas['bytes'], 400)
+        self.assertEqual(estadisticas['transfers'], 4)
+        self.assertEqual(estadisticas['elapsedTime'], 4)
+        self.assertEqual(estadisticas['speed'], 100)
+        self.assertEqual(estadisticas['destinos'], {'COS_DESTINATION': {'bytes': 400}})
+        self.assertNotIn('transferring', estadisticas)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import empaquetado  # noqa: E402
+
+
+class ClienteFalso:
+    # Lo mínimo de un cliente S3 para empaquetar y leer: objetos en memoria y GET con Range
+
+    def __init__(self, objetos=None):
+        self.objetos = dict(objetos or {})
+
+    def get_object(self, Bucket, Key, IfMatch=None, Range=None):
+        contenido = self.objetos[Key]
+        if Range:
+            inicio, fin = (int(valor) for valor in Range[len("bytes="):].split("-"))
+            contenido = contenido[inicio:fin + 1]
+        return {'Body': io.BytesIO(contenido)}
+
+    def upload_file(self, ruta, bucket, clave):
+        with open(ruta, "rb") as archivo:
+            self.objetos[clave] = archivo.read()
+
+
+def objeto(clave, contenido):
+    return {'key': clave, 'size': len(contenido), 'etag': hashlib.md5(contenido).hexdigest(),
+            'mtime': "2024-01-01T00:00:00+00:00"}
+
+
+class IndiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporal = tempfile.TemporaryDirectory()
+        self.directorio = self.temporal.name
+
+    def tearDown(self):
+        self.temporal.cleanup()
+
+    def test_leer_indice_inexistente(self):
+        self.assertEqual(empaquetado.leer_indice(os.path.join(self.directorio, "no.jsonl")), {})
+
+    def test_leer_indice_ultima_entrada_y_linea_cortada(self):
+        ruta = os.path.join(self.directorio, "indice.jsonl")
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            archivo.write(json.dumps({'key': "a", 'numero': 1}) + "\n")
+            archivo.write(json.dumps({'key': "a", 'numero': 2}) + "\n")
+            archivo.write('{"key": "b", "num')
+        self.assertEqual(empaquetado.leer_indice(ruta), {'a': {'key': "a", 'numero': 2}})
+
+    def test_leer_objeto_de_cada_paquete(self):
+        contenidos = {f"dir/{indice:03d}": bytes([indice]) * (indice * 97 % 1500 + 1) for indice in range(40)}
+        contenidos["vacio"] = b""
+        contenidos["grande"] = b"x" * 5000
+        origen = ClienteFalso(contenidos)
+        destino = ClienteFalso()
+        objetos = [objeto(clave, contenido) for clave, contenido in sorted(contenidos.items())]
+        ruta_sueltos = os.path.join(self.directorio, "sueltos.txt")
+
+        resumen = empaquetado.empaquetar(origen, destino, "origen", "destino", lambda: iter(objetos), "diario",
+                                         self.directorio, ruta_sueltos, umbral=4096, tamano_paquete=8192, hilos=4)
+
+        indice = empaquetado.leer_indice(empaquetado.ruta_indice_local(self.directorio, "diario"))
+        self.assertEqual(resumen['errores'], 0)
+        self.assertGreater(resumen['paquetes'], 1)
+        self.assertEqual(set(indice), set(contenidos) - {"grande"})
+        for clave, entrada in indice.items():
+            if entrada['longitud']:
+                self.assertEqual(empaquetado.leer_objeto(destino, "destino", entrada), contenidos[clave], clave)
+        with open(ruta_sueltos, encoding="utf-8") as sueltos:
+            self.assertEqual(sueltos.read().split(), ["grande"])
+        self.assertIn(empaquetado.clave_indice("diario"), destino.objetos)
+
+    def test_descartar_quita_del_indice(self):
+        ruta = os.path.join(self.directorio, "indice.jsonl")
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            for clave in ("a", "b", "c"):
+                archivo.write(json.dumps({'key': clave}) + "\n")
+        self.assertEqual(empaquetado.descartar(ruta, ["b", "z"]), 1)
+        self.assertEqual(sorted(empaquetado.leer_indice(ruta)), ["a", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import horario  # noqa: E402
+
+# 2024-01-01 fue lunes
+LUNES = 1
+SABADO = 6
+
+
+def momento(dia, hora, minuto=0):
+    return datetime(2024, 1, dia, hora, minuto)
+
+
+class TramoActualTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tramos = horario.interpretar_horario("lun-vie 19:00-08:00 10M 4; sab,dom 10:00-12:00 50M")
+        self.noche = self.tramos[0]
+
+    def test_tramo_que_cruza_la_medianoche(self):
+        self.assertIs(horario.tramo_actual(self.tramos, momento(LUNES, 20)), self.noche)
+        # Martes de madrugada: el tramo empezó el lunes
+        self.assertIs(horario.tramo_actual(self.tramos, momento(LUNES + 1, 3)), self.noche)
+        # Sábado de madrugada: el tramo empezó el viernes aunque el sábado no esté en sus días
+        self.assertIs(horario.tramo_actual(self.tramos, momento(SABADO, 7, 59)), self.noche)
+
+    def test_madrugada_despues_de_un_dia_sin_tramo(self):
+        # Lunes de madrugada: el domingo no está en los días del tramo nocturno
+        self.assertIs(horario.tramo_actual(self.tramos, momento(LUNES, 3)), horario.SIN_LIMITE)
+        self.assertIs(horario.tramo_actual(self.tramos, momento(SABADO, 20)), horario.SIN_LIMITE)
+
+    def test_fin_del_tramo_es_exclusivo(self):
+        self.assertIs(horario.tramo_actual(self.tramos, momento(LUNES + 1, 8)), horario.SIN_LIMITE)
+        self.assertIs(horario.tramo_actual(self.tramos, momento(LUNES, 19)), self.noche)
+
+    def test_tramo_dentro_del_dia(self):
+        self.assertIs(horario.tramo_actual(self.tramos, momento(SABADO, 11)), self.tramos[1])
+        self.assertIs(horario.tramo_actual(self.tramos, momento(SABADO, 12)), horario.SIN_LIMITE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import listado_paralelo  # noqa: E402
+
+
+def rangos_de(clave, rangos):
+    # Rangos (desde, hasta] que contienen la clave; None es abierto
+    return [(desde, hasta) for desde, hasta in rangos
+            if (desde is None or clave > desde) and (hasta is None or clave <= hasta)]
+
+
+class DividirRangoTest(unittest.TestCase):
+
+    def test_rangos_contiguos_sin_limites(self):
+        rangos = listado_paralelo.dividir_rango("p/")
+        self.assertIsNone(rangos[0][0])
+        self.assertIsNone(rangos[-1][1])
+        for (_, fin), (inicio, _) in zip(rangos, rangos[1:]):
+            self.assertEqual(fin, inicio)
+
+    def test_cada_clave_cae_en_un_solo_rango(self):
+        rangos = listado_paralelo.dividir_rango("p/")
+        for clave in ("p/", "p/-x", "p/0", "p/0a", "p/A", "p/Zz", "p/a", "p/m/n", "p/z", "p/zz", "p/~"):
+            self.assertEqual(len(rangos_de(clave, rangos)), 1, clave)
+
+    def test_respeta_los_limites(self):
+        rangos = listado_paralelo.dividir_rango("p/", "p/B7", "p/x")
+        self.assertEqual(rangos[0][0], "p/B7")
+        self.assertEqual(rangos[-1][1], "p/x")
+        limites = [fin for _, fin in rangos[:-1]]
+        self.assertTrue(all("p/B7" < limite < "p/x" for limite in limites))
+        self.assertEqual(limites, sorted(limites))
+        for clave in ("p/B70", "p/C", "p/a", "p/x"):
+            self.assertEqual(len(rangos_de(clave, rangos)), 1, clave)
+        self.assertEqual(rangos_de("p/B7", rangos), [])
+        self.assertEqual(rangos_de("p/x0", rangos), [])
+
+    def test_limites_sin_caracteres_entre_ellos(self):
+        self.assertEqual(listado_paralelo.dividir_rango("p/", "p/a1", "p/a2"), [("p/a1", "p/a2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import origen_local  # noqa: E402
+
+
+class ActualizarIndiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporal = tempfile.TemporaryDirectory()
+        self.raiz = os.path.join(self.temporal.name, "origen")
+        os.makedirs(self.raiz)
+        for nombre in ("a.txt", "b.txt", "c.txt"):
+            self.escribir(nombre, "1")
+        parches = [
+            mock.patch.object(origen_local, "DIRECTORIO_INDICE_LOCAL", os.path.join(self.temporal.name, "indice")),
+            mock.patch.object(origen_local, "DIRECTORIO_ORIGEN", self.raiz),
+            mock.patch.object(origen_local, "ESCANEO_COMPLETO", False),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+        # Primer respaldo: recorrido completo, como lo deja respaldar al terminar
+        conexion, inicio, _ = origen_local.actualizar_indice(self.raiz, 2)
+        with conexion:
+            origen_local.fijar_estado(conexion, 'inicio_actualizacion', inicio)
+        conexion.close()
+        with open(origen_local.ruta_vigilancia(), "w", encoding="utf-8") as archivo:
+            json.dump({'raiz': self.raiz, 'inicio': inicio - 60, 'latido': time.time()}, archivo)
+
+    def tearDown(self):
+        self.temporal.cleanup()
+
+    def escribir(self, nombre, contenido):
+        with open(os.path.join(self.raiz, nombre), "w", encoding="utf-8") as archivo:
+            archivo.write(contenido)
+
+    def escribir_diario(self, ruta, rutas):
+        with open(ruta, "a", encoding="utf-8") as diario:
+            for relativa in rutas:
+                diario.write(json.dumps({'ruta': relativa}) + "\n")
+
+    def tamanos(self, conexion):
+        return dict(conexion.execute("SELECT ruta, tamano FROM archivos"))
+
+    def test_diario_apartado_de_una_ejecucion_fallida_se_combina(self):
+        apartado = origen_local.ruta_diario_cambios() + ".procesando"
+        self.escribir("a.txt", "22")
+        self.escribir_diario(apartado, ["a.txt"])
+        self.escribir("b.txt", "333")
+        self.escribir_diario(origen_local.ruta_diario_cambios(), ["b.txt"])
+        # Un cambio que no está en ningún diario no se ve: el índice se actualizó sin recorrer el árbol
+        self.escribir("c.txt", "55555")
+
+        conexion, _, ruta_apartado = origen_local.actualizar_indice(self.raiz, 2)
+        try:
+            self.assertEqual(self.tamanos(conexion), {'a.txt': 2, 'b.txt': 3, 'c.txt': 1})
+        finally:
+            conexion.close()
+        self.assertEqual(ruta_apartado, apartado)
+        self.assertFalse(os.path.exists(origen_local.ruta_diario_cambios()))
+        self.assertEqual(origen_local.leer_diario_cambios([apartado]), {"a.txt", "b.txt"})
+
+    def test_agregado_interrumpido_se_completa(self):
+        apartado = origen_local.ruta_diario_cambios() + ".procesando"
+        self.escribir("a.txt", "22")
+        self.escribir_diario(apartado, ["a.txt"])
+        os.remove(os.path.join(self.raiz, "c.txt"))
+        self.escribir_diario(origen_local.ruta_diario_cambios() + ".agregando", ["c.txt"])
+
+        conexion, _, _ = origen_local.actualizar_indice(self.raiz, 2)
+        try:
+            self.assertEqual(self.tamanos(conexion), {'a.txt': 2, 'b.txt': 1})
+        finally:
+            conexion.close()
+        self.assertFalse(os.path.exists(origen_local.ruta_diario_cambios() + ".agregando"))
+
+    def test_desborde_recorre_todo(self):
+        self.escribir("b.txt", "4444")
+        with open(origen_local.ruta_diario_cambios(), "w", encoding="utf-8") as diario:
+            diario.write(json.dumps({'desborde': True}) + "\n")
+
+        conexion, _, _ = origen_local.actualizar_indice(self.raiz, 2)
+        try:
+            self.assertEqual(self.tamanos(conexion), {'a.txt': 1, 'b.txt': 4, 'c.txt': 1})
+        finally:
+            conexion.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
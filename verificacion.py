@@ -0,0 +1,288 @@
+import base64
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_hashes import anotar, buscar
+from empaquetado import leer_objeto
+from fragmentos import fragmento_por_hash
+from listado_paralelo import convertir
+
+# Problemas del reporte que se corrigen volviendo a copiar el objeto
+PROBLEMAS_COPIA = ('faltante', 'tamano_distinto', 'etag_distinto', 'contenido_distinto')
+OBJETOS_POR_RANGO = 50000
+OBJETOS_POR_TRAMO = 200000
+TAMANO_BLOQUE = 8 * 1024 * 1024
+
+
+def es_multiparte(etag):
+    # El ETag de una subida multiparte es "md5-de-los-md5-de-las-partes-N", no el MD5 del contenido
+    return "-" in etag
+
+
+def ordenar_por_clave(objetos, directorio, por_tramo):
+    # Ordenamiento externo: tramos de por_tramo objetos se ordenan en memoria y se escriben aparte;
+    # después se mezclan como flujo. El orden de las claves de Python (por punto de código) es el mismo
+    # orden binario UTF-8 en el que COS devuelve los listados.
+    tramos = []
+    actual = []
+
+    def volcar():
+        actual.sort(key=lambda objeto: objeto['key'])
+        ruta = os.path.join(directorio, f"tramo-{len(tramos)}.jsonl.gz")
+        with gzip.open(ruta, "wt", encoding="utf-8", compresslevel=1) as archivo:
+            for objeto in actual:
+                archivo.write(json.dumps(objeto, separators=(",", ":")) + "\n")
+        tramos.append(ruta)
+        actual.clear()
+
+    for objeto in objetos:
+        actual.append(objeto)
+        if len(actual) >= por_tramo:
+            volcar()
+    if actual:
+        volcar()
+
+    def leer(ruta):
+        with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+            for linea in archivo:
+                yield json.loads(linea)
+
+    try:
+        yield from heapq.merge(*(leer(ruta) for ruta in tramos), key=lambda objeto: objeto['key'])
+    finally:
+        for ruta in tramos:
+            os.remove(ruta)
+
+
+def rangos_esperados(objetos, directorio, por_rango=OBJETOS_POR_RANGO, por_tramo=OBJETOS_POR_TRAMO):
+    # Reparte los objetos esperados, ya ordenados, en rangos contiguos de claves de por_rango objetos cada uno.
+    # Cada rango se verifica en paralelo listando en el destino solo sus claves, sin importar cuántos
+    # niveles de prefijo tengan ni cómo se repartan entre ellos.
+    os.makedirs(directorio, exist_ok=True)
+    rangos = []
+    archivo = None
+    anterior = None
+    try:
+        for objeto in ordenar_por_clave(objetos, directorio, por_tramo):
+            if archivo is None or rangos[-1]['objetos'] >= por_rango:
+                if archivo:
+                    archivo.close()
+                    rangos[-1]['hasta'] = objeto['key']
+                ruta = os.path.join(directorio, f"rango-{len(rangos)}.jsonl.gz")
+                archivo = gzip.open(ruta, "wt", encoding="utf-8", compresslevel=1)
+                rangos.append({'ruta': ruta, 'despues_de': anterior, 'hasta': None, 'objetos': 0})
+            archivo.write(json.dumps(objeto, separators=(",", ":")) + "\n")
+            rangos[-1]['objetos'] += 1
+            anterior = objeto['key']
+    finally:
+        if archivo:
+            archivo.close()
+    return rangos
+
+
+def listar_rango(cliente, bucket, despues_de=None, hasta=None):
+    # Claves del destino en orden, desde la siguiente a despues_de y hasta antes de hasta; el listado
+    # se corta apenas pasa el rango, sin pedir más páginas
+    argumentos = {'Bucket': bucket}
+    if despues_de is not None:
+        argumentos['StartAfter'] = despues_de
+    paginador = cliente.get_paginator('list_objects_v2')
+    for pagina in paginador.paginate(**argumentos):
+        for objeto in pagina.get('Contents', []):
+            if hasta is not None and objeto['Key'] >= hasta:
+                return
+            yield convertir(objeto)
+
+
+def md5_en_metadatos(cliente, bucket, clave):
+    # rclone guarda el MD5 del contenido en X-Amz-Meta-Md5chksum cuando sube en partes
+    metadatos = cliente.head_object(Bucket=bucket, Key=clave).get('Metadata', {})
+    valor = metadatos.get('md5chksum')
+    if not valor:
+        return None
+    return base64.b64decode(valor).hex()
+
+
+def md5_contenido(cliente, bucket, clave):
+    cuerpo = cliente.get_object(Bucket=bucket, Key=clave)['Body']
+    resumen = hashlib.md5()
+    for bloque in iter(lambda: cuerpo.read(TAMANO_BLOQUE), b""):
+        resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def md5_de_version(cache, cliente, bucket, objeto, calcular):
+    # El ETag de un objeto de una sola parte ya es su MD5. Para los multiparte se busca la versión en el caché;
+    # si no está, se descarga una sola vez (solo si `calcular`) y queda anotada para los días siguientes.
+    if not es_multiparte(objeto['etag']):
+        return objeto['etag']
+    md5 = buscar(cache, bucket, objeto) if cache else None
+    if md5 or not calcular:
+        return md5
+    md5 = md5_contenido(cliente, bucket, objeto['key'])
+    if cache:
+        anotar(cache, bucket, objeto, md5)
+    return md5
+
+
+def en_muestra(clave, fraccion):
+    # Selección determinista: la misma clave cae siempre del mismo lado de la muestra
+    return fraccion > 0 and fragmento_por_hash(clave, 1000000) < fraccion * 1000000
+
+
+def comparar_objeto(esperado, destino, cliente_destino, bucket_destino, cliente_origen=None, bucket_origen=None,
+                    cache=None, calcular=False):
+    # Devuelve None si coincide, o el problema encontrado
+    if destino is None:
+        return 'faltante'
+    if destino['size'] != esperado['size']:
+        return 'tamano_distinto'
+    if destino['etag'] == esperado['etag']:
+        return None
+    if not es_multiparte(esperado['etag']) and not es_multiparte(destino['etag']):
+        return 'etag_distinto'
+    # Con partes de distinto tamaño los ETag no son comparables: se compara el MD5 del contenido.
+    # El del destino puede venir del caché, de X-Amz-Meta-Md5chksum o, con `calcular`, de leer el objeto.
+    md5_origen = md5_de_version(cache, cliente_origen, bucket_origen, esperado, calcular)
+    if md5_origen is None:
+        return 'no_verificable'
+    md5_destino = md5_de_version(cache, cliente_destino, bucket_destino, destino, False) or \
+        md5_en_metadatos(cliente_destino, bucket_destino, esperado['key'])
+    if md5_destino is None and calcular:
+        md5_destino = md5_de_version(cache, cliente_destino, bucket_destino, destino, True)
+    if md5_destino is None:
+        return 'no_verificable'
+    return None if md5_destino == md5_origen else 'etag_distinto'
+
+
+def verificar_rango(cliente_origen, cliente_destino, bucket_origen, bucket_destino, rango, fraccion_muestra,
+                    registrar, cache=None, calcular=False):
+    # Los dos listados están ordenados por clave: se avanzan a la par y en memoria hay un solo objeto de cada lado
+    destino = listar_rango(cliente_destino, bucket_destino, rango['despues_de'], rango['hasta'])
+    actual = next(destino, None)
+
+    resumen = {'verificados': 0, 'faltante': 0, 'tamano_distinto': 0, 'etag_distinto': 0, 'no_verificable': 0,
+               'rehash_ok': 0, 'rehash_distinto': 0}
+    with gzip.open(rango['ruta'], "rt", encoding="utf-8") as archivo:
+        for linea in archivo:
+            esperado = json.loads(linea)
+            while actual is not None and actual['key'] < esperado['key']:
+                actual = next(destino, None)
+            objeto_destino = actual if actual is not None and actual['key'] == esperado['key'] else None
+            problema = comparar_objeto(esperado, objeto_destino, cliente_destino, bucket_destino,
+                                       cliente_origen, bucket_origen, cache, calcular)
+            resumen['verificados'] += 1
+            if problema in ('faltante', 'tamano_distinto'):
+                resumen[problema] += 1
+                registrar(esperado, problema)
+                continue
+            if en_muestra(esperado['key'], fraccion_muestra):
+                # El destino se vuelve a leer siempre; el MD5 del origen sale del caché si la versión ya se leyó antes
+                md5_destino = md5_contenido(cliente_destino, bucket_destino, esperado['key'])
+                if cache and es_multiparte(objeto_destino['etag']):
+                    anotar(cache, bucket_destino, objeto_destino, md5_destino)
+                if md5_de_version(cache, cliente_origen, bucket_origen, esperado, True) == md5_destino:
+                    resumen['rehash_ok'] += 1
+                    continue
+                resumen['rehash_distinto'] += 1
+                registrar(esperado, 'contenido_distinto')
+                continue
+            if problema:
+                resumen[problema] += 1
+                registrar(esperado, problema)
+    return resumen
+
+
+def listar_prefijo(cliente, bucket, prefijo):
+    tamanos = {}
+    for pagina in cliente.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefijo):
+        for objeto in pagina.get('Contents', []):
+            tamanos[objeto['Key']] = objeto['Size']
+    return tamanos
+
+
+def verificar_paquetes(cliente_destino, bucket_destino, entradas, prefijo, clave_indice, ruta_reporte, hilos=16,
+                       fraccion_muestra=0.0):
+    # Los objetos empaquetados no aparecen en el listado del destino: se comprueba que cada paquete y el índice
+    # existan y que el tamaño del paquete alcance para el desplazamiento y la longitud anotados.
+    # En la muestra, el objeto se lee con un GET con Range y su MD5 se compara con el ETag del origen
+    # (los objetos empaquetados son pequeños y nunca multiparte). Los problemas se agregan a ruta_reporte.
+    tamanos = listar_prefijo(cliente_destino, bucket_destino, prefijo)
+    bloqueo = threading.Lock()
+    reporte = open(ruta_reporte, "a", encoding="utf-8")
+    resumen = {'verificados': 0, 'faltante': 0, 'tamano_distinto': 0, 'rehash_ok': 0, 'rehash_distinto': 0}
+
+    def registrar(clave, problema, size=None, etag=None):
+        with bloqueo:
+            resumen[problema] = resumen.get(problema, 0) + 1
+            reporte.write(json.dumps({'key': clave, 'problema': problema, 'size': size, 'etag': etag}) + "\n")
+
+    def revisar(entrada):
+        tamano_paquete = tamanos.get(entrada['paquete'])
+        if tamano_paquete is None:
+            problema = 'faltante'
+        elif entrada['longitud'] != entrada['size'] or \
+                entrada['desplazamiento'] + entrada['longitud'] > tamano_paquete:
+            problema = 'tamano_distinto'
+        elif en_muestra(entrada['key'], fraccion_muestra):
+            contenido = leer_objeto(cliente_destino, bucket_destino, entrada)
+            problema = None if hashlib.md5(contenido).hexdigest() == entrada['etag'] else 'contenido_distinto'
+            with bloqueo:
+                resumen['rehash_ok' if problema is None else 'rehash_distinto'] += 1
+        else:
+            problema = None
+        if problema:
+            registrar(entrada['key'], problema, entrada['size'], entrada['etag'])
+        with bloqueo:
+            resumen['verificados'] += 1
+
+    try:
+        if clave_indice not in tamanos:
+            registrar(clave_indice, 'indice_faltante')
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            list(ejecutor.map(revisar, entradas.values()))
+    finally:
+        reporte.close()
+    resumen['correcto'] = not any(resumen.get(clave) for clave in
+                                  ('faltante', 'tamano_distinto', 'rehash_distinto', 'indice_faltante'))
+    return resumen
+
+
+def verificar(cliente_origen, cliente_destino, bucket_origen, bucket_destino, objetos, directorio, ruta_reporte,
+              hilos=16, fraccion_muestra=0.0, cache=None, calcular=False):
+    # Compara la instantánea del origen con el listado del destino por tamaño y ETag,
+    # un rango de claves por hilo. Los problemas se escriben como JSON por línea en ruta_reporte.
+    # Con `cache` (ver cache_hashes), los MD5 de objetos multiparte ya calculados se consultan en lugar de leerse;
+    # con `calcular`, los que faltan se leen una vez y se anotan.
+    rangos = rangos_esperados(objetos, directorio)
+    bloqueo = threading.Lock()
+    os.makedirs(os.path.dirname(ruta_reporte) or ".", exist_ok=True)
+    reporte = open(ruta_reporte, "w", encoding="utf-8")
+
+    def registrar(esperado, problema):
+        with bloqueo:
+            reporte.write(json.dumps({'key': esperado['key'], 'problema': problema, 'size': esperado['size'],
+                                      'etag': esperado['etag']}) + "\n")
+
+    def tarea(rango):
+        return verificar_rango(cliente_origen, cliente_destino, bucket_origen, bucket_destino, rango,
+                               fraccion_muestra, registrar, cache, calcular)
+
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            resumenes = list(ejecutor.map(tarea, rangos))
+    finally:
+        reporte.close()
+
+    total = {}
+    for resumen in resumenes:
+        for clave, valor in resumen.items():
+            total[clave] = total.get(clave, 0) + valor
+    total['correcto'] = not any(total.get(clave) for clave in
+                                ('faltante', 'tamano_distinto', 'etag_distinto', 'rehash_distinto'))
+    return total